@@ -1,12 +1,20 @@
 import os
+import time
 import torch
 import streamlit as st
-from torchvision import transforms, models
-from PIL import Image
+from torchvision import models
+
+from batch_inference import list_images, predict_batch
+from image_preprocessing import preprocessor
+from inference_backends import compile_model
+from model_registry import registry
+from prediction_cache import model_version, prediction_cache
 
 # Set paths
 DATA_DIR = "D:/HackathonProjectsTest/BITS Pilani Postman/streamlit/Prediciton models/skin_disease_prediciton/img"  # Update to your image directory
 MODEL_PATH = "D:/HackathonProjectsTest/BITS Pilani Postman/streamlit/Prediciton models/skin_disease_prediciton/models/skin_disease.pth"  # Update to your trained model path
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "fp32")  # fp32, torchscript, dynamic_int8 or static_int8
+MODEL_NAME = "skin_disease"
 
 # Define classes for skin disease prediction
 CLASSES = [
@@ -37,19 +45,27 @@ def load_model(model_path):
         raise
 
 
+def load_inference_model(model_path):
+    """
+    Load the model with the configured CPU inference backend (compiled variants are cached next to the .pth).
+    """
+    return compile_model(model_path, INFERENCE_BACKEND, load_model, calibration_tensors=load_calibration_tensors)
+
+
+def load_calibration_tensors(limit=32):
+    """
+    Preprocessed sample images from DATA_DIR used to calibrate static quantization.
+    """
+    return [preprocess_image(path) for path in list_images(DATA_DIR)[:limit]]
+
+
 def preprocess_image(image_path):
     """
     Preprocess an input image for the model.
     """
     try:
-        transform = transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
-
-        img = Image.open(image_path).convert("RGB")
-        return transform(img).unsqueeze(0)  # Add batch dimension
+        # Shared pipeline: draft-mode decode, resize to 224x224, vectorized ImageNet normalization
+        return preprocessor.preprocess(image_path)  # (1, 3, 224, 224), channels-last
     except Exception as e:
         st.error(f"Error preprocessing image {image_path}: {e}")
         raise
@@ -74,28 +90,45 @@ def predict_skin_disease(model, image_tensor):
         raise
 
 
+def predict_skin_disease_batch(model, images, batch_size=16):
+    """
+    Predict skin diseases for many images (uploaded files, paths or a directory) in batches.
+    """
+    return predict_batch(model, images, CLASSES, batch_size=batch_size,
+                         cache=prediction_cache, version=model_version(MODEL_PATH, INFERENCE_BACKEND))
+
+
 def app():
     # Set up Streamlit app layout
     st.title("Skin Disease Prediction")
     st.markdown("This app classifies skin diseases based on input images.")
     
-    # Upload an image for classification
-    uploaded_image = st.file_uploader("Choose an image", type=["jpg", "jpeg", "png"])
+    # Upload one or more images for classification
+    uploaded_images = st.file_uploader("Choose an image", type=["jpg", "jpeg", "png"], accept_multiple_files=True)
+    uploaded_image = uploaded_images[0] if len(uploaded_images) == 1 else None
     
     if uploaded_image is not None:
         try:
-            # Display the uploaded image
-            image = Image.open(uploaded_image)
-            st.image(image, caption="Uploaded Image", use_column_width=True)
+            # Display the uploaded image (sent as-is, no server-side decode)
+            st.image(uploaded_image.getvalue(), caption="Uploaded Image", use_column_width=True)
             
-            # Preprocess the uploaded image
-            image_tensor = preprocess_image(uploaded_image)
+            # Reuse the prediction if this exact image was already classified by this model
+            cache_key = prediction_cache.key(uploaded_image, model_version(MODEL_PATH, INFERENCE_BACKEND))
+            cached = prediction_cache.get(cache_key)
+            if cached is not None:
+                predicted_class, probabilities = cached["class_index"], cached["probabilities"]
+            else:
+                # Preprocess the uploaded image
+                image_tensor = preprocess_image(uploaded_image)
             
-            # Load the model
-            model = load_model(MODEL_PATH)
+                # Get the model from the process-wide registry (loaded once, shared across sessions)
+                model = registry.get(MODEL_NAME, load_inference_model, MODEL_PATH)
             
-            # Predict the skin disease
-            predicted_class, probabilities = predict_skin_disease(model, image_tensor)
+                # Predict the skin disease
+                start = time.perf_counter()
+                predicted_class, probabilities = predict_skin_disease(model, image_tensor)
+                registry.record_inference(MODEL_NAME, MODEL_PATH, time.perf_counter() - start)
+                prediction_cache.put(cache_key, {"class_index": predicted_class, "probabilities": probabilities})
             
             # Display the results
             st.write(f"Predicted Skin Disease: {CLASSES[predicted_class]}")
@@ -109,6 +142,29 @@ def app():
         except Exception as e:
             st.error(f"Error processing the image: {e}")
     
+    elif uploaded_images:
+        try:
+            batch_size = st.select_slider("Batch size", options=[4, 8, 16, 32, 64], value=16)
+            model = registry.get(MODEL_NAME, load_inference_model, MODEL_PATH)
+            
+            # Classify all uploaded images in batches
+            start = time.perf_counter()
+            results = predict_skin_disease_batch(model, uploaded_images, batch_size=batch_size)
+            elapsed = time.perf_counter() - start
+            
+            st.write(f"Classified {len(results)} images in {elapsed:.2f}s ({len(results) / elapsed:.1f} images/sec)")
+            st.dataframe([
+                {
+                    "Image": result["image"],
+                    "Predicted Skin Disease": result.get("class", "Error"),
+                    "Confidence": round(result["confidence"], 3) if "confidence" in result else None,
+                    "Error": result.get("error", ""),
+                }
+                for result in results
+            ])
+        except Exception as e:
+            st.error(f"Error processing the images: {e}")
+    
     else:
         st.info("Please upload an image to classify the skin disease.")
 
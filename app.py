@@ -1,7 +1,10 @@
+import os
+
 import streamlit as st
 from streamlit_option_menu import option_menu
 
-import appointment, hosloc, models, recommendation, userprofile, home, login , read_reports, mhfinal
+from google_clients import call_stats
+from import_profiler import import_page, report
 
 
 # Initialize session state variables
@@ -17,45 +20,54 @@ class MultiApp:
     def __init__(self):
         self.apps = []
 
-    def add_app(self, title, function):
+    def add_app(self, title, module):
+        # Pages are registered by module name and only imported when first opened,
+        # so a rerun never pays for clients (Sheets, Groq, Twilio...) of other pages
         self.apps.append({
             "title": title,
-            "function": function
+            "module": module
         })    
 
+    def open_page(self, title):
+        page = next(page for page in self.apps if page["title"] == title)
+        import_page(page["module"]).app()
+
     def run(self):
         # Sidebar navigation menu
         with st.sidebar:
             app = option_menu(
                 menu_title='Navigation', 
-                options=['Home', 'Login', 'Profile', 'Health Overview', 'Prediction Models','Report Analysis', 'Connect with Doctor', 'Hospital Locator'],
+                options=[page["title"] for page in self.apps],
                 default_index=0,
             )
 
+            # Set SHOW_IMPORT_PROFILE=1 to see what each page cost to import and API latencies
+            if os.getenv("SHOW_IMPORT_PROFILE"):
+                with st.expander("Import profile"):
+                    st.table(report())
+                with st.expander("Google API call latency"):
+                    st.table(call_stats())
+                with st.expander("LLM cache and latency"):
+                    from llm_gateway import gateway
+                    st.json(gateway.stats())
+
         # If the user is not logged in and tries to access pages other than Home and Login, redirect to Login
         if not st.session_state.logged_in and app not in ["Home", "Login"]:
             st.error("You need to log in to access this page.")
-            login.app()  # Redirect to the login page
+            self.open_page("Login")  # Redirect to the login page
             return
 
         # Page navigation
-        if app == "Home":
-            home.app()
-        elif app == "Login":
-            login.app()    
-        elif app == "Profile":
-            userprofile.app()    
-        elif app == "Health Overview":
-            recommendation.app()              
-        elif app == 'Prediction Models':
-            models.app()
-        elif app == 'Report Analysis':
-            read_reports.app()
-        elif app == 'Connect with Doctor':
-            appointment.app()    
-        elif app == 'Hospital Locator':
-            hosloc.app()
+        self.open_page(app)
 
 # Run the app
 multi_app = MultiApp()
+multi_app.add_app("Home", "home")
+multi_app.add_app("Login", "login")
+multi_app.add_app("Profile", "userprofile")
+multi_app.add_app("Health Overview", "recommendation")
+multi_app.add_app("Prediction Models", "models")
+multi_app.add_app("Report Analysis", "read_reports")
+multi_app.add_app("Connect with Doctor", "appointment")
+multi_app.add_app("Hospital Locator", "hosloc")
 multi_app.run()
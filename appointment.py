@@ -1,7 +1,5 @@
 import streamlit as st
 import streamlit.components.v1 as components
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
 import datetime
 import sendgrid
 from sendgrid.helpers.mail import Mail, Email, Content
@@ -9,6 +7,8 @@ from twilio.rest import Client
 import os
 from dotenv import load_dotenv
 
+from google_clients import calendar_http, get_calendar_service, timed_call
+
 load_dotenv()
 
 # Google Calendar API Setup
@@ -45,8 +45,8 @@ def generate_time_slots(start_time, end_time, interval=30):
 
 def create_google_calendar_event(doctor, date, time_slot):
     try:
-        credentials = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-        service = build("calendar", "v3", credentials=credentials)
+        # Cached credentials and Calendar client, reused across bookings and threads
+        service = get_calendar_service(SERVICE_ACCOUNT_FILE, SCOPES)
         
         event_start = f"{date}T{time_slot}:00+05:30"  # Added timezone offset
         event_end = (datetime.datetime.fromisoformat(event_start) + datetime.timedelta(minutes=30)).isoformat()
@@ -66,7 +66,9 @@ def create_google_calendar_event(doctor, date, time_slot):
             }
         }
         
-        event = service.events().insert(calendarId='primary', body=event, sendUpdates='all').execute()
+        request = service.events().insert(calendarId='primary', body=event, sendUpdates='all')
+        with calendar_http(SERVICE_ACCOUNT_FILE, SCOPES) as http, timed_call("calendar events.insert"):
+            event = request.execute(http=http)
         return event["htmlLink"]
     except Exception as e:
         st.error(f"Calendar Error: {str(e)}")
@@ -0,0 +1,277 @@
+# assign_hospitals.py
+"""
+Batch job: assign every registered patient their nearest hospitals.
+
+Usage:
+    python assign_hospitals.py assignments.csv --dataset hospitals.csv
+    python assign_hospitals.py assignments.csv --dataset hospitals.csv -k 3 --workers 16
+    python assign_hospitals.py assignments.csv --dataset hospitals.csv --restart
+
+Patients are streamed from the user store (USER_STORE) in chunks. Each
+patient's location is read from --location-field; it may be a place name or
+"lat, lng". Distinct locations in a chunk are geocoded in parallel through the
+shared geocode cache, at most --qps Geocoding API requests a second across all
+workers, then the whole chunk is matched against the offline hospital dataset
+(see hospital_index.py) in one vectorized query.
+
+Only places the API doesn't know are written as "location not found".
+Network errors and rate limits are retried with backoff. If the API stays
+unavailable, or the key or quota is refused, the job stops before writing the
+chunk, and a rerun resumes from it.
+
+Results are appended to the output CSV chunk by chunk. After each chunk a
+checkpoint (<output>.checkpoint.json) records how many patients are done, how
+long the output is and the counts by status, so an interrupted run picks up
+where it stopped: the output is truncated back to the last checkpoint and
+those patients are skipped. The checkpoint also records the job's parameters
+(--dataset, --location-field, -k, --max-km); resuming with different ones is
+refused, since the rows wouldn't match those already written.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from hospital_index import get_hospital_index
+from storage import get_user_store
+
+# No profile column holds an address yet; point this at the one you add
+DEFAULT_LOCATION_FIELD = os.getenv("PATIENT_LOCATION_FIELD", "Address")
+# Hospital details written for each assigned hospital
+HOSPITAL_FIELDS = {"name": "Name", "address": "Address", "phone_number": "Phone"}
+# Geocoding API requests per second across all workers (the API allows 50 by default)
+GEOCODE_QPS = float(os.getenv("GEOCODE_QPS", "25"))
+# Attempts per location after a transient failure, with exponential backoff
+GEOCODE_RETRIES = 5
+
+
+def output_columns(k):
+    columns = ["Email", "Location", "Latitude", "Longitude", "Status"]
+    for rank in range(1, k + 1):
+        columns += [f"Hospital {rank} {label}" for label in HOSPITAL_FIELDS.values()]
+        columns.append(f"Hospital {rank} Distance km")
+    return columns
+
+
+class CheckpointMismatch(Exception):
+    """The checkpoint was written by a run with other parameters."""
+
+
+def job_parameters(dataset, location_field, k, max_km):
+    """What a checkpoint must match for its output to be resumed."""
+    return {"dataset": os.path.abspath(dataset), "location_field": location_field, "k": k, "max_km": max_km}
+
+
+def new_checkpoint(params):
+    return {"params": params, "processed": 0, "output_bytes": 0, "counts": {}}
+
+
+def read_checkpoint(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_checkpoint(path, checkpoint):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def chunks(records, size):
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Geocoder:
+    """
+    hosloc.locate_place with a rate limit shared by all worker threads, and
+    retries with exponential backoff while the API is temporarily unavailable.
+    Raises hosloc.GeocodingUnavailable once retrying is pointless; from then
+    on every call fails fast, so the other workers stop too.
+    """
+
+    def __init__(self, qps=GEOCODE_QPS, retries=GEOCODE_RETRIES, backoff=1.0):
+        self.interval = 1 / qps if qps > 0 else 0
+        self.retries = retries
+        self.backoff = backoff
+        self.requests = 0
+        self.retried = 0
+        self._lock = threading.Lock()
+        self._next_request = 0.0
+        self._failure = None
+
+    def throttle(self):
+        """Wait for this request's slot in the shared schedule."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_request)
+            self._next_request = start + self.interval
+            self.requests += 1
+        if start > now:
+            time.sleep(start - now)
+
+    def __call__(self, location):
+        from hosloc import GeocodingUnavailable, locate_place
+
+        for attempt in range(self.retries + 1):
+            if self._failure is not None:
+                raise self._failure
+            try:
+                return locate_place(location, throttle=self.throttle)
+            except GeocodingUnavailable as e:
+                if not e.retry or attempt == self.retries:
+                    self._failure = e
+                    raise
+                with self._lock:
+                    self.retried += 1
+                time.sleep(self.backoff * 2 ** attempt)
+
+
+def geocode_all(locations, pool, geocoder):
+    """{location: (lat, lng) or None} for distinct non-empty locations."""
+    distinct = list(dict.fromkeys(location for location in locations if location))
+    return dict(zip(distinct, pool.map(geocoder, distinct)))
+
+
+def assign_chunk(chunk, index, location_field, k, max_km, pool, geocoder):
+    """Output rows for one chunk of patient records, in input order."""
+    locations = [str(record.get(location_field) or "").strip() for record in chunk]
+    coordinates = geocode_all(locations, pool, geocoder)
+
+    located = [i for i, location in enumerate(locations) if coordinates.get(location)]
+    nearest, distances = index.nearest_many([coordinates[locations[i]][0] for i in located],
+                                            [coordinates[locations[i]][1] for i in located], k=k)
+    matches = dict(zip(located, zip(nearest.tolist(), distances.tolist())))
+
+    rows = []
+    for i, record in enumerate(chunk):
+        location = locations[i]
+        row = [record.get("Email", ""), location, "", "", ""]
+        if not location:
+            row[4] = "no location"
+        elif i not in matches:
+            row[4] = "location not found"
+        else:
+            lat, lng = coordinates[location]
+            row[2:4] = [lat, lng]
+            hospitals = [(index.hospitals[h], d) for h, d in zip(*matches[i]) if max_km is None or d <= max_km]
+            row[4] = "ok" if hospitals else "no hospital in range"
+            for hospital, distance in hospitals:
+                row += [hospital.get(field, "") for field in HOSPITAL_FIELDS] + [round(distance, 2)]
+        rows.append(row)
+    return rows
+
+
+def assign_hospitals(output, dataset, location_field=DEFAULT_LOCATION_FIELD, k=1, max_km=None,
+                     chunk_size=1000, workers=8, restart=False, store=None, geocoder=None):
+    """
+    Run (or resume) the job; returns counts by status, including those of
+    the runs it resumes. Raises CheckpointMismatch if the checkpoint was
+    written with other parameters, and hosloc.GeocodingUnavailable if
+    geocoding fails for good, after checkpointing every chunk completed so far.
+    """
+    store = store or get_user_store()
+    geocoder = geocoder or Geocoder()
+    index = get_hospital_index(dataset)
+    params = job_parameters(dataset, location_field, k, max_km)
+    checkpoint_path = f"{output}.checkpoint.json"
+    checkpoint = read_checkpoint(checkpoint_path)
+    resuming = (not restart and checkpoint is not None and checkpoint.get("output_bytes", 0) > 0
+                and os.path.exists(output) and os.path.getsize(output) >= checkpoint["output_bytes"])
+    if resuming and checkpoint.get("params") != params:
+        previous = checkpoint.get("params") or {}
+        changed = ", ".join(f"{name} {previous.get(name)!r} -> {value!r}"
+                            for name, value in params.items() if previous.get(name) != value)
+        raise CheckpointMismatch(f"{output} was started with other parameters ({changed}); "
+                                 f"rerun with the original ones to resume, or pass --restart to start over")
+    if not resuming:
+        checkpoint = new_checkpoint(params)
+    counts = dict(checkpoint["counts"], processed=checkpoint["processed"])
+    start = time.perf_counter()
+
+    with open(output, "r+" if resuming else "w", newline="", encoding="utf-8") as f, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        writer = csv.writer(f)
+        if resuming:
+            # Drop anything written after the last checkpoint (a chunk cut short by a crash)
+            f.seek(checkpoint["output_bytes"])
+            f.truncate()
+        else:
+            writer.writerow(output_columns(k))
+
+        records = islice(store.iter_users(), checkpoint["processed"], None)
+        for chunk in chunks(records, chunk_size):
+            rows = assign_chunk(chunk, index, location_field, k, max_km, pool, geocoder)
+            writer.writerows(rows)
+            f.flush()
+            os.fsync(f.fileno())
+
+            for row in rows:
+                counts[row[4]] = counts.get(row[4], 0) + 1
+            counts["processed"] += len(chunk)
+            write_checkpoint(checkpoint_path, {
+                "params": params, "processed": counts["processed"], "output_bytes": f.tell(),
+                "counts": {status: count for status, count in counts.items() if status != "processed"},
+            })
+
+            elapsed = time.perf_counter() - start
+            print(f"{counts['processed']} patients assigned "
+                  f"({(counts['processed'] - checkpoint['processed']) / elapsed:.0f}/s)", file=sys.stderr)
+
+    counts["seconds"] = time.perf_counter() - start
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Assign every patient their nearest hospitals.")
+    parser.add_argument("output", help="CSV file to write (appended to when resuming)")
+    parser.add_argument("--dataset", default=os.getenv("HOSPITAL_DATASET"),
+                        help="Offline hospital dataset, CSV or GeoJSON (default: HOSPITAL_DATASET)")
+    parser.add_argument("--location-field", default=DEFAULT_LOCATION_FIELD,
+                        help="Patient field holding a place name or \"lat, lng\"")
+    parser.add_argument("-k", type=int, default=1, help="Hospitals per patient")
+    parser.add_argument("--max-km", type=float, help="Ignore hospitals farther than this")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=8, help="Parallel geocoding requests")
+    parser.add_argument("--qps", type=float, default=GEOCODE_QPS,
+                        help="Geocoding API requests per second across all workers (default: GEOCODE_QPS)")
+    parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint and start over")
+    args = parser.parse_args(argv)
+    if not args.dataset:
+        parser.error("--dataset (or HOSPITAL_DATASET) is required")
+
+    from hosloc import GeocodingUnavailable
+
+    try:
+        counts = assign_hospitals(args.output, args.dataset, location_field=args.location_field, k=args.k,
+                                  max_km=args.max_km, chunk_size=args.chunk_size, workers=args.workers,
+                                  restart=args.restart, geocoder=Geocoder(qps=args.qps))
+    except CheckpointMismatch as e:
+        parser.error(str(e))
+    except GeocodingUnavailable as e:
+        checkpoint = read_checkpoint(f"{args.output}.checkpoint.json") or {"processed": 0}
+        print(f"Stopped after {checkpoint['processed']} patients: {e}. Run again to resume.", file=sys.stderr)
+        return 1
+    seconds = counts.pop("seconds")
+    print(f"Assigned {counts.pop('processed')} patients in {seconds:.1f}s: "
+          + ", ".join(f"{count} {status}" for status, count in sorted(counts.items())))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
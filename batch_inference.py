@@ -0,0 +1,108 @@
+# batch_inference.py
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from image_preprocessing import preprocessor as default_preprocessor
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def list_images(directory):
+    """
+    Recursively list image files under a directory, in a stable order.
+    """
+    paths = []
+    for root, _, files in os.walk(directory):
+        for file_name in files:
+            if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(root, file_name))
+    return sorted(paths)
+
+
+def image_name(image):
+    """Display name for a file path or an uploaded file object."""
+    if isinstance(image, (str, os.PathLike)):
+        return os.path.basename(image)
+    return getattr(image, "name", repr(image))
+
+
+def predict_batch(model, images, classes, batch_size=16, workers=4, preprocessor=default_preprocessor,
+                  cache=None, version=None):
+    """
+    Classify many images with one forward pass per batch.
+
+    `images` is a list of file paths / uploaded files, or a directory path.
+    Images are preprocessed in parallel straight into a reusable channels-last
+    batch buffer of `batch_size` and returned in input order as dicts with the
+    predicted class and per-class probabilities. Images that fail to decode
+    get an `error` entry instead of aborting the whole batch.
+
+    With a `cache` (see prediction_cache.PredictionCache) and model `version`,
+    images already classified are answered from the cache and only misses
+    are run through the model.
+    """
+    if isinstance(images, (str, os.PathLike)) and os.path.isdir(images):
+        images = list_images(images)
+    images = list(images)
+    batch_size = max(1, int(batch_size))
+
+    results = [None] * len(images)
+    keys = [None] * len(images)
+    pending = []
+    for position, image in enumerate(images):
+        if cache is not None:
+            keys[position] = cache.key(image, version)
+            cached = cache.get(keys[position])
+            if cached is not None:
+                results[position] = dict(cached, image=image_name(image))
+                continue
+        pending.append(position)
+    if not pending:
+        return results
+
+    buffer = preprocessor.batch_buffer(min(batch_size, len(pending)))
+
+    def fill_slot(slot, image):
+        try:
+            preprocessor.preprocess(image, out=buffer[slot:slot + 1])
+            return None
+        except Exception as e:
+            return str(e)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            errors = list(executor.map(fill_slot, range(len(chunk)), [images[p] for p in chunk]))
+
+            slots = []
+            for slot, error in enumerate(errors):
+                if error is not None:
+                    results[chunk[slot]] = {"image": image_name(images[chunk[slot]]), "error": error}
+                else:
+                    slots.append(slot)
+            if not slots:
+                continue
+
+            if len(slots) == len(chunk):
+                batch = buffer[:len(chunk)]
+            else:
+                batch = buffer[slots].contiguous(memory_format=torch.channels_last)
+            with torch.no_grad():
+                probabilities = torch.softmax(model(batch), dim=1)
+            confidences, predicted = probabilities.max(1)
+
+            for row, slot in enumerate(slots):
+                position = chunk[slot]
+                class_index = predicted[row].item()
+                prediction = {
+                    "class_index": class_index,
+                    "class": classes[class_index],
+                    "confidence": confidences[row].item(),
+                    "probabilities": probabilities[row].tolist(),
+                }
+                if cache is not None:
+                    cache.put(keys[position], prediction)
+                results[position] = dict(prediction, image=image_name(images[position]))
+    return results
@@ -0,0 +1,259 @@
+# batch_writer.py
+import atexit
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+# First row of an A1 range as the API reports it, e.g. 5 in "'Sheet1'!A5:V7"
+_FIRST_ROW = re.compile(r"![A-Z]+(\d+)")
+
+
+def column_letter(index):
+    """1-based column index -> A1 letters (1 -> A, 22 -> V, 27 -> AA)."""
+    letters = ""
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+def column_index(letters):
+    """A1 column letters -> 1-based index."""
+    index = 0
+    for char in letters.upper():
+        index = index * 26 + ord(char) - ord("A") + 1
+    return index
+
+
+def default_journal_dir():
+    """Where write journals live (WRITE_JOURNAL_DIR, default .journal)."""
+    return os.getenv("WRITE_JOURNAL_DIR", ".journal")
+
+
+class BatchWriter:
+    """
+    Batched, journaled mutations for one worksheet.
+
+    `append()` and `update()` are recorded in an append-only local journal
+    (fsynced) and buffered. A background thread flushes the buffer when it
+    reaches `max_batch` operations or `max_delay` seconds after the first
+    buffered write, sending all appends as one `append_rows` call and all
+    row updates as one `batch_update` call (a later update of the same cells
+    replaces an earlier one). Each stage is dropped from the buffer and
+    journal as soon as it is sent, so a failed update never resends appends.
+
+    Updates name their row by its key (the value in column `key_column`, 1 =
+    A), never by row number: other processes may append rows at any time, so
+    rows are located only at flush time, from a fresh read of the key column,
+    and rows appended by the flush itself from the range `append_rows` reports.
+    Operations still in the journal when the process starts (e.g. after a
+    crash) are replayed, so writes are delivered at least once. With
+    `journal_path=None` nothing is journaled, for callers that flush
+    synchronously and can simply redo their work after a crash.
+    """
+
+    def __init__(self, worksheet, journal_path, max_batch=50, max_delay=2.0, on_flush=None, key_column=1):
+        self.worksheet = worksheet
+        self.journal_path = journal_path
+        self.key_column = key_column
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.on_flush = on_flush
+        self.api_calls = 0
+        self.flushed_operations = 0
+        self.dropped_updates = 0
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._wakeup = threading.Event()
+        self._full = threading.Event()
+        self._stopped = False
+
+        self._journal = None
+        if journal_path:
+            os.makedirs(os.path.dirname(os.path.abspath(journal_path)), exist_ok=True)
+            self._pending = self._read_journal()
+            self._journal = open(journal_path, "a", encoding="utf-8")
+
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+        if self._pending:
+            self._wakeup.set()
+        atexit.register(self.close)
+
+    def _read_journal(self):
+        operations = []
+        try:
+            with open(self.journal_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        operations.append(json.loads(line))
+                    except ValueError:
+                        break  # torn final line from a crash mid-write
+        except FileNotFoundError:
+            pass
+        # Updates journaled with a fixed row number could now land on another row
+        unkeyed = [operation for operation in operations if operation["op"] == "update" and "key" not in operation]
+        if unkeyed:
+            print(f"{self.journal_path}: dropping {len(unkeyed)} journaled update(s) without a row key",
+                  file=sys.stderr)
+            operations = [operation for operation in operations if operation not in unkeyed]
+        return operations
+
+    def _record(self, operations):
+        """Journal (one fsync for the whole group) and buffer operations."""
+        if not operations:
+            return
+        with self._lock:
+            if self._journal is not None:
+                self._journal.write("".join(json.dumps(operation) + "\n" for operation in operations))
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+            self._pending.extend(operations)
+            pending = len(self._pending)
+        self._wakeup.set()
+        if pending >= self.max_batch:
+            # Size threshold reached: cut the flusher's delay short
+            self._full.set()
+
+    def append(self, values):
+        """Queue a new row."""
+        self.append_many([values])
+
+    def append_many(self, rows):
+        """Queue several new rows with a single journal write."""
+        self._record([{"op": "append", "values": list(values)} for values in rows])
+
+    def update(self, key, first_column, values):
+        """Queue an update of `values` from column `first_column` (e.g. "D") in the row whose key is `key`."""
+        self.update_many([(key, first_column, values)])
+
+    def update_many(self, updates):
+        """Queue several (key, first_column, values) updates with a single journal write."""
+        self._record([{"op": "update", "key": key, "column": first_column, "values": list(values)}
+                      for key, first_column, values in updates])
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Send everything buffered so far; raises if the sheet rejects it."""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending)
+            if not batch:
+                return 0
+
+            appends = [operation["values"] for operation in batch if operation["op"] == "append"]
+            updates = {}
+            for operation in batch:
+                if operation["op"] == "update":
+                    updates[(operation["key"], operation["column"], len(operation["values"]))] = operation["values"]
+
+            # Appends first: an update may target a row appended in this batch
+            appended_rows = {}
+            if appends:
+                response = self.worksheet.append_rows(appends)
+                self.api_calls += 1
+                appended_rows = self._appended_rows(response, appends)
+                # Delivered: forget them now so a failing update can't send them twice
+                remaining = [operation for operation in batch if operation["op"] != "append"]
+                self._complete(batch, remaining)
+                batch = remaining
+            if updates:
+                rows = self._key_rows()
+                rows.update(appended_rows)
+                data = []
+                for (key, first_column, width), values in updates.items():
+                    row = rows.get(key)
+                    if row is None:
+                        self.dropped_updates += 1  # the row is gone; there's nowhere to write
+                        continue
+                    last_column = column_letter(column_index(first_column) + width - 1)
+                    data.append({"range": f"{first_column}{row}:{last_column}{row}", "values": [values]})
+                if data:
+                    self.worksheet.batch_update(data)
+                    self.api_calls += 1
+                self._complete(batch, [])
+
+        if self.on_flush:
+            self.on_flush()
+        return len(appends) + len(batch)
+
+    def _key_rows(self):
+        """{key: sheet row number}, read from the sheet now."""
+        keys = self.worksheet.col_values(self.key_column)
+        self.api_calls += 1
+        return {key: number for number, key in enumerate(keys, start=1) if number > 1}
+
+    def _appended_rows(self, response, appends):
+        """{key: sheet row number} of just-appended rows, from the range the API says it wrote."""
+        try:
+            updated_range = response["updates"]["updatedRange"]
+        except (KeyError, TypeError):
+            return {}
+        match = _FIRST_ROW.search(updated_range)
+        if match is None:
+            return {}
+        first = int(match.group(1))
+        return {values[self.key_column - 1]: first + offset for offset, values in enumerate(appends)
+                if len(values) >= self.key_column}
+
+    def _complete(self, batch, remaining):
+        """Replace the flushed `batch` at the head of the buffer (and journal) with `remaining`."""
+        with self._lock:
+            self._pending[:len(batch)] = remaining
+            self._rewrite_journal()
+            self.flushed_operations += len(batch) - len(remaining)
+
+    def _rewrite_journal(self):
+        if self._journal is None:
+            return
+        self._journal.close()
+        tmp_path = f"{self.journal_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for operation in self._pending:
+                f.write(json.dumps(operation) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def _try_flush(self):
+        try:
+            self.flush()
+            return True
+        except Exception:
+            return False
+
+    def _flush_loop(self):
+        while not self._stopped:
+            self._wakeup.wait()
+            # Let writes from the same burst pile up into one request, unless the batch fills up first
+            self._full.wait(self.max_delay)
+            self._wakeup.clear()
+            self._full.clear()
+            if not self._try_flush():
+                # Writes stay journaled and buffered; retry after a full interval
+                time.sleep(self.max_delay)
+                self._wakeup.set()
+
+    def close(self):
+        self._stopped = True
+        self._wakeup.set()
+        self._full.set()
+        self._try_flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "flushed_operations": self.flushed_operations,
+                "dropped_updates": self.dropped_updates,
+                "api_calls": self.api_calls,
+            }
@@ -0,0 +1,290 @@
+# benchmark_models.py
+"""
+Offline evaluation and throughput benchmark for the image prediction models.
+
+Usage:
+    python benchmark_models.py skin_disease --output runs/skin_new.json
+    python benchmark_models.py skin_disease --weights new.pth --compare runs/skin_old.json
+    python benchmark_models.py hair_fall --limit 50
+    python benchmark_models.py skin_disease --backend static_int8 --validate
+"""
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import sys
+import time
+
+import torch
+
+from batch_inference import list_images
+from image_preprocessing import preprocessor
+from inference_backends import BACKENDS, compile_model, validate_agreement
+
+# Models that can be benchmarked, with their module and evaluation folder.
+# Labelled folders are laid out as <data_dir>/<Class>/<image>.
+BENCHMARKS = {
+    "skin_disease": {
+        "module": "Prediciton models/skin_disease_prediciton/main.py",
+        "data_dir": "Prediciton models/skin_disease_prediciton/data/test",
+        "labelled": True,
+    },
+    "hair_fall": {
+        "module": "Prediciton models/hair_fall_prediticition/main.py",
+        "data_dir": "Prediciton models/hair_fall_prediticition/img",
+        "labelled": False,
+    },
+}
+
+STAGES = ["decode", "resize", "normalize", "forward", "softmax"]
+
+# Images held out of the evaluation set to calibrate static_int8
+CALIBRATION_IMAGES = 32
+
+
+def load_predictor(name):
+    """Import a predictor's main.py under a benchmark-specific module name."""
+    path = BENCHMARKS[name]["module"]
+    spec = importlib.util.spec_from_file_location(f"benchmark_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unsupported)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes on Linux
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def collect_samples(data_dir, labelled, classes, limit=None):
+    """Return (image_path, true_class_index or None) pairs for the evaluation set."""
+    samples = []
+    if labelled:
+        for class_index, class_name in enumerate(classes):
+            class_dir = os.path.join(data_dir, class_name)
+            if os.path.isdir(class_dir):
+                samples.extend((path, class_index) for path in list_images(class_dir))
+    else:
+        samples = [(path, None) for path in list_images(data_dir)]
+    return samples[:limit] if limit else samples
+
+
+def split_calibration(samples, count=CALIBRATION_IMAGES):
+    """
+    Hold out up to `count` samples (at most a quarter) for calibration.
+
+    Returns (calibration, evaluation). Every n-th sample is held out, so a
+    labelled set, which is ordered by class, contributes from every class.
+    """
+    count = min(count, len(samples) // 4)
+    if not count:
+        return [], samples
+    step = len(samples) // count
+    held_out = set(range(0, step * count, step))
+    calibration = [sample for i, sample in enumerate(samples) if i in held_out]
+    evaluation = [sample for i, sample in enumerate(samples) if i not in held_out]
+    return calibration, evaluation
+
+
+def run_image(model, path, timings):
+    """Run one image through the pipeline, timing every stage."""
+    start = time.perf_counter()
+    img = preprocessor.decode(path)
+    decoded = time.perf_counter()
+    img = preprocessor.resize(img)
+    resized = time.perf_counter()
+    tensor = preprocessor.normalize(img)
+    normalized = time.perf_counter()
+    with torch.no_grad():
+        output = model(tensor)
+    forwarded = time.perf_counter()
+    probabilities = torch.softmax(output, dim=1)
+    predicted = probabilities.argmax(1).item()
+    done = time.perf_counter()
+
+    timings["decode"].append(decoded - start)
+    timings["resize"].append(resized - decoded)
+    timings["normalize"].append(normalized - resized)
+    timings["forward"].append(forwarded - normalized)
+    timings["softmax"].append(done - forwarded)
+    return predicted
+
+
+def summarize_latency(values):
+    """Mean / p50 / p95 in milliseconds."""
+    if not values:
+        return {"mean_ms": None, "p50_ms": None, "p95_ms": None}
+    ordered = sorted(values)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": statistics.median(ordered) * 1000,
+        "p95_ms": p95 * 1000,
+    }
+
+
+def run_benchmark(name, weights=None, limit=None, warmup=3, backend="fp32", validate=False):
+    """Evaluate one model over its benchmark folder and return a result dict."""
+    config = BENCHMARKS[name]
+    predictor = load_predictor(name)
+    classes = predictor.CLASSES
+    model_path = weights or predictor.MODEL_PATH
+
+    # Calibrating on the images accuracy and agreement are measured on would flatter static_int8,
+    # so the held-out images are left out of the evaluation for every backend
+    calibration, samples = split_calibration(
+        collect_samples(config["data_dir"], config["labelled"], classes))
+    samples = samples[:limit] if limit else samples
+    if not samples:
+        raise SystemExit(f"No images found in {config['data_dir']}")
+
+    def calibration_tensors():
+        return [predictor.preprocess_image(path) for path, _ in calibration]
+
+    load_start = time.perf_counter()
+    model = compile_model(model_path, backend, predictor.load_model, calibration_tensors=calibration_tensors)
+    load_seconds = time.perf_counter() - load_start
+
+    # Top-1 agreement of the compiled/quantized variant against the fp32 model
+    agreement = None
+    if validate and backend != "fp32":
+        reference = predictor.load_model(model_path)
+        tensors = [predictor.preprocess_image(path) for path, _ in samples]
+        agreement = validate_agreement(reference, model, tensors)
+
+    # Warm up so one-off allocations don't skew the latency numbers
+    warmup_timings = {stage: [] for stage in STAGES}
+    for path, _ in samples[:warmup]:
+        run_image(model, path, warmup_timings)
+
+    timings = {stage: [] for stage in STAGES}
+    confusion = [[0] * len(classes) for _ in classes]
+    correct = 0
+    labelled_count = 0
+
+    start = time.perf_counter()
+    for path, true_index in samples:
+        predicted = run_image(model, path, timings)
+        if true_index is not None:
+            labelled_count += 1
+            confusion[true_index][predicted] += 1
+            correct += predicted == true_index
+    elapsed = time.perf_counter() - start
+
+    return {
+        "model": name,
+        "weights": model_path,
+        "backend": backend,
+        "top1_agreement": agreement,
+        "images": len(samples),
+        "calibration_images": len(calibration),
+        "load_seconds": load_seconds,
+        "images_per_second": len(samples) / elapsed if elapsed else None,
+        "accuracy": correct / labelled_count if labelled_count else None,
+        "classes": classes,
+        "confusion_matrix": confusion if labelled_count else None,
+        "stages": {stage: summarize_latency(values) for stage, values in timings.items()},
+        "peak_rss_mb": peak_rss_mb(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def print_report(result):
+    print(f"Model: {result['model']} ({result['weights']}, backend {result['backend']})")
+    print(f"Images: {result['images']}  Load: {result['load_seconds']:.2f}s  "
+          f"Throughput: {result['images_per_second']:.1f} images/sec")
+    if result["accuracy"] is not None:
+        print(f"Accuracy: {result['accuracy']:.2%}")
+    if result["top1_agreement"] is not None:
+        print(f"Top-1 agreement with fp32: {result['top1_agreement']:.2%}")
+    if result["peak_rss_mb"] is not None:
+        print(f"Peak RSS: {result['peak_rss_mb']:.0f} MB")
+
+    print("\nStage latency (ms)     mean      p50      p95")
+    for stage in STAGES:
+        s = result["stages"][stage]
+        if s["mean_ms"] is not None:
+            print(f"  {stage:<18} {s['mean_ms']:8.2f} {s['p50_ms']:8.2f} {s['p95_ms']:8.2f}")
+
+    if result["confusion_matrix"]:
+        classes = result["classes"]
+        print("\nConfusion matrix (rows = true, columns = predicted)")
+        print(" " * 22 + " ".join(f"{i:>4}" for i in range(len(classes))))
+        for i, row in enumerate(result["confusion_matrix"]):
+            print(f"{i:>2} {classes[i][:18]:<18} " + " ".join(f"{count:>4}" for count in row))
+
+
+def compare_runs(current, baseline, max_accuracy_drop=0.01, max_speed_drop=0.10):
+    """
+    Print the difference against a previous run and return a list of regressions.
+    """
+    regressions = []
+    print(f"\nComparison against {baseline.get('weights')} ({baseline.get('timestamp')})")
+
+    if current["accuracy"] is not None and baseline.get("accuracy") is not None:
+        delta = current["accuracy"] - baseline["accuracy"]
+        print(f"  accuracy           {baseline['accuracy']:.2%} -> {current['accuracy']:.2%} ({delta:+.2%})")
+        if delta < -max_accuracy_drop:
+            regressions.append(f"accuracy dropped by {-delta:.2%}")
+
+    old_speed = baseline.get("images_per_second")
+    if old_speed:
+        change = current["images_per_second"] / old_speed - 1
+        print(f"  images/sec         {old_speed:.1f} -> {current['images_per_second']:.1f} ({change:+.1%})")
+        if change < -max_speed_drop:
+            regressions.append(f"throughput dropped by {-change:.1%}")
+
+    for stage in STAGES:
+        old = baseline.get("stages", {}).get(stage, {}).get("mean_ms")
+        new = current["stages"][stage]["mean_ms"]
+        if old and new is not None:
+            print(f"  {stage:<18} {old:.2f} -> {new:.2f} ms ({new / old - 1:+.1%})")
+
+    if baseline.get("peak_rss_mb") and current["peak_rss_mb"]:
+        print(f"  peak RSS           {baseline['peak_rss_mb']:.0f} -> {current['peak_rss_mb']:.0f} MB")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the image prediction models.")
+    parser.add_argument("model", choices=sorted(BENCHMARKS))
+    parser.add_argument("--weights", help="Path to a .pth file (defaults to the module's MODEL_PATH)")
+    parser.add_argument("--limit", type=int, help="Only use the first N images")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--backend", choices=BACKENDS, default="fp32")
+    parser.add_argument("--validate", action="store_true",
+                        help="Report top-1 agreement of the backend against fp32")
+    parser.add_argument("--output", help="Write the run as JSON to this path")
+    parser.add_argument("--compare", help="Previous JSON run to compare against")
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.01)
+    parser.add_argument("--max-speed-drop", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args.model, weights=args.weights, limit=args.limit,
+                           warmup=args.warmup, backend=args.backend, validate=args.validate)
+    print_report(result)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_runs(result, baseline, args.max_accuracy_drop, args.max_speed_drop)
+        if regressions:
+            print("\nRegressions: " + "; ".join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
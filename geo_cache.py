@@ -0,0 +1,184 @@
+# geo_cache.py
+"""
+Persistent cache for Maps lookups.
+
+Geocodes are keyed by the normalized place name ("  New Delhi " and
+"new delhi" share an entry). Nearby searches are bucketed by geohash cell:
+every search whose origin falls in the same cell (about 1.2 x 0.6 km at the
+default precision of 6) shares one entry per radius and place type. The API is
+queried from the cell's centre with the radius widened by the cell's
+half-diagonal, so the entry covers the radius around any origin in the cell;
+callers filter it by distance from their own origin.
+Entries expire after a TTL, and the least recently used ones are evicted
+beyond `max_entries`. The cache lives in SQLite (GEO_CACHE_PATH, default
+.cache/geo_cache.db; set it empty to disable).
+"""
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 6
+
+
+def geohash(lat, lng, precision=GEOHASH_PRECISION):
+    """Standard base32 geohash of a coordinate."""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lng_range, lng) if even else (lat_range, lat)
+        mid = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= mid:
+            value |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+
+def geohash_bounds(cell):
+    """((south, north), (west, east)) of a geohash cell."""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in cell:
+        value = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            interval = lng_range if even else lat_range
+            mid = (interval[0] + interval[1]) / 2
+            if value >> shift & 1:
+                interval[0] = mid
+            else:
+                interval[1] = mid
+            even = not even
+    return tuple(lat_range), tuple(lng_range)
+
+
+def geohash_center(cell):
+    """(lat, lng) of the centre of a geohash cell."""
+    (south, north), (west, east) = geohash_bounds(cell)
+    return (south + north) / 2, (west + east) / 2
+
+
+def geohash_half_diagonal(cell):
+    """Metres from a cell's centre to its farthest corner: how far any point in it can be from the centre."""
+    (south, north), (west, east) = geohash_bounds(cell)
+    center_lat, center_lng = geohash_center(cell)
+    return max(_distance_m(center_lat, center_lng, lat, lng) for lat in (south, north) for lng in (west, east))
+
+
+def _distance_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance in metres (haversine, mean Earth radius)."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2)
+    return 2 * 6371000.0 * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def normalize_place(place_name):
+    """Case-, spacing- and punctuation-insensitive form of a place name."""
+    words = re.sub(r"[^\w,]+", " ", place_name.lower()).replace(",", " , ").split()
+    return " ".join(words).replace(" ,", ",").strip(", ")
+
+
+class GeoCache:
+    """Geocode and nearby-search results in SQLite, with TTL and LRU eviction."""
+
+    def __init__(self, path, geocode_ttl=30 * 24 * 3600, nearby_ttl=24 * 3600, max_entries=50000):
+        self.path = path
+        self.geocode_ttl = geocode_ttl
+        self.nearby_ttl = nearby_ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counters = {"geocode_hits": 0, "geocode_misses": 0, "nearby_hits": 0, "nearby_misses": 0}
+
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with self._db() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS entries ("
+                    "key TEXT PRIMARY KEY, value TEXT, expires_at REAL, last_used REAL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+
+    def _db(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _get(self, key, kind):
+        value = None
+        if self.path:
+            now = time.time()
+            with self._db() as conn:
+                row = conn.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[1] < now:
+                    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                elif row is not None:
+                    conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (now, key))
+                    value = json.loads(row[0])
+        with self._lock:
+            self._counters[f"{kind}_hits" if value is not None else f"{kind}_misses"] += 1
+        return value
+
+    def _put(self, key, value, ttl):
+        if not self.path:
+            return
+        now = time.time()
+        with self._db() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl, now),
+            )
+            conn.execute("DELETE FROM entries WHERE expires_at < ?", (now,))
+            conn.execute(
+                "DELETE FROM entries WHERE key IN ("
+                "SELECT key FROM entries ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def get_geocode(self, place_name):
+        """Cached (lat, lng) for a place name, or None."""
+        value = self._get(f"geocode:{normalize_place(place_name)}", "geocode")
+        return tuple(value) if value is not None else None
+
+    def put_geocode(self, place_name, lat, lng):
+        self._put(f"geocode:{normalize_place(place_name)}", [lat, lng], self.geocode_ttl)
+
+    @staticmethod
+    def nearby_key(cell, radius, place_type):
+        return f"nearby:{cell}:{radius}:{place_type}"
+
+    def get_nearby(self, cell, radius, place_type):
+        """Cached nearby-search results for a geohash cell, or None."""
+        return self._get(self.nearby_key(cell, radius, place_type), "nearby")
+
+    def put_nearby(self, cell, radius, place_type, results):
+        self._put(self.nearby_key(cell, radius, place_type), results, self.nearby_ttl)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters)
+
+
+geo_cache = GeoCache(
+    os.getenv("GEO_CACHE_PATH", ".cache/geo_cache.db") or None,
+    max_entries=int(os.getenv("GEO_CACHE_MAX_ENTRIES", "50000")),
+)
@@ -0,0 +1,186 @@
+# google_clients.py
+"""
+Process-wide factory for Google API clients.
+
+Credentials are read from the service-account file once, refreshed shortly
+before they expire, and shared by every page. Sheets calls go through one
+pooled HTTP session per service account. The Calendar service is built once
+per process, but its httplib2 transport is not thread-safe, and Streamlit runs
+each rerun on a new thread, so requests are executed with a transport checked
+out of a small per-account pool: `request.execute(http=http)` inside
+`with calendar_http(...) as http`. Every HTTP call is timed and exposed
+through `call_stats()`.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+SHEETS_SERVICE_ACCOUNT_FILE = "bits-pilani-postman-f46c5e7cac83.json"
+SHEETS_SCOPES = ["https://spreadsheets.google.com/feeds", 'https://www.googleapis.com/auth/spreadsheets',
+                 "https://www.googleapis.com/auth/drive.file", "https://www.googleapis.com/auth/drive"]
+WORKBOOK_NAME = "bitspilanipost"
+
+# Refresh access tokens this long before they expire, so no request pays for it
+REFRESH_MARGIN = timedelta(minutes=5)
+POOL_SIZE = 10
+
+_lock = threading.RLock()
+_credentials = {}
+_sessions = {}
+_gspread_clients = {}
+_workbooks = {}
+_calendar_services = {}
+_calendar_transports = {}
+_call_stats = {}
+
+
+def _key(service_account_file, scopes):
+    return (service_account_file, tuple(scopes))
+
+
+def get_credentials(service_account_file, scopes):
+    """Cached service-account credentials, proactively refreshed."""
+    from google.oauth2.service_account import Credentials
+
+    key = _key(service_account_file, scopes)
+    with _lock:
+        creds = _credentials.get(key)
+        if creds is None:
+            creds = Credentials.from_service_account_file(service_account_file, scopes=scopes)
+            _credentials[key] = creds
+    _refresh_if_needed(creds)
+    return creds
+
+
+def _refresh_if_needed(creds):
+    from google.auth.transport.requests import Request
+
+    # google-auth keeps expiry as a naive UTC datetime
+    expiring = creds.expiry is None or creds.expiry - REFRESH_MARGIN <= datetime.utcnow()
+    if not creds.token or expiring:
+        with _lock:
+            if not creds.token or creds.expiry is None or creds.expiry - REFRESH_MARGIN <= datetime.utcnow():
+                with timed_call("oauth2 token refresh"):
+                    creds.refresh(Request())
+
+
+def _record_response(response, *args, **kwargs):
+    url = urlparse(response.request.url)
+    _record(f"{response.request.method} {url.netloc}", response.elapsed.total_seconds())
+
+
+def get_session(service_account_file, scopes):
+    """An authorized requests session with a connection pool, shared per account."""
+    from google.auth.transport.requests import AuthorizedSession
+    from requests.adapters import HTTPAdapter
+
+    key = _key(service_account_file, scopes)
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = AuthorizedSession(get_credentials(service_account_file, scopes))
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.hooks["response"].append(_record_response)
+            _sessions[key] = session
+    return session
+
+
+def get_gspread_client(service_account_file=SHEETS_SERVICE_ACCOUNT_FILE, scopes=SHEETS_SCOPES):
+    """A gspread client reusing the pooled session for this service account."""
+    import gspread
+
+    key = _key(service_account_file, scopes)
+    creds = get_credentials(service_account_file, scopes)
+    with _lock:
+        client = _gspread_clients.get(key)
+        if client is None:
+            client = gspread.Client(auth=creds, session=get_session(service_account_file, scopes))
+            _gspread_clients[key] = client
+    return client
+
+
+def open_workbook(name=WORKBOOK_NAME):
+    """The app's spreadsheet, opened once per process."""
+    with _lock:
+        workbook = _workbooks.get(name)
+        if workbook is None:
+            with timed_call("sheets open workbook"):
+                workbook = get_gspread_client().open(name)
+            _workbooks[name] = workbook
+    # Keep the token fresh for callers holding on to the workbook
+    get_credentials(SHEETS_SERVICE_ACCOUNT_FILE, SHEETS_SCOPES)
+    return workbook
+
+
+def get_calendar_service(service_account_file, scopes):
+    """
+    The Calendar v3 service, built once per process. Execute its requests
+    with a transport from `calendar_http`, never the service's own.
+    """
+    from googleapiclient.discovery import build
+
+    key = _key(service_account_file, scopes)
+    creds = get_credentials(service_account_file, scopes)
+    with _lock:
+        service = _calendar_services.get(key)
+        if service is None:
+            with timed_call("calendar discovery build"):
+                service = build("calendar", "v3", credentials=creds, cache_discovery=False)
+            _calendar_services[key] = service
+    return service
+
+
+@contextmanager
+def calendar_http(service_account_file, scopes):
+    """
+    An authorized httplib2 transport for this thread's use only, taken from
+    (and returned to) a per-account pool so connections are reused.
+    """
+    import httplib2
+    from google_auth_httplib2 import AuthorizedHttp
+
+    key = _key(service_account_file, scopes)
+    creds = get_credentials(service_account_file, scopes)
+    with _lock:
+        idle = _calendar_transports.setdefault(key, [])
+        http = idle.pop() if idle else None
+    if http is None:
+        http = AuthorizedHttp(creds, http=httplib2.Http())
+    try:
+        yield http
+    finally:
+        with _lock:
+            if len(idle) < POOL_SIZE:
+                idle.append(http)
+
+
+def _record(name, seconds):
+    with _lock:
+        stats = _call_stats.setdefault(name, {"name": name, "calls": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        stats["calls"] += 1
+        stats["total_seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+
+
+@contextmanager
+def timed_call(name):
+    """Time a block (e.g. an API `execute()`) under `name` in call_stats()."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, time.perf_counter() - start)
+
+
+def call_stats():
+    """Per-endpoint call counts and latency, slowest average first."""
+    with _lock:
+        snapshot = []
+        for stats in _call_stats.values():
+            entry = dict(stats)
+            entry["mean_seconds"] = entry["total_seconds"] / entry["calls"]
+            snapshot.append(entry)
+    return sorted(snapshot, key=lambda entry: entry["mean_seconds"], reverse=True)
@@ -1,9 +1,17 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import pandas as pd
 import math
+import numpy as np
+
+from geo_cache import geo_cache, geohash, geohash_center, geohash_half_diagonal
+from geo_kernels import bearing, haversine
+from hospital_index import get_dataset_refresher, get_hospital_index
 
 # Load environment variables from .env file
 load_dotenv()
@@ -11,34 +19,138 @@ load_dotenv()
 # Get the Google Maps API key from the environment variable
 API_KEY = os.getenv('API_KEY')
 
+# (connect, read) timeouts for every Maps request
+REQUEST_TIMEOUT = (3.05, 10)
+# Parallel Place Details lookups per search
+DETAILS_WORKERS = 8
+SEARCH_RADIUS = 5000  # metres
+# The largest radius Nearby Search accepts
+MAX_PLACES_RADIUS = 50000  # metres
+# Optional offline hospital dataset (CSV or GeoJSON, see hospital_index.py)
+HOSPITAL_DATASET = os.getenv('HOSPITAL_DATASET', '')
+OFFLINE_RESULTS = 20
+# Places results are folded into the dataset in batches, at most this often
+HOSPITAL_REFRESH_SECONDS = float(os.getenv('HOSPITAL_REFRESH_SECONDS', '60'))
+# Geocoding statuses that may succeed if retried later, and those that mean no
+# lookup will succeed until the key or its quota is fixed
+RETRY_STATUSES = {'OVER_QUERY_LIMIT', 'UNKNOWN_ERROR'}
+FATAL_STATUSES = {'OVER_DAILY_LIMIT', 'REQUEST_DENIED'}
+
+class GeocodingUnavailable(Exception):
+    """The Geocoding API couldn't answer: worth retrying later (retry) or not until reconfigured"""
+    def __init__(self, message, retry=True):
+        super().__init__(message)
+        self.retry = retry
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_http_session():
+    """One pooled, keep-alive session for all Maps API calls in this process"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=DETAILS_WORKERS)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+# (lat, lng) if the text is a coordinate pair such as "28.61, 77.21", else None
+def parse_coordinates(text):
+    parts = text.replace(' ', '').split(',')
+    if len(parts) != 2:
+        return None
+    try:
+        lat, lng = float(parts[0]), float(parts[1])
+    except ValueError:
+        return None
+    if -90 <= lat <= 90 and -180 <= lng <= 180:
+        return lat, lng
+    return None
+
 # Function to get latitude and longitude from place name using Google Maps Geocoding API
 def geocode_place(place_name):
-    url = f'https://maps.googleapis.com/maps/api/geocode/json?address={place_name}&key={API_KEY}'
-    response = requests.get(url)
-    data = response.json()
-    
-    if data['status'] == 'OK':
+    coordinates, error = lookup_place(place_name)
+    if error:
+        st.error(error)
+        return None, None
+    return coordinates
+
+# (lat, lng), None on success or None, error message; no UI, so batch jobs can use it too
+def lookup_place(place_name):
+    try:
+        coordinates = locate_place(place_name)
+    except GeocodingUnavailable as e:
+        return None, str(e)
+    if coordinates is None:
+        return None, "Geocoding failed. Please check the place name and try again."
+    return coordinates, None
+
+# (lat, lng) of a place, or None if the Geocoding API doesn't know it. Raises
+# GeocodingUnavailable when the API can't answer (network errors, rate limits,
+# quota), so callers can tell "not found" from "try again later". `throttle` is
+# called before each API request, for batch jobs that rate-limit themselves.
+def locate_place(place_name, throttle=None):
+    # "lat, lng" needs no lookup at all, so searches work without network access
+    coordinates = parse_coordinates(place_name)
+    if coordinates:
+        return coordinates
+
+    # Popular places are geocoded once and then served from the local cache
+    cached = geo_cache.get_geocode(place_name)
+    if cached:
+        return cached
+
+    if throttle:
+        throttle()
+    url = 'https://maps.googleapis.com/maps/api/geocode/json'
+    try:
+        response = get_http_session().get(url, params={'address': place_name, 'key': API_KEY},
+                                          timeout=REQUEST_TIMEOUT)
+        data = response.json()
+    except (requests.RequestException, ValueError) as e:
+        raise GeocodingUnavailable(f"Geocoding request failed: {e}")
+
+    status = data.get('status')
+    if status == 'OK':
         # Get the latitude and longitude from the first result
         lat = data['results'][0]['geometry']['location']['lat']
         lng = data['results'][0]['geometry']['location']['lng']
+        geo_cache.put_geocode(place_name, lat, lng)
         return lat, lng
-    else:
-        st.error("Geocoding failed. Please check the place name and try again.")
-        return None, None
+    if status in RETRY_STATUSES or status in FATAL_STATUSES:
+        message = data.get('error_message') or status
+        raise GeocodingUnavailable(f"Geocoding unavailable: {message}", retry=status in RETRY_STATUSES)
+    return None
 
 # Function to get contact information (phone number) from Google Places API using place_id
 def get_contact_info(place_id):
-    url = f'https://maps.googleapis.com/maps/api/place/details/json?place_id={place_id}&key={API_KEY}'
-    response = requests.get(url)
-    data = response.json()
+    url = 'https://maps.googleapis.com/maps/api/place/details/json'
+    # Only ask for the phone number: smaller responses and cheaper billing
+    params = {'place_id': place_id, 'fields': 'formatted_phone_number', 'key': API_KEY}
+    try:
+        response = get_http_session().get(url, params=params, timeout=REQUEST_TIMEOUT)
+        data = response.json()
+    except (requests.RequestException, ValueError):
+        return 'N/A'
     
-    if data['status'] == 'OK':
+    if data.get('status') == 'OK':
         # Extract phone number if available
         phone_number = data['result'].get('formatted_phone_number', 'N/A')
         return phone_number
     else:
         return 'N/A'
 
+# Phone numbers for several places at once, looked up in parallel
+def get_contact_infos(place_ids):
+    place_ids = list(dict.fromkeys(place_ids))
+    if not place_ids:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(DETAILS_WORKERS, len(place_ids))) as pool:
+        return dict(zip(place_ids, pool.map(get_contact_info, place_ids)))
+
 # Function to calculate distance between two coordinates using Haversine formula
 def calculate_distance(lat1, lng1, lat2, lng2):
     # Convert degrees to radians
@@ -55,15 +167,59 @@ def calculate_distance(lat1, lng1, lat2, lng2):
     distance = R * c
     return distance
 
-# Function to find nearest hospitals using Google Maps Places API
-def find_nearest_hospitals(lat, lng):
-    url = f'https://maps.googleapis.com/maps/api/place/nearbysearch/json?location={lat},{lng}&radius=5000&type=hospital&key={API_KEY}'
-    response = requests.get(url)
-    data = response.json()
+# Nearby-search results within `radius` metres of (lat, lng). Searches from the
+# same geohash cell share one API call: it is made from the cell centre with the
+# radius widened by the cell's half-diagonal, so it covers the radius around any
+# point in the cell, and the raw results are cached per cell, radius and type.
+# Each search then keeps only the places within its own radius. Returns None if
+# the search failed.
+def search_nearby(lat, lng, radius=SEARCH_RADIUS, place_type='hospital'):
+    cell = geohash(lat, lng)
+    results = geo_cache.get_nearby(cell, radius, place_type)
+    if results is None:
+        results = _search_cell(cell, radius, place_type)
+        if results is None:
+            return None
+    return within_radius(lat, lng, results, radius)
+
+# Places results within `radius` metres of (lat, lng)
+def within_radius(lat, lng, results, radius):
+    if not results:
+        return results
+    distances = haversine(lat, lng, [result['geometry']['location']['lat'] for result in results],
+                          [result['geometry']['location']['lng'] for result in results])
+    return [result for result, distance in zip(results, distances.tolist()) if distance * 1000 <= radius]
+
+def _search_cell(cell, radius, place_type):
+    center_lat, center_lng = geohash_center(cell)
+    query_radius = min(radius + math.ceil(geohash_half_diagonal(cell)), MAX_PLACES_RADIUS)
+    url = 'https://maps.googleapis.com/maps/api/place/nearbysearch/json'
+    params = {'location': f'{center_lat},{center_lng}', 'radius': query_radius, 'type': place_type,
+              'key': API_KEY}
+    try:
+        response = get_http_session().get(url, params=params, timeout=REQUEST_TIMEOUT)
+        data = response.json()
+    except (requests.RequestException, ValueError) as e:
+        st.error(f"Hospital search failed: {e}")
+        return None
+
+    if data.get('status') not in ('OK', 'ZERO_RESULTS'):
+        return None
+    # Keep only what the page uses
+    fields = ('name', 'vicinity', 'rating', 'user_ratings_total', 'place_id', 'geometry')
+    results = [{key: result[key] for key in fields if key in result} for result in data.get('results', [])]
+    geo_cache.put_nearby(cell, radius, place_type, results)
+    return results
+
+# Function to find nearest hospitals using Google Maps Places API.
+# Phone numbers need one Place Details call per hospital, so they are only
+# fetched (in parallel) when with_phone is set; the page looks them up lazily.
+def find_nearest_hospitals(lat, lng, with_phone=False, radius=SEARCH_RADIUS):
+    results = search_nearby(lat, lng, radius=radius)
 
     hospitals = []
-    if 'results' in data:
-        for result in data['results']:
+    if results is not None:
+        for result in results:
             name = result.get('name')
             address = result.get('vicinity')
             rating = result.get('rating', 'N/A')  # Default to 'N/A' if no rating
@@ -72,32 +228,86 @@ def find_nearest_hospitals(lat, lng):
             hospital_lat = result['geometry']['location']['lat']
             hospital_lng = result['geometry']['location']['lng']
             
-            # Get the contact information for the hospital
-            phone_number = get_contact_info(place_id)
-            
-            # Calculate the distance to the hospital
-            distance = calculate_distance(lat, lng, hospital_lat, hospital_lng)
-            
             hospitals.append({
                 'name': name, 
                 'address': address, 
                 'rating': rating,
                 'user_ratings_total': user_ratings_total,
-                'phone_number': phone_number,  # Add phone number to the data
-                'distance_km': round(distance, 2),  # Add distance in km
-                'place_id': place_id
+                'phone_number': None,  # Filled in on demand
+                'place_id': place_id,
+                'lat': hospital_lat,
+                'lng': hospital_lng,
             })
     else:
         st.error("No hospitals found.")
     
+    hospitals = rank_by_distance(lat, lng, hospitals)
+    
+    if with_phone:
+        phones = get_contact_infos(hospital['place_id'] for hospital in hospitals)
+        for hospital in hospitals:
+            hospital['phone_number'] = phones.get(hospital['place_id'], 'N/A')
+    
     return hospitals
 
+# Distance (km) and direction from (lat, lng) for every hospital, computed in
+# one vectorized pass, closest first
+def rank_by_distance(lat, lng, hospitals):
+    if not hospitals:
+        return hospitals
+    lats = [hospital['lat'] for hospital in hospitals]
+    lngs = [hospital['lng'] for hospital in hospitals]
+    distances = haversine(lat, lng, lats, lngs)
+    bearings = bearing(lat, lng, lats, lngs)
+    for hospital, distance, direction in zip(hospitals, distances.tolist(), bearings.tolist()):
+        hospital['distance_km'] = round(distance, 2)
+        hospital['bearing_deg'] = round(direction)
+    return [hospitals[i] for i in np.argsort(distances, kind='stable')]
+
+# Nearest hospitals from the offline dataset; no network access needed
+def find_nearest_hospitals_offline(lat, lng, radius=SEARCH_RADIUS):
+    hospitals = get_hospital_index(HOSPITAL_DATASET).nearest(lat, lng, k=OFFLINE_RESULTS, max_km=radius / 1000)
+    hospitals = rank_by_distance(lat, lng, hospitals)
+    for hospital in hospitals:
+        hospital['phone_number'] = hospital['phone_number'] or None
+        hospital['rating'] = hospital['rating'] or 'N/A'
+        hospital['user_ratings_total'] = hospital['user_ratings_total'] or 'N/A'
+    return hospitals
+
+# Places API results also refresh the offline dataset, when there is one. They
+# are queued and written in batches, so searches never wait on (or race over)
+# rewriting the file
+def refresh_dataset(hospitals):
+    if HOSPITAL_DATASET and hospitals:
+        get_dataset_refresher(HOSPITAL_DATASET, HOSPITAL_REFRESH_SECONDS).queue(hospitals)
+
+# Phone number of a hospital, looked up at most once per session
+def show_phone_number(hospital):
+    phones = st.session_state.setdefault("hospital_phones", {})
+    place_id = hospital['place_id']
+    if hospital.get('phone_number'):
+        st.write(f"Phone: {hospital['phone_number']}")
+    elif not place_id:
+        st.write("Phone: N/A")
+    elif place_id in phones:
+        st.write(f"Phone: {phones[place_id]}")
+    elif st.button("Get phone number", key=f"phone-{place_id}"):
+        phones[place_id] = get_contact_info(place_id)
+        st.write(f"Phone: {phones[place_id]}")
+
 # Streamlit App Interface
 def app():
     st.title('Find Nearest Hospitals')
 
     # Input for place name
-    place_name = st.text_input("Enter Your Area/Place Name (e.g., City, Locality)")
+    place_name = st.text_input("Enter Your Area/Place Name (e.g., City, Locality, or \"lat, lng\")")
+    radius_km = st.slider("Search radius (km)", min_value=1, max_value=50, value=SEARCH_RADIUS // 1000)
+
+    offline = False
+    if HOSPITAL_DATASET and os.path.exists(HOSPITAL_DATASET):
+        source = st.radio("Search", ["Offline hospital dataset", "Google Places (also refreshes the dataset)"],
+                          horizontal=True)
+        offline = source == "Offline hospital dataset"
 
     # Button to trigger the search for nearest hospitals
     if st.button("Find Nearest Hospitals"):
@@ -106,31 +316,59 @@ def app():
             lat, lng = geocode_place(place_name)
             
             if lat and lng:
-                st.write(f"Latitude: {lat}, Longitude: {lng}")
-                
-                # Find nearest hospitals
-                hospitals = find_nearest_hospitals(lat, lng)
-                
-                if hospitals:
-                    # Create a DataFrame to display hospitals in a table
-                    df = pd.DataFrame(hospitals)
-                    
-                    # Display hospitals in a more interactive way using st.dataframe
-                    st.markdown("### Nearby Hospitals:")
-                    st.dataframe(df[['name', 'address', 'rating', 'user_ratings_total', 'phone_number', 'distance_km']])
-
-                    # Display clickable links in a systematic format (one below the other)
-                    links = ""
-                    for index, row in df.iterrows():
-                        url = f"https://www.google.com/maps/search/?q={row['name']}+{row['address']}"
-                        links += f'<a href="{url}" target="_blank">{row["name"]}</a><br>'  # Line break for each link
-
-                    # Render the links in the Streamlit app
-                    st.markdown(f"### Click to navigate to the hospitals:<br>{links}", unsafe_allow_html=True)
+                # Results are kept in the session so the phone buttons below survive reruns
+                if offline:
+                    hospitals = find_nearest_hospitals_offline(lat, lng, radius=radius_km * 1000)
                 else:
-                    st.write("No hospitals found.")
+                    hospitals = find_nearest_hospitals(lat, lng, radius=radius_km * 1000)
+                    refresh_dataset(hospitals)
+                st.session_state.hospital_search = {
+                    'lat': lat,
+                    'lng': lng,
+                    'hospitals': hospitals,
+                }
         else:
             st.write("Please enter a place name.")
 
-# Run the app
+    search = st.session_state.get("hospital_search")
+    if not search:
+        return
+
+    st.write(f"Latitude: {search['lat']}, Longitude: {search['lng']}")
+    hospitals = search['hospitals']
+    if not hospitals:
+        st.write("No hospitals found.")
+        return
+
+    phones = st.session_state.setdefault("hospital_phones", {})
+    if st.button("Get all phone numbers"):
+        # One parallel round of Place Details calls for the rows still missing a number
+        phones.update(get_contact_infos(hospital['place_id'] for hospital in hospitals
+                                        if hospital['place_id'] and not hospital.get('phone_number')
+                                        and hospital['place_id'] not in phones))
+
+    # Create a DataFrame to display hospitals in a table
+    df = pd.DataFrame(hospitals)
+    df['phone_number'] = [hospital.get('phone_number') or phones.get(hospital['place_id'], '')
+                          for hospital in hospitals]
+    
+    # Display hospitals in a more interactive way using st.dataframe
+    st.markdown("### Nearby Hospitals:")
+    st.dataframe(df[['name', 'address', 'rating', 'user_ratings_total', 'phone_number', 'distance_km', 'bearing_deg']])
+
+    # Per-hospital details; the phone number is only looked up when asked for
+    for hospital in hospitals:
+        with st.expander(f"{hospital['name']} ({hospital['distance_km']} km)"):
+            st.write(hospital['address'])
+            show_phone_number(hospital)
+
+    # Display clickable links in a systematic format (one below the other)
+    links = ""
+    for index, row in df.iterrows():
+        url = f"https://www.google.com/maps/search/?q={row['name']}+{row['address']}"
+        links += f'<a href="{url}" target="_blank">{row["name"]}</a><br>'  # Line break for each link
 
+    # Render the links in the Streamlit app
+    st.markdown(f"### Click to navigate to the hospitals:<br>{links}", unsafe_allow_html=True)
+
+# Run the app
@@ -0,0 +1,518 @@
+# hospital_index.py
+"""
+Offline hospital dataset with an in-memory spatial index.
+
+Hospitals are loaded from a CSV (name, address, lat, lng and optionally
+phone_number, rating, user_ratings_total, place_id) or a GeoJSON
+FeatureCollection of Points, and indexed as 3D points on the unit sphere in a
+scipy cKDTree, so k-nearest and within-radius queries take microseconds.
+Without scipy a coarse lat/lng grid is used instead. Distances are great-circle
+kilometres on a 6371 km sphere, the same as hosloc.calculate_distance.
+
+The Places API becomes an optional refresher: `merge_hospitals()` folds API
+results into the dataset file (field by field, in the file's own format) and
+`HospitalIndex.add()` into a live index. `DatasetRefresher` batches those
+merges so busy pages rewrite the file, and rebuild its index, at most once
+per interval.
+
+Usage:
+    python hospital_index.py stats hospitals.csv
+    python hospital_index.py nearest hospitals.csv 28.61 77.21 -k 5
+"""
+import argparse
+import atexit
+import csv
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+
+import numpy as np
+
+from geo_kernels import EARTH_RADIUS_KM, haversine, nearest_for_origins, unit_vectors
+# Grid fallback cell size, in degrees
+GRID_CELL_DEGREES = 0.25
+FIELDS = ["name", "address", "lat", "lng", "phone_number", "rating", "user_ratings_total", "place_id"]
+_ALIASES = {"latitude": "lat", "lon": "lng", "long": "lng", "longitude": "lng",
+            "vicinity": "address", "phone": "phone_number"}
+# Placeholders the pages show for unknown values; never stored
+_EMPTY = (None, "", "N/A")
+# Default seconds between dataset writes by a DatasetRefresher
+REFRESH_INTERVAL = 60.0
+
+
+def _field(key):
+    return _ALIASES.get(str(key).lower(), str(key).lower())
+
+
+def _record(properties, lat, lng):
+    record = {field: "" for field in FIELDS}
+    for key, value in properties.items():
+        field = _field(key)
+        if field in record and value not in _EMPTY:
+            record[field] = value
+    record["lat"], record["lng"] = float(lat), float(lng)
+    return record
+
+
+def _is_geojson(path):
+    return path.lower().endswith((".geojson", ".json"))
+
+
+def load_hospitals(path):
+    """Hospital records from a CSV or GeoJSON file; rows without coordinates are skipped."""
+    hospitals = []
+    if _is_geojson(path):
+        with open(path, encoding="utf-8") as f:
+            collection = json.load(f)
+        for feature in collection.get("features", []):
+            geometry = feature.get("geometry") or {}
+            if geometry.get("type") != "Point":
+                continue
+            lng, lat = geometry["coordinates"][:2]
+            hospitals.append(_record(feature.get("properties") or {}, lat, lng))
+        return hospitals
+
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            record = _csv_record(row)
+            if record is not None:
+                hospitals.append(record)
+    return hospitals
+
+
+def _csv_record(row):
+    fields = {_field(key): value for key, value in row.items() if key}
+    try:
+        return _record(fields, fields["lat"], fields["lng"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _dedupe_key(hospital):
+    return hospital.get("place_id") or (hospital["name"], round(hospital["lat"], 4), round(hospital["lng"], 4))
+
+
+def _merge_record(existing, new):
+    """`new` over `existing`, field by field: empty values never replace known ones."""
+    if existing is None:
+        return new
+    merged = dict(existing)
+    merged.update((field, value) for field, value in new.items() if value not in _EMPTY)
+    return merged
+
+
+def _column(field, columns):
+    """The dataset's own column (or property) name for `field`, else the field itself."""
+    for column in columns:
+        if _field(column) == field:
+            return column
+    return field
+
+
+_path_locks = {}
+_path_locks_lock = threading.Lock()
+
+
+def _path_lock(path):
+    with _path_locks_lock:
+        return _path_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def _replace_file(path, write):
+    """Write a file through a uniquely named temporary file, then swap it in."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        # mkstemp files are private; keep the dataset's own permissions
+        os.chmod(tmp_path, os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644)
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def merge_hospitals(path, new_hospitals):
+    """
+    Add or update hospitals (e.g. fresh Places API results) in a CSV or GeoJSON
+    dataset, matching on place_id, else on name and position. Fields are merged
+    one by one, so a result without a phone number keeps the one on file, and
+    columns or properties of the dataset that aren't ours are kept as they are.
+    The file is rewritten in its own format, and only if something changed.
+    Returns the number of hospitals added or updated.
+    """
+    geojson = _is_geojson(path)
+    with _path_lock(path):
+        # Entries are the dataset's own rows (CSV) or feature properties (GeoJSON), updated in place
+        if geojson:
+            collection = {"type": "FeatureCollection", "features": []}
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    collection = json.load(f)
+            features = collection.setdefault("features", [])
+            entries = {}
+            for feature in features:
+                geometry = feature.get("geometry") or {}
+                if geometry.get("type") == "Point":
+                    lng, lat = geometry["coordinates"][:2]
+                    properties = feature["properties"] = feature.get("properties") or {}
+                    entries[_dedupe_key(_record(properties, lat, lng))] = properties
+        else:
+            columns, rows = list(FIELDS), []
+            if os.path.exists(path):
+                with open(path, newline="", encoding="utf-8") as f:
+                    reader = csv.DictReader(f)
+                    rows = list(reader)
+                    columns = list(reader.fieldnames or FIELDS)
+            entries = {}
+            for row in rows:
+                record = _csv_record(row)
+                if record is not None:
+                    entries[_dedupe_key(record)] = row
+
+        changed = 0
+        for hospital in new_hospitals:
+            record = _record(hospital, hospital["lat"], hospital["lng"])
+            key = _dedupe_key(record)
+            entry = entries.get(key)
+            added = entry is None
+            if added:
+                entry = {}
+                entries[key] = entry
+                if geojson:
+                    features.append({"type": "Feature", "properties": entry,
+                                     "geometry": {"type": "Point", "coordinates": [record["lng"], record["lat"]]}})
+                else:
+                    rows.append(entry)
+            updated = False
+            for field, value in record.items():
+                # Positions are part of the match (or the geometry), so only new rows get them
+                if value in _EMPTY or (field in ("lat", "lng") and (geojson or not added)):
+                    continue
+                column = _column(field, entry if geojson else columns)
+                if not geojson and column not in columns:
+                    columns.append(column)
+                if str(entry.get(column, "")) != str(value):
+                    entry[column] = value
+                    updated = True
+            changed += updated
+
+        if changed:
+            if geojson:
+                _replace_file(path, lambda f: json.dump(collection, f, ensure_ascii=False))
+            else:
+                def write_csv(f):
+                    writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+                    writer.writeheader()
+                    writer.writerows(rows)
+                _replace_file(path, write_csv)
+    return changed
+
+
+class DatasetRefresher:
+    """
+    Batches hospitals to fold into a dataset file. Queued records are merged
+    in memory and written by `flush()`, which runs `interval` seconds after
+    the first queued record (and at exit), so every search doesn't rewrite
+    the file and force `get_hospital_index` to rebuild.
+    """
+
+    def __init__(self, path, interval=REFRESH_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.writes = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._timer = None
+        atexit.register(self.flush)
+
+    def queue(self, hospitals):
+        with self._lock:
+            for hospital in hospitals:
+                record = _record(hospital, hospital["lat"], hospital["lng"])
+                key = _dedupe_key(record)
+                self._pending[key] = _merge_record(self._pending.get(key), record)
+            if self._pending and self._timer is None:
+                self._timer = threading.Timer(self.interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Write everything queued so far; returns the number of hospitals added or updated."""
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending = {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return 0
+        try:
+            changed = merge_hospitals(self.path, pending)
+        except Exception:
+            # Keep the records for the next attempt, under anything queued since
+            with self._lock:
+                for record in pending:
+                    key = _dedupe_key(record)
+                    newer = self._pending.get(key)
+                    self._pending[key] = _merge_record(record, newer) if newer else record
+            self.queue([])  # restarts the timer
+            raise
+        if changed:
+            self.writes += 1
+        return changed
+
+
+def _chord(distance_km):
+    """Straight-line distance through the unit sphere for a great-circle distance."""
+    return 2 * math.sin(min(distance_km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+class _Grid:
+    """Fallback index: hospitals bucketed into lat/lng cells, searched ring by ring."""
+
+    def __init__(self, lats, lngs, cell=GRID_CELL_DEGREES):
+        self.cell = cell
+        self.columns = int(round(360 / cell))
+        self.lats, self.lngs = lats, lngs
+        self.buckets = {}
+        rows, columns = self._cells(lats, lngs)
+        for i, key in enumerate(zip(rows, columns)):
+            self.buckets.setdefault(key, []).append(i)
+        # Occupied cells by row and by column, so rings skip the empty ones
+        self.row_columns, self.column_rows = {}, {}
+        for row, column in self.buckets:
+            self.row_columns.setdefault(row, []).append(column)
+            self.column_rows.setdefault(column, []).append(row)
+        self.row_columns = {row: np.array(cells) for row, cells in self.row_columns.items()}
+        self.column_rows = {column: np.array(cells) for column, cells in self.column_rows.items()}
+        self.row_span = (min(rows), max(rows))
+        self.occupied_columns = np.unique(columns)
+        self.max_abs_lat = float(np.max(np.abs(lats)))
+
+    def _cells(self, lats, lngs):
+        rows = np.floor((np.asarray(lats) + 90) / self.cell).astype(int)
+        columns = np.floor((np.asarray(lngs) + 180) / self.cell).astype(int) % self.columns
+        return rows.tolist(), columns.tolist()
+
+    def _column_offsets(self, column, columns):
+        """How many columns away, the short way round, each of `columns` is."""
+        offsets = np.abs(columns - column)
+        return np.minimum(offsets, self.columns - offsets)
+
+    def _ring(self, row, column, ring):
+        """Hospitals in the cells exactly `ring` cells away, walking only the ring's border."""
+        if ring == 0:
+            yield from self.buckets.get((row, column), ())
+            return
+        # Top and bottom edges: every occupied cell no more than ring columns away
+        for r in (row - ring, row + ring):
+            occupied = self.row_columns.get(r)
+            if occupied is not None:
+                for c in occupied[self._column_offsets(column, occupied) <= ring].tolist():
+                    yield from self.buckets[(r, c)]
+        # Left and right edges (the same column once they meet round the back)
+        if 2 * ring > self.columns:
+            return
+        for c in {(column - ring) % self.columns, (column + ring) % self.columns}:
+            occupied = self.column_rows.get(c)
+            if occupied is not None:
+                for r in occupied[np.abs(occupied - row) < ring].tolist():
+                    yield from self.buckets[(r, c)]
+
+    def _reach_km(self, lat, ring):
+        """How far away anything outside the first `ring` rings must be."""
+        # A row further out is more than ring cells of latitude away
+        lat_reach = math.radians(ring * self.cell)
+        # A column further out is more than ring cells of longitude away; by the haversine
+        # formula that is at least this far from anything at the data's latitudes
+        spread = math.radians(min(ring * self.cell, 180.0))
+        across = math.cos(math.radians(lat)) * math.cos(math.radians(self.max_abs_lat)) * math.sin(spread / 2) ** 2
+        lng_reach = 2 * math.asin(math.sqrt(min(max(across, 0.0), 1.0)))
+        return min(lat_reach, lng_reach) * EARTH_RADIUS_KM
+
+    def candidates(self, lat, lng, k=None, radius_km=None):
+        (row,), (column,) = self._cells([lat], [lng])
+        # The ring that reaches the corners of the data's bounding box
+        last_ring = max(row - self.row_span[0], self.row_span[1] - row,
+                        int(self._column_offsets(column, self.occupied_columns).max()))
+        found = []
+        kth_km = math.inf
+        for ring in range(last_ring + 1):
+            before = len(found)
+            found.extend(self._ring(row, column, ring))
+            reach_km = self._reach_km(lat, ring)
+            if radius_km is not None and reach_km >= radius_km:
+                break
+            if k is not None and len(found) >= k:
+                if len(found) > before:
+                    distances = haversine(lat, lng, self.lats[found], self.lngs[found])
+                    kth_km = np.partition(distances, k - 1)[k - 1]
+                if kth_km <= reach_km:
+                    break
+        return np.array(found, dtype=int)
+
+
+class HospitalIndex:
+    """k-nearest and within-radius queries over a set of hospitals."""
+
+    def __init__(self, hospitals):
+        self._lock = threading.Lock()
+        self._build(list(hospitals))
+
+    def _build(self, hospitals):
+        self.hospitals = hospitals
+        self.lats = np.array([hospital["lat"] for hospital in hospitals], dtype=float)
+        self.lngs = np.array([hospital["lng"] for hospital in hospitals], dtype=float)
+        self._tree = self._grid = None
+        if not hospitals:
+            return
+        try:
+            from scipy.spatial import cKDTree
+        except ImportError:
+            self._grid = _Grid(self.lats, self.lngs)
+        else:
+            self._tree = cKDTree(unit_vectors(self.lats, self.lngs))
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(load_hospitals(path))
+
+    def __len__(self):
+        return len(self.hospitals)
+
+    def add(self, hospitals):
+        """Merge new or updated hospitals and rebuild the index."""
+        with self._lock:
+            merged = {_dedupe_key(hospital): hospital for hospital in self.hospitals}
+            for hospital in hospitals:
+                record = _record(hospital, hospital["lat"], hospital["lng"])
+                merged[_dedupe_key(record)] = record
+            self._build(list(merged.values()))
+
+    def _results(self, lat, lng, indices, limit=None, radius_km=None):
+        indices = np.asarray(indices, dtype=int)
+        if indices.size == 0:
+            return []
+        distances = haversine(lat, lng, self.lats[indices], self.lngs[indices])
+        order = np.argsort(distances, kind="stable")
+        results = []
+        for position in order[:limit]:
+            if radius_km is not None and distances[position] > radius_km:
+                break
+            hospital = dict(self.hospitals[indices[position]])
+            hospital["distance_km"] = round(float(distances[position]), 2)
+            results.append(hospital)
+        return results
+
+    def nearest(self, lat, lng, k=10, max_km=None):
+        """The k closest hospitals (optionally within max_km), closest first."""
+        with self._lock:
+            return self._nearest(lat, lng, k, max_km)
+
+    def _nearest(self, lat, lng, k, max_km):
+        if not self.hospitals:
+            return []
+        k = min(k, len(self.hospitals))
+        if self._tree is not None:
+            bound = _chord(max_km) if max_km is not None else np.inf
+            _, indices = self._tree.query(unit_vectors([lat], [lng])[0], k=k, distance_upper_bound=bound)
+            indices = np.atleast_1d(indices)
+            indices = indices[indices < len(self.hospitals)]
+        else:
+            indices = self._grid.candidates(lat, lng, k=k, radius_km=max_km)
+        return self._results(lat, lng, indices, limit=k, radius_km=max_km)
+
+    def nearest_many(self, lats, lngs, k=1):
+        """
+        The k closest hospitals for many points at once: (indices, distances_km)
+        arrays shaped (points, k), closest first. Use `hospitals[i]` for details.
+        """
+        with self._lock:
+            if not self.hospitals:
+                empty = np.empty((len(lats), 0))
+                return empty.astype(int), empty
+            k = min(k, len(self.hospitals))
+            if self._tree is None:
+                return nearest_for_origins(lats, lngs, self.lats, self.lngs, k=k)
+            _, indices = self._tree.query(unit_vectors(lats, lngs), k=k, workers=-1)
+            indices = np.asarray(indices).reshape(len(lats), k)
+            distances = haversine(np.asarray(lats, dtype=float)[:, None], np.asarray(lngs, dtype=float)[:, None],
+                                  self.lats[indices], self.lngs[indices])
+            return indices, distances
+
+    def within(self, lat, lng, radius_km):
+        """All hospitals within radius_km, closest first."""
+        with self._lock:
+            return self._within(lat, lng, radius_km)
+
+    def _within(self, lat, lng, radius_km):
+        if not self.hospitals:
+            return []
+        if self._tree is not None:
+            indices = self._tree.query_ball_point(unit_vectors([lat], [lng])[0], _chord(radius_km))
+        else:
+            indices = self._grid.candidates(lat, lng, radius_km=radius_km)
+        return self._results(lat, lng, indices, radius_km=radius_km)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+_refreshers = {}
+
+
+def get_hospital_index(path):
+    """The process-wide index for a dataset file, reloaded when the file changes."""
+    mtime = os.path.getmtime(path)
+    with _indexes_lock:
+        cached = _indexes.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, HospitalIndex.from_file(path))
+            _indexes[path] = cached
+        return cached[1]
+
+
+def get_dataset_refresher(path, interval=REFRESH_INTERVAL):
+    """The process-wide refresher for a dataset file."""
+    with _indexes_lock:
+        refresher = _refreshers.get(path)
+        if refresher is None:
+            refresher = _refreshers[path] = DatasetRefresher(path, interval)
+        return refresher
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query an offline hospital dataset.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    stats_parser = subparsers.add_parser("stats", help="Load a dataset and report its size")
+    stats_parser.add_argument("path")
+
+    nearest_parser = subparsers.add_parser("nearest", help="Nearest hospitals to a coordinate")
+    nearest_parser.add_argument("path")
+    nearest_parser.add_argument("lat", type=float)
+    nearest_parser.add_argument("lng", type=float)
+    nearest_parser.add_argument("-k", type=int, default=10)
+    nearest_parser.add_argument("--radius-km", type=float, help="Only hospitals within this distance")
+
+    args = parser.parse_args(argv)
+    index = HospitalIndex.from_file(args.path)
+    if args.command == "stats":
+        backend = "cKDTree" if index._tree is not None else "grid"
+        print(f"{len(index)} hospitals indexed ({backend})")
+    else:
+        for hospital in index.nearest(args.lat, args.lng, k=args.k, max_km=args.radius_km):
+            print(f"{hospital['distance_km']:8.2f} km  {hospital['name']}  {hospital['address']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
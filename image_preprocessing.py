@@ -0,0 +1,83 @@
+# image_preprocessing.py
+import threading
+
+import numpy as np
+import torch
+from PIL import Image
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+class ImagePreprocessor:
+    """
+    Reusable decode -> resize -> normalize stage for the image classifiers.
+
+    Equivalent to Resize + ToTensor + Normalize, but:
+      * JPEGs are decoded in draft mode at the smallest DCT scale that is still
+        at least the target size, so large phone photos are never fully decoded
+      * normalization is a single fused NumPy multiply-add written straight into
+        a channels-last tensor
+      * batch buffers are allocated once per thread and reused (pinned when a
+        GPU is available)
+    """
+
+    def __init__(self, size=(224, 224), mean=IMAGENET_MEAN, std=IMAGENET_STD):
+        self.size = size  # (height, width)
+        std = np.asarray(std, dtype=np.float32)
+        mean = np.asarray(mean, dtype=np.float32)
+        # (x / 255 - mean) / std  ==  x * scale + offset
+        self._scale = 1.0 / (255.0 * std)
+        self._offset = -mean / std
+        self._pin = torch.cuda.is_available()
+        self._local = threading.local()
+
+    def decode(self, image):
+        """Open a path or file object as RGB, using reduced-size JPEG decode."""
+        img = Image.open(image)
+        height, width = self.size
+        img.draft("RGB", (width, height))
+        return img.convert("RGB")
+
+    def resize(self, img):
+        height, width = self.size
+        return img.resize((width, height), Image.BILINEAR)
+
+    def normalize(self, img, out=None):
+        """
+        Normalize an already-resized RGB image into a (1, C, H, W) channels-last
+        float tensor. If `out` is given the result is written into it in place.
+        """
+        if out is None:
+            out = self._empty(1)
+        pixels = np.asarray(img, dtype=np.uint8)
+        # A channels-last NCHW tensor is NHWC in memory, so this is a plain view
+        target = out.permute(0, 2, 3, 1).numpy()[0]
+        np.multiply(pixels, self._scale, out=target)
+        np.add(target, self._offset, out=target)
+        return out
+
+    def preprocess(self, image, out=None):
+        """Full pipeline for one image; returns a (1, C, H, W) tensor."""
+        return self.normalize(self.resize(self.decode(image)), out=out)
+
+    def batch_buffer(self, batch_size):
+        """
+        A (batch_size, C, H, W) channels-last buffer owned by the calling thread.
+        It is overwritten by the next batch, so run the forward pass before reuse.
+        """
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None or buffer.shape[0] < batch_size:
+            buffer = self._empty(batch_size)
+            self._local.buffer = buffer
+        return buffer[:batch_size]
+
+    def _empty(self, batch_size):
+        height, width = self.size
+        # Allocate NHWC and view it as NCHW: channels-last strides, pinned if requested
+        nhwc = torch.empty((batch_size, height, width, 3), dtype=torch.float32, pin_memory=self._pin)
+        return nhwc.permute(0, 3, 1, 2)
+
+
+# Shared by both prediction modules
+preprocessor = ImagePreprocessor()
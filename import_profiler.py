@@ -0,0 +1,48 @@
+# import_profiler.py
+import importlib
+import sys
+import threading
+import time
+
+_lock = threading.Lock()
+_profile = {}
+
+
+def import_page(module_name):
+    """
+    Import a page module on first use and record how long it took.
+    Later calls return the already-imported module at no cost.
+    """
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+
+    with _lock:
+        module = sys.modules.get(module_name)
+        if module is not None:
+            return module
+
+        modules_before = len(sys.modules)
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        _profile[module_name] = {
+            "module": module_name,
+            "seconds": time.perf_counter() - start,
+            # Includes clients/dependencies the page pulls in at import time
+            "modules_loaded": len(sys.modules) - modules_before,
+        }
+        return module
+
+
+def report():
+    """Import cost per page module, slowest first."""
+    with _lock:
+        return sorted(_profile.values(), key=lambda entry: entry["seconds"], reverse=True)
+
+
+if __name__ == "__main__":
+    # Profile a cold import of every page: python import_profiler.py home login ...
+    for name in sys.argv[1:]:
+        import_page(name)
+    for entry in report():
+        print(f"{entry['module']:<20} {entry['seconds'] * 1000:9.1f} ms  {entry['modules_loaded']:5d} modules")
@@ -0,0 +1,119 @@
+# inference_backends.py
+"""
+Optional CPU inference backends for the ResNet-18 prediction models.
+
+Backends:
+    fp32          - the eager model returned by `load_model` (default)
+    torchscript   - traced, frozen and inference-optimized TorchScript
+    dynamic_int8  - dynamically quantized Linear layers, then TorchScript
+    static_int8   - FX static int8 quantization calibrated on sample images,
+                    then TorchScript
+
+Compiled artifacts are cached next to the .pth as `<name>.<backend>.pt` and
+rebuilt whenever the .pth is newer than the cached file.
+"""
+import os
+
+import torch
+
+BACKENDS = ("fp32", "torchscript", "dynamic_int8", "static_int8")
+INPUT_SHAPE = (1, 3, 224, 224)
+
+
+def artifact_path(model_path, backend):
+    """Where the compiled variant of `model_path` is cached."""
+    root, _ = os.path.splitext(model_path)
+    return f"{root}.{backend}.pt"
+
+
+def _set_quantized_engine():
+    engines = torch.backends.quantized.supported_engines
+    if "fbgemm" in engines:
+        torch.backends.quantized.engine = "fbgemm"
+    elif "qnnpack" in engines:
+        torch.backends.quantized.engine = "qnnpack"
+
+
+def _example_input():
+    return torch.randn(*INPUT_SHAPE).to(memory_format=torch.channels_last)
+
+
+def _freeze(model):
+    """Trace, freeze and optimize a module for CPU inference."""
+    with torch.no_grad():
+        traced = torch.jit.trace(model, _example_input())
+    frozen = torch.jit.freeze(traced.eval())
+    return torch.jit.optimize_for_inference(frozen)
+
+
+def quantize_dynamic(model):
+    """int8 weights for Linear layers; activations are quantized on the fly."""
+    _set_quantized_engine()
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def quantize_static(model, calibration_tensors):
+    """Post-training static int8 quantization of the whole network via FX."""
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    if not calibration_tensors:
+        raise ValueError("static_int8 needs calibration images")
+
+    _set_quantized_engine()
+    qconfig_mapping = get_default_qconfig_mapping(torch.backends.quantized.engine)
+    # FX quantization works on contiguous tensors; channels-last is re-applied at inference
+    model = model.to(memory_format=torch.contiguous_format)
+    prepared = prepare_fx(model, qconfig_mapping, example_inputs=(torch.randn(*INPUT_SHAPE),))
+    with torch.no_grad():
+        for tensor in calibration_tensors:
+            prepared(tensor.contiguous())
+    return convert_fx(prepared)
+
+
+def compile_model(model_path, backend, build_model, calibration_tensors=None):
+    """
+    Return the model for `backend`, loading a cached artifact when it is fresh.
+
+    `build_model(model_path)` builds the fp32 eager model (the module's
+    `load_model`); it is only called when there is no usable cached artifact.
+    `calibration_tensors` are preprocessed (1, C, H, W) images used for
+    static quantization, or a callable returning them.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}; expected one of {BACKENDS}")
+    if backend == "fp32":
+        return build_model(model_path)
+
+    if backend in ("dynamic_int8", "static_int8"):
+        _set_quantized_engine()
+
+    cached = artifact_path(model_path, backend)
+    if os.path.exists(cached) and os.path.getmtime(cached) >= os.path.getmtime(model_path):
+        return torch.jit.load(cached, map_location="cpu").eval()
+
+    model = build_model(model_path)
+    if backend == "dynamic_int8":
+        model = quantize_dynamic(model)
+    elif backend == "static_int8":
+        if callable(calibration_tensors):
+            calibration_tensors = calibration_tensors()
+        model = quantize_static(model, calibration_tensors)
+
+    compiled = _freeze(model)
+    torch.jit.save(compiled, cached)
+    return compiled
+
+
+def validate_agreement(reference_model, candidate_model, tensors):
+    """
+    Fraction of inputs on which both models predict the same top-1 class.
+    """
+    if not tensors:
+        return None
+    agree = 0
+    with torch.no_grad():
+        for tensor in tensors:
+            tensor = tensor.to(memory_format=torch.channels_last)
+            agree += reference_model(tensor).argmax(1).item() == candidate_model(tensor).argmax(1).item()
+    return agree / len(tensors)
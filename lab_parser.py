@@ -0,0 +1,157 @@
+# lab_parser.py
+"""
+Deterministic extraction of lab values from report text.
+
+Recognises the common layouts of text extracted from lab PDFs:
+
+    Hemoglobin 13.5 g/dL 13.0 - 17.0          (name, value, unit, range)
+    Hemoglobin 13.5 H 13.0 - 17.0 g/dL        (name, value, flag, range, unit)
+    120.00Glucose Fasting  70 - 100 mg/dL     (value glued to the name)
+    SERUM THYROXINE, T4                       (one field per line)
+    98
+    ng/mL
+    52 - 127
+
+Each result is a dict with test, value, unit, low, high, reference and flag
+("low", "high", "normal" or "" when there is no usable range), and lines: the
+(first, last) index of the lines it was read from in text.splitlines(keepends=True).
+`unparsed_text` is the report without any line a result was read from.
+"""
+import re
+
+NUMBER = r"\d+(?:\.\d+)?"
+_RANGE = (
+    rf"(?P<low>{NUMBER})\s*(?:-|–|to)\s*(?P<high>{NUMBER})"
+    rf"|(?:<|≤|<=|upto|up to)\s*(?P<upper>{NUMBER})"
+    rf"|(?:>|≥|>=)\s*(?P<lower>{NUMBER})"
+)
+# mg/dL, µIU/mL, %, cell counts such as 10^3/uL or x10^9/L, and per-volume units such as /cumm
+_UNIT = r"(?:x?10[\^*]\d+/[\w%µμ.]+|/?(?:[%µμ]|[A-Za-z])[\w%µμ/^.*]*)"
+_NAME_TAIL = r"[A-Za-z0-9 ,()'./+-]*?"
+_NAME = rf"[A-Za-z]{_NAME_TAIL}"
+_VALUE = rf"[<>]?\s*{NUMBER}"
+_FLAG = r"(?:\s+(?:H|L|High|Low|\*))?"
+
+LINE_PATTERNS = [
+    # name value [flag] [unit] range
+    re.compile(rf"^(?P<name>{_NAME})\s+(?P<value>{_VALUE}){_FLAG}\s+(?:(?P<unit>{_UNIT})\s+)?(?P<range>{_RANGE})$"),
+    # name value [flag] range unit
+    re.compile(rf"^(?P<name>{_NAME})\s+(?P<value>{_VALUE}){_FLAG}\s+(?P<range>{_RANGE})\s+(?P<unit>{_UNIT})$"),
+    # value glued in front of the name, then range and unit
+    re.compile(rf"^(?P<value>{NUMBER})(?P<name>{_NAME})\s+(?P<range>{_RANGE})\s+(?P<unit>{_UNIT})$"),
+]
+RANGE_PATTERN = re.compile(rf"^(?:{_RANGE})$")
+VALUE_PATTERN = re.compile(rf"^{_VALUE}$")
+UNIT_PATTERN = re.compile(rf"^{_UNIT}$")
+NAME_PATTERN = re.compile(r"^[A-Za-z][A-Za-z0-9 ,()'./+-]{1,60}$")
+
+
+def _float(text):
+    return float(text) if text is not None else None
+
+
+def _result(name, value, unit, match):
+    low = _float(match.group("low") or match.group("lower"))
+    high = _float(match.group("high") or match.group("upper"))
+    number = float(re.sub(r"[<>\s]", "", value))
+    if low is not None and number < low:
+        flag = "low"
+    elif high is not None and number > high:
+        flag = "high"
+    elif low is not None or high is not None:
+        flag = "normal"
+    else:
+        flag = ""
+    return {
+        "test": " ".join(name.split()).strip(" ,"),
+        "value": number,
+        "unit": unit or "",
+        "low": low,
+        "high": high,
+        "reference": " ".join(match.group(0).split()),
+        "flag": flag,
+    }
+
+
+def _parse_line(line):
+    for pattern in LINE_PATTERNS:
+        match = pattern.match(line)
+        if match:
+            reference = RANGE_PATTERN.match(match.group("range"))
+            return _result(match.group("name"), match.group("value"), match.group("unit"), reference)
+    return None
+
+
+def _parse_columns(lines, i):
+    """The one-field-per-line layout: name, value, unit, range on consecutive lines."""
+    if i + 3 >= len(lines):
+        return None
+    name, value, unit, reference = lines[i:i + 4]
+    if not (NAME_PATTERN.match(name) and VALUE_PATTERN.match(value) and UNIT_PATTERN.match(unit)):
+        return None
+    match = RANGE_PATTERN.match(reference)
+    if not match:
+        return None
+    return _result(name, value, unit, match)
+
+
+def _scan(text):
+    """Every result in `text`, duplicates included, with the (first, last) index of its lines."""
+    pieces = text.splitlines(keepends=True)
+    numbered = [(number, piece.strip()) for number, piece in enumerate(pieces) if piece.strip()]
+    lines = [line for _, line in numbered]
+    i = 0
+    while i < len(lines):
+        result = _parse_columns(lines, i)
+        step = 4 if result else 1
+        if result is None:
+            result = _parse_line(lines[i])
+        if result is not None:
+            result["lines"] = (numbered[i][0], numbered[i + step - 1][0])
+            yield result
+        i += step
+
+
+def parse_lab_results(text):
+    """All lab results found in `text`, in report order, without duplicates."""
+    results = []
+    seen = set()
+    for result in _scan(text):
+        key = (result["test"].lower(), result["value"])
+        if key not in seen:
+            seen.add(key)
+            results.append(result)
+    return results
+
+
+def unparsed_text(text):
+    """
+    `text` without the lines parse_lab_results read results from (duplicates
+    included): what a table of the results doesn't already say. Page breaks
+    ("\\f") are kept.
+    """
+    consumed = set()
+    for result in _scan(text):
+        first, last = result["lines"]
+        consumed.update(range(first, last + 1))
+    kept = []
+    for number, piece in enumerate(text.splitlines(keepends=True)):
+        if number not in consumed:
+            kept.append(piece)
+        elif piece.endswith("\f"):
+            kept.append("\f")
+    return "".join(kept)
+
+
+def out_of_range(results):
+    return [result for result in results if result["flag"] in ("low", "high")]
+
+
+def format_results_table(results):
+    """Compact pipe-separated table of results, for prompts."""
+    lines = ["Test | Value | Unit | Reference | Flag"]
+    for result in results:
+        value = f"{result['value']:g}"
+        flag = result["flag"].upper() if result["flag"] in ("low", "high") else result["flag"]
+        lines.append(f"{result['test']} | {value} | {result['unit']} | {result['reference']} | {flag}")
+    return "\n".join(lines)
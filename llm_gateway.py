@@ -0,0 +1,316 @@
+# llm_gateway.py
+"""
+Shared gateway for Groq chat completions.
+
+Responses are cached by a hash of (model, messages, parameters) in an
+in-memory LRU backed by a SQLite tier, both with a TTL. Concurrent identical
+requests are coalesced into one API call. `stream()` yields tokens as they
+arrive; time-to-first-token and total latency of every API call are kept in
+`stats()`. At most `max_concurrency` API calls run at once (a stream counts
+until it has been read to the end or closed), and rate-limited
+(HTTP 429) calls are retried after the server's Retry-After delay or an
+exponential backoff. Set GROQ_BASE_URL to point the client at a local stub server.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _retry_after(error):
+    """Seconds to wait according to a 429 response's Retry-After header, if any."""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def prompt_key(model, messages, params):
+    payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMGateway:
+    def __init__(self, client=None, cache_path=None, ttl=24 * 3600, max_memory_entries=256, max_disk_entries=10000,
+                 max_concurrency=4, max_retries=3):
+        self._client = client
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.max_retries = max_retries
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (expires_at, content)
+        self._inflight = {}  # key -> Future
+        self._local = threading.local()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "coalesced": 0, "misses": 0, "errors": 0,
+                          "rate_limited": 0}
+        self._latency = {}  # (model, mode) -> timings of API calls
+
+        if cache_path:
+            os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+            with self._db() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS completions ("
+                    "key TEXT PRIMARY KEY, content TEXT, expires_at REAL, last_used REAL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS completions_last_used ON completions (last_used)")
+
+    @property
+    def client(self):
+        if self._client is None:
+            from groq import Groq
+
+            self._client = Groq(api_key=os.getenv('GROQ_API_KEY'), base_url=os.getenv('GROQ_BASE_URL') or None)
+        return self._client
+
+    def _db(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.cache_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    # Cache tiers
+
+    def _memory_get(self, key):
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        expires_at, content = entry
+        if expires_at < time.time():
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return content
+
+    def _memory_put(self, key, content):
+        self._memory[key] = (time.time() + self.ttl, content)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key):
+        if not self.cache_path:
+            return None
+        now = time.time()
+        with self._db() as conn:
+            row = conn.execute("SELECT content, expires_at FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE completions SET last_used = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def _disk_put(self, key, content):
+        if not self.cache_path:
+            return
+        now = time.time()
+        with self._db() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO completions (key, content, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, content, now + self.ttl, now),
+            )
+            # Size-bounded: evict expired rows, then the least recently used beyond the cap
+            conn.execute("DELETE FROM completions WHERE expires_at < ?", (now,))
+            conn.execute(
+                "DELETE FROM completions WHERE key IN ("
+                "SELECT key FROM completions ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_entries,),
+            )
+
+    # Completions
+
+    def _claim(self, key):
+        """
+        Return (content, None, False) on a memory hit, else (None, future, owner):
+        the future of an identical request already in flight, or a new one
+        (owner=True) that the caller must resolve.
+        """
+        with self._lock:
+            content = self._memory_get(key)
+            if content is not None:
+                self._counters["memory_hits"] += 1
+                return content, None, False
+            future = self._inflight.get(key)
+            if future is not None:
+                self._counters["coalesced"] += 1
+                return None, future, False
+            future = Future()
+            self._inflight[key] = future
+            return None, future, True
+
+    def _resolve(self, key, future, content=None, error=None):
+        with self._lock:
+            if error is None:
+                self._memory_put(key, content)
+            else:
+                self._counters["errors"] += 1
+            self._inflight.pop(key, None)
+        if error is None:
+            future.set_result(content)
+        else:
+            future.set_exception(error)
+
+    def _create(self, **kwargs):
+        """
+        Start an API call, backing off on rate limits. Returns holding one of
+        the `max_concurrency` slots; the caller releases it with
+        `_slots.release()` once the response has been read.
+        """
+        for attempt in range(self.max_retries + 1):
+            self._slots.acquire()
+            try:
+                return self.client.chat.completions.create(**kwargs)
+            except Exception as e:
+                self._slots.release()
+                if getattr(e, "status_code", None) != 429 or attempt == self.max_retries:
+                    raise
+                delay = _retry_after(e) or 2 ** attempt
+            with self._lock:
+                self._counters["rate_limited"] += 1
+            time.sleep(delay)
+
+    def _record_latency(self, model, mode, first_token, total):
+        with self._lock:
+            timings = self._latency.setdefault((model, mode), {
+                "model": model, "mode": mode, "calls": 0,
+                "first_token_seconds": 0.0, "total_seconds": 0.0, "max_total_seconds": 0.0,
+            })
+            timings["calls"] += 1
+            timings["first_token_seconds"] += first_token
+            timings["total_seconds"] += total
+            timings["max_total_seconds"] = max(timings["max_total_seconds"], total)
+
+    def _cached_or_none(self, key):
+        content = self._disk_get(key)
+        if content is not None:
+            with self._lock:
+                self._counters["disk_hits"] += 1
+        return content
+
+    def _store(self, key, content):
+        self._disk_put(key, content)
+        with self._lock:
+            self._counters["misses"] += 1
+
+    def complete(self, messages, model, **params):
+        """
+        Return the completion text for a chat request, from cache when possible.
+        Identical requests already in flight wait for that call's result.
+        """
+        key = prompt_key(model, messages, params)
+        content, future, owner = self._claim(key)
+        if content is not None:
+            return content
+        if not owner:
+            return future.result()
+
+        try:
+            content = self._cached_or_none(key)
+            if content is None:
+                start = time.perf_counter()
+                response = self._create(messages=messages, model=model, **params)
+                self._slots.release()
+                content = response.choices[0].message.content
+                elapsed = time.perf_counter() - start
+                self._record_latency(model, "complete", elapsed, elapsed)
+                self._store(key, content)
+        except Exception as e:
+            self._resolve(key, future, error=e)
+            raise
+        self._resolve(key, future, content)
+        return content
+
+    def stream(self, messages, model, **params):
+        """
+        Yield the completion text in chunks as the model produces them.
+        Cached (or coalesced) responses arrive as one chunk. The full text is
+        cached once the stream ends, so complete() and stream() share entries.
+        """
+        key = prompt_key(model, messages, params)
+        content, future, owner = self._claim(key)
+        if content is not None:
+            yield content
+            return
+        if not owner:
+            yield future.result()
+            return
+
+        try:
+            content = self._cached_or_none(key)
+            if content is not None:
+                yield content
+            else:
+                start = time.perf_counter()
+                first_token = None
+                parts = []
+                response = self._create(messages=messages, model=model, stream=True, **params)
+                try:
+                    for chunk in response:
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if not delta:
+                            continue
+                        if first_token is None:
+                            first_token = time.perf_counter() - start
+                        parts.append(delta)
+                        yield delta
+                finally:
+                    # The slot is held for the whole generation, not just until the stream opens
+                    self._slots.release()
+                    response.close()
+                content = "".join(parts)
+                total = time.perf_counter() - start
+                self._record_latency(model, "stream", total if first_token is None else first_token, total)
+                self._store(key, content)
+        except GeneratorExit:
+            # The reader stopped early (e.g. a Streamlit rerun): nothing to cache
+            self._resolve(key, future, error=RuntimeError("stream was abandoned before completing"))
+            raise
+        except Exception as e:
+            self._resolve(key, future, error=e)
+            raise
+        self._resolve(key, future, content)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            counters["memory_entries"] = len(self._memory)
+        lookups = counters["memory_hits"] + counters["disk_hits"] + counters["coalesced"] + counters["misses"]
+        hits = lookups - counters["misses"]
+        counters["hit_rate"] = hits / lookups if lookups else None
+        counters["latency"] = self.latency_stats()
+        return counters
+
+    def latency_stats(self):
+        """Mean time-to-first-token vs total latency of API calls, per model and mode."""
+        with self._lock:
+            snapshot = []
+            for timings in self._latency.values():
+                entry = dict(timings)
+                entry["mean_first_token_seconds"] = entry.pop("first_token_seconds") / entry["calls"]
+                entry["mean_total_seconds"] = entry.pop("total_seconds") / entry["calls"]
+                snapshot.append(entry)
+        return snapshot
+
+
+# Shared by every LLM-backed page; LLM_CACHE_PATH="" disables the SQLite tier
+gateway = LLMGateway(
+    cache_path=os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.db") or None,
+    ttl=float(os.getenv("LLM_CACHE_TTL", str(24 * 3600))),
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+)
@@ -1,17 +1,9 @@
 import streamlit as st
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 
-# Set up Google Sheets authentication
-def authenticate_google_sheets():
-    scope = ["https://spreadsheets.google.com/feeds", 'https://www.googleapis.com/auth/spreadsheets', 
-             "https://www.googleapis.com/auth/drive.file", "https://www.googleapis.com/auth/drive"]
-    creds = ServiceAccountCredentials.from_json_keyfile_name("bits-pilani-postman-f46c5e7cac83.json", scope)
-    client = gspread.authorize(creds)
-    return client.open("bitspilanipost").sheet1
+from storage import INVITE_PREFIX, get_user_store, is_activated
 
-# Google Sheets authentication and sheet access
-sheet = authenticate_google_sheets()
+# Users live in the configured store (Google Sheets by default, or SQLite)
+store = get_user_store()
 
 # Registration function
 def register_user():
@@ -23,17 +15,40 @@ def register_user():
     password = st.text_input("Password", type="password")
 
     if st.button("Register"):
-        # Check if email already exists in the Google Sheet
-        records = sheet.get_all_records()
-        for record in records:
-            if record['Email'] == email:
-                st.error("Email already registered!")
-                return
-
-        # If email is unique, add the user to the sheet
-        sheet.append_row([email, username, password])
+        if not email or not password:
+            st.error("Email and password are required")
+            return
+        if password.startswith(INVITE_PREFIX):
+            st.error(f"Passwords can't start with \"{INVITE_PREFIX}\"")
+            return
+        # Add the user unless the email is already registered (imported patients use Activate)
+        if not store.add_user(email, username, password):
+            st.error("Email already registered!")
+            return
         st.success("Registration Successful!")
 
+# Activation of a bulk-imported account, with the invite code the clinic sent
+def activate_account():
+    st.title("Activate Account")
+    st.write("Your clinic added you to Vaidya? Enter the invite code they sent you to choose a password.")
+
+    email = st.text_input("Email")
+    code = st.text_input("Invite code")
+    username = st.text_input("Username")
+    password = st.text_input("Password", type="password")
+
+    if st.button("Activate"):
+        if not email or not code or not password:
+            st.error("Email, invite code and password are required")
+            return
+        if password.startswith(INVITE_PREFIX):
+            st.error(f"Passwords can't start with \"{INVITE_PREFIX}\"")
+            return
+        if not store.activate_user(email, code, username, password):
+            st.error("Invalid email or invite code")
+            return
+        st.success("Account activated! You can now sign in with your new password.")
+
 # Login function
 def login_user():
     st.title("Sign In")
@@ -43,16 +58,19 @@ def login_user():
     password = st.text_input("Password", type="password")
 
     if st.button("Sign In"):
-        # Check if email and password match any entry in Google Sheets
-        records = sheet.get_all_records()
-        for record in records:
-            if record['Email'] == email and record['Password'] == password:
-                # Set session state to logged in
-                st.session_state.logged_in = True
-                st.session_state.email = email
-                st.session_state.username = record['Username']
-                st.success(f"Welcome back, {record['Username']}!")
-                return
+        # Look the user up by email and check the password
+        record = store.get_user(email)
+        if record is not None and not is_activated(record):
+            # Bulk-imported patients have no password until they activate their account
+            st.error("This account hasn't been activated yet. Choose Activate and enter your invite code.")
+            return
+        if record is not None and str(record['Password']) == password:
+            # Set session state to logged in
+            st.session_state.logged_in = True
+            st.session_state.email = email
+            st.session_state.username = record['Username']
+            st.success(f"Welcome back, {record['Username']}!")
+            return
 
         st.error("Invalid email or password")
 
@@ -65,9 +83,11 @@ def app():
         # Here you can redirect to other pages or show options as needed.
     else:
         # Add a sidebar to choose between Register and Login
-        choice = st.sidebar.selectbox("Choose an option", ["Sign In", "Register"])
+        choice = st.sidebar.selectbox("Choose an option", ["Sign In", "Register", "Activate"])
 
         if choice == "Sign In":
             login_user()
         elif choice == "Register":
             register_user()
+        elif choice == "Activate":
+            activate_account()
@@ -2,10 +2,11 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objs as go
-from groq import Groq
 import os
 from dotenv import load_dotenv
 
+from llm_gateway import gateway
+
 def load_emotion_data(filepath):
     """Load and process emotion data from CSV with error handling."""
     columns = ['timestamp', 'role', 'message', 
@@ -56,16 +57,14 @@ def visualize_emotions(df):
     st.plotly_chart(fig_intensity)
 
 # Rest of the code remains the same as in the previous version
-def get_mental_health_analysis(df):
+def get_mental_health_analysis(df, stream=False):
     """Generate mental health analysis using Groq API."""
     load_dotenv()
     groq_api_key = os.getenv("GROQ_API_KEY")
     
     if not groq_api_key:
         st.error("Groq API key not found. Please set GROQ_API_KEY in .env file.")
-        return ""
-    
-    client = Groq(api_key=groq_api_key)
+        return iter(()) if stream else ""
     
     emotion_summary = f"""
     Conversation Emotion Analysis:
@@ -79,7 +78,9 @@ def get_mental_health_analysis(df):
     Context: {df['message'].tolist()}
     """
     
-    completion = client.chat.completions.create(
+    # Cached and deduplicated by the shared gateway; stream=True yields text chunks
+    call = gateway.stream if stream else gateway.complete
+    return call(
         model="llama3-8b-8192",
         messages=[
             {
@@ -94,8 +95,6 @@ def get_mental_health_analysis(df):
         max_tokens=1000,
         temperature=0.7
     )
-    
-    return completion.choices[0].message.content
 
 def main():
     st.title("Emotional Wellness Analysis")
@@ -110,9 +109,8 @@ def main():
         
         st.header("Mental Health Insights")
         if st.button("Generate Mental Health Report"):
-            with st.spinner('Analyzing emotional patterns...'):
-                report = get_mental_health_analysis(df)
-                st.write(report)
+            # Tokens are rendered as they arrive instead of behind a spinner
+            st.write_stream(get_mental_health_analysis(df, stream=True))
     
     except Exception as e:
         st.error(f"Error processing file: {e}")
@@ -0,0 +1,117 @@
+# model_registry.py
+import io
+import os
+import threading
+import time
+
+
+class ModelRegistry:
+    """
+    Process-wide store of loaded prediction models.
+
+    Each classifier is loaded once per process and shared by every Streamlit
+    session, so reruns reuse the warm model instead of re-reading weights.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def _key(self, name, model_path):
+        return (name, os.path.abspath(model_path))
+
+    def get(self, name, loader, model_path):
+        """
+        Return the cached model for `name`, loading it with `loader(model_path)`
+        on first use. Concurrent sessions asking for the same model wait for
+        a single load instead of each deserializing the weights.
+        """
+        key = self._key(name, model_path)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            model = self._models.get(key)
+            if model is not None:
+                return model
+
+            start = time.perf_counter()
+            model = loader(model_path)
+            load_seconds = time.perf_counter() - start
+
+            with self._lock:
+                self._models[key] = model
+                self._stats[key] = {
+                    "name": name,
+                    "model_path": model_path,
+                    "load_seconds": load_seconds,
+                    "memory_bytes": model_memory_bytes(model),
+                    "first_inference_seconds": None,
+                    "inference_count": 0,
+                    "inference_seconds_total": 0.0,
+                }
+            return model
+
+    def record_inference(self, name, model_path, seconds):
+        """Record the latency of one forward pass for a registered model."""
+        key = self._key(name, model_path)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                return
+            if stats["first_inference_seconds"] is None:
+                stats["first_inference_seconds"] = seconds
+            stats["inference_count"] += 1
+            stats["inference_seconds_total"] += seconds
+
+    def evict(self, name, model_path):
+        """Drop a model so the next `get` reloads it (e.g. after new weights)."""
+        key = self._key(name, model_path)
+        with self._lock:
+            self._models.pop(key, None)
+            self._stats.pop(key, None)
+
+    def stats(self):
+        """Return a snapshot of load/inference metrics for every loaded model."""
+        with self._lock:
+            snapshot = []
+            for stats in self._stats.values():
+                entry = dict(stats)
+                count = entry["inference_count"]
+                entry["mean_inference_seconds"] = (
+                    entry["inference_seconds_total"] / count if count else None
+                )
+                snapshot.append(entry)
+            return snapshot
+
+    def total_memory_bytes(self):
+        with self._lock:
+            return sum(stats["memory_bytes"] for stats in self._stats.values())
+
+
+def model_memory_bytes(model):
+    """
+    Approximate size of a torch module's weights, measured by serializing it.
+
+    Frozen TorchScript inlines its weights as constants and quantized layers
+    keep packed params outside `parameters()`, so summing parameters and
+    buffers reports almost nothing for the non-fp32 backends.
+    """
+    import torch
+
+    buffer = io.BytesIO()
+    if isinstance(model, torch.jit.ScriptModule):
+        torch.jit.save(model, buffer)
+    else:
+        torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+# Shared by every session in this process
+registry = ModelRegistry()
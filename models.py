@@ -1,21 +1,77 @@
 # models.py
 import streamlit as st
 import importlib.util
+import re
 import sys
+import threading
+import time
 from pathlib import Path
 
+from model_registry import registry
+from prediction_cache import prediction_cache
+
+# Manifest of prediction plugins: display name -> script path and entry point.
+# Plugins are only imported (along with torch/torchvision) when first selected.
+PREDICTION_PLUGINS = {
+    "Eye Disease Prediction": {"path": "Prediciton models/Eye-Disease-Detection/app.py", "entry": "app"},
+    #"General Disease Prediction": {"path": "Prediciton models/disease_prediction/app.py", "entry": "app"},
+    "Heart Disease Prediction": {"path": "Prediciton models/Heart_Disease_Predictor/app.py", "entry": "app"},
+    "Hairfall Prediction": {"path": "Prediciton models/hair_fall_prediticition/main.py", "entry": "app"},
+    "Skin Disease Prediction": {"path": "Prediciton models/skin_disease_prediciton/main.py", "entry": "app"},
+}
+
+_import_lock = threading.Lock()
+_import_times = {}
+
+
+def plugin_module_name(file_path):
+    """
+    Unique sys.modules key for a script, derived from its full resolved path,
+    so two plugins that are both called main.py never collide.
+    """
+    resolved = Path(file_path).resolve()
+    slug = re.sub(r"\W+", "_", str(resolved.with_suffix(""))).strip("_")
+    return f"vaidya_plugin__{slug}"
+
+
+def available_plugins(manifest=PREDICTION_PLUGINS):
+    """Manifest entries whose script exists in this checkout."""
+    return {name: plugin for name, plugin in manifest.items() if Path(plugin["path"]).exists()}
+
+
+def import_times():
+    """Seconds spent importing each plugin module, keyed by script path."""
+    with _import_lock:
+        return dict(_import_times)
+
+
 def import_app_from_file(file_path):
     """
     Import a module from file path dynamically.
+    The module is imported once per process and reused on later reruns.
     """
     try:
-        module_name = Path(file_path).stem
-        if module_name not in sys.modules:
+        module_name = plugin_module_name(file_path)
+        module = sys.modules.get(module_name)
+        if module is not None:
+            return module
+
+        with _import_lock:
+            module = sys.modules.get(module_name)
+            if module is not None:
+                return module
+
+            start = time.perf_counter()
             spec = importlib.util.spec_from_file_location(module_name, file_path)
             module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
+            sys.modules[module_name] = module
+            try:
+                spec.loader.exec_module(module)
+            except Exception:
+                del sys.modules[module_name]
+                raise
+            _import_times[str(file_path)] = time.perf_counter() - start
             return module
-        return sys.modules[module_name]
     except Exception as e:
         st.error(f"Error loading module {file_path}: {str(e)}")
         return None
@@ -23,14 +79,8 @@ def import_app_from_file(file_path):
 def app():
     st.title("Disease Prediction Models")
     
-    # Dictionary mapping display names to script paths
-    prediction_apps = {
-        "Eye Disease Prediction": "Prediciton models/Eye-Disease-Detection/app.py",
-        #"General Disease Prediction": "Prediciton models/disease_prediction/app.py",
-        "Heart Disease Prediction": "Prediciton models/Heart_Disease_Predictor/app.py",
-        "Hairfall Prediction": "Prediciton models/hair_fall_prediticition/main.py",
-        "Skin Disease Prediction": "Prediciton models/skin_disease_prediciton/main.py"
-    }
+    # Only offer plugins whose script is present
+    prediction_apps = available_plugins()
     
     # Create the dropdown for app selection
     selected_app = st.selectbox(
@@ -42,13 +92,15 @@ def app():
     
     # Load and run the selected app
     if selected_app:
-        script_path = prediction_apps[selected_app]
+        plugin = prediction_apps[selected_app]
+        script_path = plugin["path"]
+        entry = plugin["entry"]
         
         if Path(script_path).exists():
             # Import the selected app module
             app_module = import_app_from_file(script_path)
             
-            if app_module and hasattr(app_module, 'app'):
+            if app_module and hasattr(app_module, entry):
                 # Clear previous content (optional)
                 # st.empty()
                 
@@ -56,9 +108,18 @@ def app():
                 st.markdown("---")
                 
                 # Run the app's main function
-                app_module.app()
+                getattr(app_module, entry)()
+
+                # Show load/inference metrics for the warm, shared models
+                model_stats = registry.stats()
+                if model_stats:
+                    with st.expander("Model runtime metrics"):
+                        st.table(model_stats)
+                        st.caption(f"Total model memory: {registry.total_memory_bytes() / 1e6:.1f} MB")
+                        st.caption(f"Prediction cache: {prediction_cache.stats()}")
+                        st.caption(f"Plugin import times (s): {import_times()}")
             else:
-                st.error(f"The selected app doesn't have the required 'app' function")
+                st.error(f"The selected app doesn't have the required '{entry}' function")
         else:
             st.error(f"App file not found: {script_path}")
 
@@ -0,0 +1,261 @@
+# patient_io.py
+"""
+Bulk import/export of patient profiles (Email, Username, Name .. Lab Report Dates).
+
+Usage:
+    python patient_io.py export patients.csv
+    python patient_io.py export patients.parquet
+    python patient_io.py import clinic.csv --chunk-size 2000
+    python patient_io.py import clinic.parquet --dry-run
+    python patient_io.py invites invites.csv --reissue
+
+Files are streamed in chunks, so memory stays flat regardless of size.
+Parquet support needs pyarrow. Rows that fail validation are written to
+<input>.rejects.csv with the reason; duplicate emails keep the first row.
+Only the columns a file provides are written: existing patients keep any
+field that is missing from the file or blank in their row.
+
+Imported patients who haven't activated their account get a one-time invite
+code, listed in <input>.invites.csv (email, code) for the clinic to send them
+by their own channels; the patient enters it under Activate to set a password.
+The file holds live credentials: deliver it and delete it. `invites` lists a
+code for every account still waiting for activation; with --reissue, codes
+already sent are replaced (and stop working).
+"""
+import argparse
+import contextlib
+import csv
+import os
+import re
+import sys
+import time
+
+from storage import PROFILE_COLUMNS, SheetsUserStore, get_user_store, is_activated
+
+EXPORT_COLUMNS = ["Email", "Username"] + PROFILE_COLUMNS
+
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+GENDERS = {"Male", "Female", "Other"}
+BLOOD_GROUPS = {"A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"}
+# Same bounds as the profile form
+NUMERIC_RANGES = {"Age": (1, 120), "Height": (50, 250), "Weight": (20, 200)}
+
+
+def _is_parquet(path):
+    return path.lower().endswith((".parquet", ".pq"))
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise SystemExit("Parquet files need pyarrow: pip install pyarrow")
+
+
+def read_chunks(path, chunk_size):
+    """Yield lists of row dicts from a CSV or Parquet file."""
+    if _is_parquet(path):
+        _require_pyarrow()
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pylist()
+        return
+
+    with open(path, newline="", encoding="utf-8") as f:
+        chunk = []
+        for row in csv.DictReader(f):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def validate(row):
+    """
+    Return (clean_record, None) or (None, reason). The record only holds the
+    Email and the columns that have a value in this row.
+    """
+    record = {}
+    for column in EXPORT_COLUMNS:
+        value = "" if row.get(column) is None else str(row.get(column)).strip()
+        if value or column == "Email":
+            record[column] = value
+    if not EMAIL_PATTERN.match(record["Email"]):
+        return None, "invalid email"
+
+    if record.get("Gender") and record["Gender"] not in GENDERS:
+        return None, f"invalid gender {record['Gender']!r}"
+    if record.get("Blood Group") and record["Blood Group"] not in BLOOD_GROUPS:
+        return None, f"invalid blood group {record['Blood Group']!r}"
+    for column, (low, high) in NUMERIC_RANGES.items():
+        value = record.get(column)
+        if not value:
+            continue
+        try:
+            number = float(value)
+        except ValueError:
+            return None, f"{column} is not a number"
+        if not low <= number <= high:
+            return None, f"{column} out of range {low}-{high}"
+        record[column] = str(int(number)) if number.is_integer() else str(number)
+    return record, None
+
+
+def import_patients(path, chunk_size=1000, dry_run=False, store=None):
+    """
+    Validate, deduplicate and upsert every patient in `path`, chunk by chunk,
+    issuing invite codes to the imported patients who don't have one yet.
+    """
+    store = store or get_user_store()
+    seen = set()
+    counts = {"read": 0, "imported": 0, "duplicates": 0, "rejected": 0, "invited": 0}
+    rejects_path = f"{path}.rejects.csv"
+    start = time.perf_counter()
+
+    with open(rejects_path, "w", newline="", encoding="utf-8") as rejects_file, \
+            (contextlib.nullcontext() if dry_run else open_invites(f"{path}.invites.csv")) as invites:
+        rejects = csv.writer(rejects_file)
+        rejects.writerow(["row", "email", "reason"])
+
+        for chunk in read_chunks(path, chunk_size):
+            valid = []
+            for row in chunk:
+                counts["read"] += 1
+                record, reason = validate(row)
+                if reason:
+                    counts["rejected"] += 1
+                    rejects.writerow([counts["read"], row.get("Email", ""), reason])
+                    continue
+                if record["Email"] in seen:
+                    counts["duplicates"] += 1
+                    continue
+                seen.add(record["Email"])
+                valid.append(record)
+
+            if valid and not dry_run:
+                store.upsert_profiles(valid)
+                codes = store.issue_invites([record["Email"] for record in valid])
+                store.flush()
+                invites.writerows(codes.items())
+                counts["invited"] += len(codes)
+            counts["imported"] += len(valid)
+            elapsed = time.perf_counter() - start
+            print(f"{counts['read']} rows read, {counts['imported']} imported "
+                  f"({counts['read'] / elapsed:.0f} rows/s)", file=sys.stderr)
+
+    counts["seconds"] = time.perf_counter() - start
+    return counts
+
+
+@contextlib.contextmanager
+def open_invites(path):
+    """CSV writer for (email, code) rows, in a file only its owner can read."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["email", "code"])
+        yield writer
+
+
+def issue_invites(path, reissue=False, store=None):
+    """
+    Write an invite code to `path` for every patient who hasn't activated
+    their account and has no code yet, or for all of them with `reissue`.
+    """
+    store = store or get_user_store()
+    pending = [user["Email"] for user in store.iter_users() if not is_activated(user)]
+    codes = store.issue_invites(pending, reissue=reissue)
+    store.flush()
+    with open_invites(path) as invites:
+        invites.writerows(codes.items())
+    return len(codes)
+
+
+def export_patients(path, chunk_size=1000, store=None):
+    """Stream every patient profile to a CSV or Parquet file."""
+    store = store or get_user_store()
+    written = 0
+
+    def chunks():
+        chunk = []
+        for user in store.iter_users():
+            chunk.append({column: "" if user.get(column) is None else str(user.get(column))
+                          for column in EXPORT_COLUMNS})
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    if _is_parquet(path):
+        _require_pyarrow()
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([(column, pa.string()) for column in EXPORT_COLUMNS])
+        with pq.ParquetWriter(path, schema) as writer:
+            for chunk in chunks():
+                writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+                written += len(chunk)
+    else:
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=EXPORT_COLUMNS)
+            writer.writeheader()
+            for chunk in chunks():
+                writer.writerows(chunk)
+                written += len(chunk)
+    return written
+
+
+def cli_store():
+    """
+    The configured user store for this command. On Sheets it gets its own
+    unjournaled writer: sharing the app's journal file would make the two
+    processes replay and rewrite each other's writes. Every chunk is flushed
+    before the next, and an interrupted import can simply be run again.
+    """
+    if os.getenv("USER_STORE", "sheets") == "sqlite":
+        return get_user_store()
+    return SheetsUserStore(journal=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import/export of patient profiles.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Import patients from CSV/Parquet")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--chunk-size", type=int, default=1000)
+    import_parser.add_argument("--dry-run", action="store_true", help="Validate only, write nothing")
+
+    invites_parser = subparsers.add_parser("invites", help="List invite codes for accounts awaiting activation")
+    invites_parser.add_argument("path")
+    invites_parser.add_argument("--reissue", action="store_true",
+                                help="Replace codes already issued (the old ones stop working)")
+
+    export_parser = subparsers.add_parser("export", help="Export patients to CSV/Parquet")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--chunk-size", type=int, default=1000)
+
+    args = parser.parse_args(argv)
+    if args.command == "import":
+        counts = import_patients(args.path, chunk_size=args.chunk_size, dry_run=args.dry_run, store=cli_store())
+        print(f"Imported {counts['imported']} of {counts['read']} rows in {counts['seconds']:.1f}s "
+              f"({counts['duplicates']} duplicates, {counts['rejected']} rejected -> {args.path}.rejects.csv)")
+        if counts["invited"]:
+            print(f"{counts['invited']} invite codes -> {args.path}.invites.csv")
+    elif args.command == "invites":
+        issued = issue_invites(args.path, reissue=args.reissue, store=cli_store())
+        print(f"{issued} invite codes -> {args.path}")
+    else:
+        written = export_patients(args.path, chunk_size=args.chunk_size, store=cli_store())
+        print(f"Exported {written} patients to {args.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+# pdf_text_cache.py
+"""
+Persistent cache of text extracted from PDF pages.
+
+Entries are keyed by the sha256 of the PDF's bytes and the page number, so a
+rerun, a second analysis of the same report or a duplicate upload never
+parses the PDF again, whatever the file is called. The cache lives in SQLite
+(PDF_TEXT_CACHE_PATH, default .cache/pdf_text.db; set it empty to disable)
+and is capped at PDF_TEXT_CACHE_MB, evicting least recently used documents.
+"""
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+
+BLOCK_SIZE = 1 << 20
+
+
+def document_digest(source):
+    """sha256 of a PDF given as bytes, a path or a file object (read in blocks)."""
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray)):
+        digest.update(source)
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+                digest.update(block)
+    else:
+        position = source.tell()
+        source.seek(0)
+        for block in iter(lambda: source.read(BLOCK_SIZE), b""):
+            digest.update(block)
+        source.seek(position)
+    return digest.hexdigest()
+
+
+class PdfTextCache:
+    """Per-page text of PDFs by content hash, in a size-capped SQLite file."""
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with self._db() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS documents ("
+                    "digest TEXT PRIMARY KEY, pages INTEGER, last_used REAL)"
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS pages ("
+                    "digest TEXT, page INTEGER, text TEXT, size INTEGER, PRIMARY KEY (digest, page))"
+                )
+
+    def _db(self):
+        # One connection per thread, and per process: pool workers may be forked
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def page_count(self, digest):
+        """Number of pages of a known document (None if never seen); marks it recently used."""
+        if not self.path:
+            return None
+        with self._db() as conn:
+            row = conn.execute("SELECT pages FROM documents WHERE digest = ?", (digest,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE documents SET last_used = ? WHERE digest = ?", (time.time(), digest))
+        return row[0] if row else None
+
+    def set_page_count(self, digest, pages):
+        if not self.path:
+            return
+        with self._db() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (digest, pages, last_used) VALUES (?, ?, ?)",
+                (digest, pages, time.time()),
+            )
+
+    def get_page(self, digest, page):
+        text = None
+        if self.path:
+            row = self._db().execute(
+                "SELECT text FROM pages WHERE digest = ? AND page = ?", (digest, page)
+            ).fetchone()
+            text = row[0] if row else None
+        with self._lock:
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return text
+
+    def put_page(self, digest, page, text):
+        if not self.path:
+            return
+        with self._db() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pages (digest, page, text, size) VALUES (?, ?, ?, ?)",
+                (digest, page, text, len(text.encode("utf-8"))),
+            )
+
+    def evict(self):
+        """Drop least recently used documents until the cache fits in max_bytes."""
+        if not self.path:
+            return 0
+        evicted = 0
+        with self._db() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+            rows = conn.execute(
+                "SELECT d.digest, COALESCE(SUM(p.size), 0) FROM documents d "
+                "LEFT JOIN pages p ON p.digest = d.digest GROUP BY d.digest ORDER BY d.last_used"
+            ).fetchall()
+            for digest, size in rows:
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM pages WHERE digest = ?", (digest,))
+                conn.execute("DELETE FROM documents WHERE digest = ?", (digest,))
+                total -= size
+                evicted += 1
+        return evicted
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "page_hits": self.hits,
+                "page_misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+            }
+
+
+def iter_pages(source, cache=None):
+    """
+    Yield the text of each page of a PDF (bytes, path or file object), one at
+    a time. Cached pages are served without opening the PDF at all; the rest
+    are extracted lazily and cached as they go.
+    """
+    import pypdf
+
+    cache = cache or pdf_text_cache
+    digest = document_digest(source)
+    pages = cache.page_count(digest)
+    reader = None
+
+    def open_reader():
+        stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+        if hasattr(stream, "seek"):
+            stream.seek(0)
+        return pypdf.PdfReader(stream)
+
+    if pages is None:
+        reader = open_reader()
+        pages = len(reader.pages)
+        cache.set_page_count(digest, pages)
+
+    for number in range(pages):
+        text = cache.get_page(digest, number)
+        if text is None:
+            if reader is None:
+                reader = open_reader()
+            text = reader.pages[number].extract_text() or ""
+            cache.put_page(digest, number, text)
+        yield text
+    cache.evict()
+
+
+def extract_text(source, separator="\f"):
+    """
+    The whole text of a PDF, pages joined by `separator`. A plain module-level
+    function, so process pools can run it: spawned workers import only this
+    module, not the page that submitted the work.
+    """
+    return separator.join(iter_pages(source))
+
+
+pdf_text_cache = PdfTextCache(
+    os.getenv("PDF_TEXT_CACHE_PATH", ".cache/pdf_text.db") or None,
+    max_bytes=int(float(os.getenv("PDF_TEXT_CACHE_MB", "256")) * 1024 * 1024),
+)
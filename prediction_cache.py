@@ -0,0 +1,118 @@
+# prediction_cache.py
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+def model_version(model_path, backend="fp32"):
+    """
+    Identify a weight file + backend, so replacing the .pth invalidates old entries.
+    """
+    try:
+        stat = os.stat(model_path)
+        return f"{os.path.abspath(model_path)}:{stat.st_size}:{stat.st_mtime_ns}:{backend}"
+    except OSError:
+        return f"{model_path}:{backend}"
+
+
+def image_bytes(image):
+    """Raw bytes of an uploaded file, file object or path."""
+    if hasattr(image, "getvalue"):
+        return image.getvalue()
+    if isinstance(image, (str, os.PathLike)):
+        with open(image, "rb") as f:
+            return f.read()
+    position = image.tell()
+    data = image.read()
+    image.seek(position)
+    return data
+
+
+class PredictionCache:
+    """
+    Bounded LRU of prediction results keyed by image content hash + model version,
+    with an optional on-disk tier shared between processes.
+    """
+
+    def __init__(self, max_entries=1024, disk_dir=None):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key(self, image, version):
+        digest = hashlib.sha256(image_bytes(image))
+        digest.update(version.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(key)) as f:
+                    value = json.load(f)
+            except (OSError, ValueError):
+                value = None
+            if value is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._remember(key, value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+
+        if self.disk_dir:
+            path = self._disk_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so concurrent readers never see a partial file
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)
+
+    def _remember(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else None,
+            }
+
+
+# Shared by both prediction modules; set PREDICTION_CACHE_DIR to enable the disk tier
+prediction_cache = PredictionCache(
+    max_entries=int(os.getenv("PREDICTION_CACHE_SIZE", "1024")),
+    disk_dir=os.getenv("PREDICTION_CACHE_DIR"),
+)
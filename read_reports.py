@@ -1,19 +1,32 @@
-import streamlit as st
-import pypdf
-from groq import Groq
+import itertools
+import multiprocessing
 import os
-from dotenv import load_dotenv
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import streamlit as st
 
-# Load environment variables
-load_dotenv()
+from lab_parser import format_results_table, out_of_range, parse_lab_results, unparsed_text
+from llm_gateway import gateway
+from pdf_text_cache import extract_text
+from report_chunking import PAGE_BREAK, estimate_tokens, map_reduce
 
-# Get API key from .env file
-GROQ_API_KEY = os.getenv('GROQ_API_KEY')
-client = Groq(api_key=GROQ_API_KEY)
+# Several uploaded reports are read in worker processes (text extraction is
+# CPU-bound) and analysed by a bounded pool of LLM calls
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "4"))
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "4"))
+# Estimated prompt tokens allowed for the report itself; llama3-70b-8192 has an
+# 8k context shared by the instructions, the report and the answer
+REPORT_TOKEN_BUDGET = int(os.getenv("REPORT_TOKEN_BUDGET", "5000"))
+ANALYSIS_MODEL = "llama3-70b-8192"
+# Long reports are first condensed chunk by chunk with the smaller, cheaper model
+SUMMARY_MODEL = "llama3-8b-8192"
+
+_pools = {}
+_pools_lock = threading.Lock()
 
 # Custom CSS for professional UI
-st.set_page_config(layout="wide", initial_sidebar_state="collapsed")
-st.markdown("""
+PAGE_CSS = """
 <style>
 .stApp {
     background-color: #f4f6f9;
@@ -37,20 +50,163 @@ h1 {
     text-align: center;
 }
 </style>
-""", unsafe_allow_html=True)
+"""
 
 def extract_text_from_pdf(pdf_file):
-    """Extract text from uploaded PDF file(s)"""
-    texts = []
-    pdf_reader = pypdf.PdfReader(pdf_file)
-    for page in pdf_reader.pages:
-        texts.append(page.extract_text())
-    return " ".join(texts)
-
-def generate_health_recommendations(extracted_text):
-    """Generate health recommendations using Groq API"""
+    """Extract text from an uploaded PDF file (or its bytes)"""
+    # Pages are read one at a time and served from the extracted-text cache when
+    # this exact PDF has been seen before, so reruns never re-parse it.
+    # Page breaks are kept so long reports can be chunked page by page.
+    return extract_text(pdf_file, PAGE_BREAK)
+
+def _pool(kind):
+    """Process-wide pools, shared across reruns and sessions"""
+    with _pools_lock:
+        pool = _pools.get(kind)
+        if pool is None:
+            if kind == "pdf":
+                # Spawned, not forked: the Streamlit server is multithreaded, and a forked child
+                # can inherit a lock some other thread held at the time, and deadlock on it
+                pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                # "analysis" and "summary" pools are separate so an analysis waiting on its
+                # chunk summaries can never starve them of workers
+                pool = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS, thread_name_prefix=f"report-{kind}")
+            _pools[kind] = pool
+        return pool
+
+def analyze_reports(documents):
+    """
+    Extract and analyse several PDFs (a list of bytes) concurrently.
+    Yields (index, lab_results, recommendations) as each document finishes, fastest first.
+    """
+    extractions = {_pool("pdf").submit(extract_text, data, PAGE_BREAK): index
+                   for index, data in enumerate(documents)}
+    analyses = {}
+    pending = set(extractions)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future in extractions:
+                index = extractions.pop(future)
+                try:
+                    extracted_text = future.result()
+                except Exception as e:
+                    yield index, [], f"Could not read PDF: {str(e)}"
+                    continue
+                lab_results = parse_lab_results(extracted_text)
+                # The gateway bounds concurrent API calls and backs off on rate limits
+                analysis = _pool("analysis").submit(generate_health_recommendations, extracted_text,
+                                                    lab_results=lab_results)
+                analyses[analysis] = (index, lab_results)
+                pending.add(analysis)
+            else:
+                index, lab_results = analyses.pop(future)
+                yield index, lab_results, future.result()
+
+TABLE_INTRO = "Lab results from the report (HIGH/LOW: outside the reference range):\n"
+REST_HEADER = "\n\nRest of the report:\n"
+
+def _longest_fit(count, render, budget):
+    """Largest n <= count for which render(n) fits in budget tokens (binary search)"""
+    low, high = 0, count
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(render(middle)) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def lab_table_for_prompt(lab_results, budget=None):
+    """
+    The parsed lab values as a compact flagged table, or "" when none were recognised.
+    Over `budget` tokens, in-range values are listed without their reference range,
+    and if that's still too long the table is cut, in-range values first, saying how many were left out
+    """
+    if not lab_results:
+        return ""
+    table = TABLE_INTRO + format_results_table(lab_results)
+    if budget is None or estimate_tokens(table) <= budget:
+        return table
+
+    abnormal = out_of_range(lab_results)
+    normal = [result for result in lab_results if result["flag"] not in ("low", "high")]
+
+    def render(abnormal_rows, normal_rows):
+        parts = [TABLE_INTRO + format_results_table(abnormal[:abnormal_rows])]
+        if abnormal_rows < len(abnormal):
+            parts.append(f"({len(abnormal) - abnormal_rows} more results outside the reference range left out)")
+        if normal_rows:
+            parts.append("Within the reference range: " + "; ".join(
+                f"{result['test']} {result['value']:g} {result['unit']}".rstrip() for result in normal[:normal_rows]))
+        if normal_rows < len(normal):
+            parts.append(f"({len(normal) - normal_rows} more results within the reference range left out)")
+        return "\n".join(parts)
+
+    # Out-of-range values matter most: they keep their rows for as long as anything fits
+    abnormal_rows = _longest_fit(len(abnormal), lambda n: render(n, 0), budget)
+    if abnormal_rows < len(abnormal):
+        return render(abnormal_rows, 0)
+    return render(abnormal_rows, _longest_fit(len(normal), lambda n: render(abnormal_rows, n), budget))
+
+def report_for_prompt(table, text):
+    """The lab table followed by the rest of the report text, or whichever of the two there is"""
+    if not table:
+        return text
+    if not text.strip():
+        return table
+    return f"{table}{REST_HEADER}{text}"
+
+def prompt_parts(extracted_text, lab_results):
+    """
+    (lab table, report text) to send: the table in place of the lines it was parsed from, with
+    every line the parser didn't understand, so nothing it misses is dropped. When that isn't
+    shorter than the report itself (few values, long table rows), the report goes alone
+    """
+    if not lab_results:
+        return "", extracted_text
+    text = unparsed_text(extracted_text)
+    text_tokens = estimate_tokens(text)
+    # The table may use whatever the text leaves of the budget, but no less than half of it
+    table = lab_table_for_prompt(lab_results, REPORT_TOKEN_BUDGET - min(text_tokens, REPORT_TOKEN_BUDGET // 2))
+    if estimate_tokens(report_for_prompt(table, text)) >= estimate_tokens(extracted_text):
+        return "", extracted_text
+    return table, text
+
+def summarize_chunk(chunk, index, total):
+    """Condense one part of a long report, keeping every clinically relevant finding"""
+    return gateway.complete(
+        messages=[
+            {
+                "role": "system",
+                "content": "You condense medical reports for a doctor. Keep every test name with its value, unit and reference range, every diagnosis and every medication. Drop boilerplate, addresses and disclaimers."
+            },
+            {
+                "role": "user",
+                "content": f"Condense part {index} of {total} of a medical report:\n\n{chunk}"
+            }
+        ],
+        model=SUMMARY_MODEL,
+        temperature=0,
+        max_tokens=600
+    )
+
+def generate_health_recommendations(extracted_text, stream=False, lab_results=None):
+    """Generate health recommendations using Groq API (a generator of text chunks if stream)"""
+    if lab_results is None:
+        lab_results = parse_lab_results(extracted_text)
+    truncated = 0.0
     try:
-        response = client.chat.completions.create(
+        table, text = prompt_parts(extracted_text, lab_results)
+        text_budget = REPORT_TOKEN_BUDGET - (estimate_tokens(table + REST_HEADER) if table else 0)
+        if estimate_tokens(text) > text_budget:
+            # Too long for one prompt: summarize chunks in parallel, then analyse the summaries
+            text, truncated = map_reduce(text, text_budget, summarize_chunk, _pool("summary"))
+        report = report_for_prompt(table, text)
+        # Cached and deduplicated by the shared gateway
+        call = gateway.stream if stream else gateway.complete
+        response = call(
             messages=[
                 {
                     "role": "system",
@@ -58,16 +214,35 @@ def generate_health_recommendations(extracted_text):
                 },
                 {
                     "role": "user", 
-                    "content": f"Analyze this report as if the user does not have any idea about the report and the person is very least knowledgeable in medical field. so analyse the report and tell the person in his language what problem is he actually facing and what precautions and medications also his daily life style should he follow based on the report.\n\n{extracted_text}"
+                    "content": f"Analyze this report as if the user does not have any idea about the report and the person is very least knowledgeable in medical field. so analyse the report and tell the person in his language what problem is he actually facing and what precautions and medications also his daily life style should he follow based on the report.\n\n{report}"
                 }
             ],
-            model="llama3-70b-8192"
+            model=ANALYSIS_MODEL
         )
-        return response.choices[0].message.content
     except Exception as e:
-        return f"Analysis error: {str(e)}"
+        message = f"Analysis error: {str(e)}"
+        return iter([message]) if stream else message
+    if not truncated:
+        return response
+    # Summaries wouldn't shrink enough: tell the reader what the analysis didn't see
+    notice = (f"⚠️ This report was too long to analyse in full. About the last {truncated:.0%} of it was left out, "
+              "so findings near its end may be missing.\n\n")
+    return itertools.chain([notice], response) if stream else notice + response
+
+def show_lab_results(lab_results):
+    """Table of parsed lab values, with out-of-range ones called out"""
+    if not lab_results:
+        return
+    abnormal = out_of_range(lab_results)
+    if abnormal:
+        st.warning("Outside the reference range: " + ", ".join(
+            f"{result['test']} ({result['flag']})" for result in abnormal))
+    st.table([{"Test": result["test"], "Value": f"{result['value']:g}", "Unit": result["unit"],
+               "Reference": result["reference"], "Flag": result["flag"]} for result in lab_results])
 
 def app():
+    # Styles are injected on every render: the page is imported lazily and only once
+    st.markdown(PAGE_CSS, unsafe_allow_html=True)
     st.markdown('<div class="main-container">', unsafe_allow_html=True)
     
     st.title("🩺 AI Medical Report Analyzer")
@@ -84,19 +259,37 @@ def app():
         help="Upload medical reports for comprehensive AI analysis"
     )
     
-    if uploaded_files:
-        for uploaded_file in uploaded_files:
-            with st.spinner(f"Analyzing {uploaded_file.name}..."):
-                extracted_text = extract_text_from_pdf(uploaded_file)
-                recommendations = generate_health_recommendations(extracted_text)
-                
-                st.success(f"Analysis Complete: {uploaded_file.name}")
-                
-                # Expandable section for recommendations
+    if len(uploaded_files) > 1:
+        # One slot per file in upload order, filled in as each analysis completes
+        slots = [st.empty() for _ in uploaded_files]
+        for slot, uploaded_file in zip(slots, uploaded_files):
+            slot.info(f"Analyzing {uploaded_file.name}...")
+        
+        documents = [uploaded_file.getvalue() for uploaded_file in uploaded_files]
+        for index, lab_results, recommendations in analyze_reports(documents):
+            with slots[index].container():
+                st.success(f"Analysis Complete: {uploaded_files[index].name}")
+                show_lab_results(lab_results)
                 with st.expander("View Detailed Recommendations"):
                     st.write(recommendations)
+    elif uploaded_files:
+        uploaded_file = uploaded_files[0]
+        with st.spinner(f"Reading {uploaded_file.name}..."):
+            extracted_text = extract_text_from_pdf(uploaded_file)
+        lab_results = parse_lab_results(extracted_text)
+        show_lab_results(lab_results)
+        
+        # Expandable section for recommendations, filled in as tokens arrive
+        with st.expander(f"Detailed Recommendations: {uploaded_file.name}", expanded=True):
+            try:
+                st.write_stream(generate_health_recommendations(extracted_text, stream=True, lab_results=lab_results))
+                st.success(f"Analysis Complete: {uploaded_file.name}")
+            except Exception as e:
+                st.error(f"Analysis error: {str(e)}")
     
     st.markdown('</div>', unsafe_allow_html=True)
 
 if __name__ == "__main__":
+    # Page config is only ours to set when run standalone; app.py sets it otherwise
+    st.set_page_config(layout="wide", initial_sidebar_state="collapsed")
     app()
\ No newline at end of file
@@ -1,47 +1,27 @@
 import streamlit as st
-from groq import Groq
-from dotenv import load_dotenv
 import os
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime, timedelta
 import pandas as pd
 
-load_dotenv()
-
-# Initialize Groq client
-client = Groq(api_key=os.getenv('GROQ_API_KEY'))
-
-# Set up Google Sheets authentication
-def authenticate_google_sheets():
-    scope = ["https://spreadsheets.google.com/feeds", 'https://www.googleapis.com/auth/spreadsheets', 
-             "https://www.googleapis.com/auth/drive.file", "https://www.googleapis.com/auth/drive"]
-    creds = ServiceAccountCredentials.from_json_keyfile_name("bits-pilani-postman-f46c5e7cac83.json", scope)
-    client = gspread.authorize(creds)
-    return client.open("bitspilanipost")
+from llm_gateway import gateway
+from storage import get_user_store
+from tracking_history import get_tracking_history, get_tracking_writer
 
 # Get user profile data
 def get_user_profile(email):
-    sheet = authenticate_google_sheets().sheet1
     try:
-        records = sheet.get_all_records()
-        for record in records:
-            if record['Email'] == email:
-                return record
-        return None
+        return get_user_store().get_user(email)
     except Exception as e:
         st.error(f"Error fetching profile: {str(e)}")
         return None
 
 # Save daily tracking data
 def save_daily_tracking(email, tracking_data):
-    workbook = authenticate_google_sheets()
-    tracking_sheet = workbook.worksheet("DailyTracking")  # Create this sheet in your spreadsheet
-    
     try:
         tracking_data['Email'] = email
         tracking_data['Date'] = datetime.now().strftime('%Y-%m-%d')
-        tracking_sheet.append_row([
+        # Journaled locally, then flushed to the "DailyTracking" sheet in batches
+        get_tracking_writer().append([
             tracking_data['Date'],
             email,
             tracking_data['sleep_hours'],
@@ -57,7 +37,7 @@ def save_daily_tracking(email, tracking_data):
         st.error(f"Error saving tracking data: {str(e)}")
         return False
 
-def process_data(profile_data, tracking_data):
+def process_data(profile_data, tracking_data, stream=False):
     # Create a comprehensive prompt using both profile and tracking data
     prompt = f"""Given the following patient information and daily tracking data, provide a personalized health recommendation:
 
@@ -90,7 +70,9 @@ def process_data(profile_data, tracking_data):
     """
     
     try:
-        chat_completion = client.chat.completions.create(
+        # Cached and deduplicated by the shared gateway; stream=True yields text chunks
+        call = gateway.stream if stream else gateway.complete
+        return call(
             messages=[
                 {
                     "role": "user",
@@ -101,11 +83,17 @@ def process_data(profile_data, tracking_data):
             temperature=0.7,
             max_tokens=1000
         )
-        return chat_completion.choices[0].message.content
     except Exception as e:
         st.error(f"Error generating recommendation: {str(e)}")
         return None
 
+def show_recommendation(profile_data, tracking_data):
+    """Stream a recommendation onto the page as it is generated."""
+    try:
+        st.write_stream(process_data(profile_data, tracking_data, stream=True))
+    except Exception as e:
+        st.error(f"Error generating recommendation: {str(e)}")
+
 def app():
     if "logged_in" not in st.session_state or not st.session_state.logged_in:
         st.error("Please log in to access health tracking and recommendations.")
@@ -177,12 +165,9 @@ def app():
                 if save_daily_tracking(st.session_state.email, tracking_data):
                     st.success("Daily tracking data saved successfully!")
                     
-                    # Generate and display recommendation
-                    with st.spinner("Generating personalized recommendation..."):
-                        recommendation = process_data(profile_data, tracking_data)
-                        if recommendation:
-                            st.info("Based on your profile and today's data:")
-                            st.write(recommendation)
+                    # Generate and display recommendation as tokens arrive
+                    st.info("Based on your profile and today's data:")
+                    show_recommendation(profile_data, tracking_data)
     
     with tab2:
         st.subheader("Health Insights & Recommendations")
@@ -198,21 +183,31 @@ def app():
                 'notes': notes if 'notes' in locals() else ''
             }
             
-            with st.spinner("Generating personalized recommendation..."):
-                recommendation = process_data(profile_data, tracking_data)
-                if recommendation:
-                    st.info("Your Personalized Health Recommendations:")
-                    st.write(recommendation)
+            st.info("Your Personalized Health Recommendations:")
+            show_recommendation(profile_data, tracking_data)
         
         # Display tracking history
         st.subheader("Your Tracking History")
         try:
-            tracking_sheet = authenticate_google_sheets().worksheet("DailyTracking")
-            tracking_records = tracking_sheet.get_all_records()
-            user_records = [r for r in tracking_records if r['Email'] == st.session_state.email]
-            if user_records:
-                df = pd.DataFrame(user_records)
+            # Only rows added since the last sync are fetched from the sheet
+            history = get_tracking_history()
+            history.sync()
+            
+            history_range = st.selectbox("Show", ["Last 7 days", "Last 30 days", "All time"], index=1)
+            days = {"Last 7 days": 7, "Last 30 days": 30}.get(history_range)
+            start = (datetime.now() - timedelta(days=days - 1)).strftime('%Y-%m-%d') if days else None
+            df = history.dataframe(st.session_state.email, start=start)
+            if not df.empty:
                 st.line_chart(df[['Sleep Hours', 'Water Intake', 'Exercise Minutes']])
+                
+                # Cached per-user rolling averages over the windows ending today
+                averages = history.summary(st.session_state.email)
+                avg_cols = st.columns(4)
+                for col, metric in zip(avg_cols, ['Sleep Hours', 'Water Intake', 'Exercise Minutes', 'Stress Level']):
+                    week, month = averages[f'{metric} (7d avg)'], averages[f'{metric} (30d avg)']
+                    col.metric(f"{metric} (7d avg)", "–" if pd.isna(week) else f"{week:.1f}",
+                               help="Nothing tracked in the last 30 days" if pd.isna(month)
+                               else f"30-day average: {month:.1f}")
             else:
                 st.info("No tracking history available yet. Start tracking your daily health metrics!")
         except Exception as e:
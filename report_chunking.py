@@ -0,0 +1,116 @@
+# report_chunking.py
+"""
+Token-budgeted chunking of long report text.
+
+Token counts are estimated locally, so nothing is sent anywhere to find out
+whether a report fits a model's context. The estimate follows how the Llama 3
+tokenizer splits text: words cost about one token per four letters, numbers
+one token per three digits, and every other symbol (".", "/", "-", "µ") a
+token of its own, so numeric lab tables aren't underestimated. Reports are
+split on page breaks first, then paragraphs, then lines, and only cut mid-line
+as a last resort.
+"""
+import re
+
+PAGE_BREAK = "\f"
+TRUNCATION_MARKER = "\n[Report truncated here: the rest did not fit the model's context]"
+
+_TOKEN_PIECES = re.compile(r"(?P<word>[^\W\d_]+)|(?P<number>\d+)|(?P<newline>\s*\n\s*)|(?P<space>\s+)|(?P<other>.)",
+                           re.DOTALL)
+_COST = {"word": 4, "number": 3}
+
+
+def estimate_tokens(text):
+    """Token count of `text` as the Llama 3 tokenizer would split it, erring on the high side."""
+    tokens = 0
+    for match in _TOKEN_PIECES.finditer(text):
+        kind = match.lastgroup
+        if kind in _COST:
+            tokens += -(-len(match.group()) // _COST[kind])
+        elif kind != "space":
+            tokens += 1
+    return tokens
+
+
+def _prefix_within(text, budget):
+    """Length of the longest prefix of `text` within `budget` tokens."""
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _pieces(text, budget):
+    """Split one oversized section into parts of at most `budget` tokens."""
+    for separator in ("\n\n", "\n"):
+        parts = [part for part in text.split(separator) if part.strip()]
+        if len(parts) > 1:
+            for part in parts:
+                if estimate_tokens(part) > budget:
+                    yield from _pieces(part, budget)
+                else:
+                    yield part
+            return
+    while text:
+        size = max(_prefix_within(text, budget), 1)
+        yield text[:size]
+        text = text[size:]
+
+
+def chunk_text(text, budget):
+    """
+    Pack pages (or smaller pieces of oversized pages) into chunks of at most
+    `budget` estimated tokens, keeping the original order.
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+    for page in text.split(PAGE_BREAK):
+        if not page.strip():
+            continue
+        pieces = [page] if estimate_tokens(page) <= budget else list(_pieces(page, budget))
+        for piece in pieces:
+            # +1 for the newline joining it to the previous piece
+            tokens = estimate_tokens(piece) + (1 if current else 0)
+            if current and current_tokens + tokens > budget:
+                chunks.append("\n".join(current))
+                current, current_tokens = [], 0
+                tokens -= 1
+            current.append(piece)
+            current_tokens += tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def map_reduce(text, budget, summarize, pool, max_rounds=6):
+    """
+    Shrink `text` below `budget` tokens by summarizing its chunks in parallel
+    on `pool` (`summarize(chunk, index, total)` returns a summary) and joining
+    the summaries, repeating while the result is over budget and still
+    shrinking. Returns (text, truncated): if summaries stop shrinking before
+    the text fits, the end is cut off at a chunk boundary and marked, and
+    `truncated` is the fraction of the last round's text that was dropped.
+    """
+    for _ in range(max_rounds):
+        tokens = estimate_tokens(text)
+        if tokens <= budget:
+            return text, 0.0
+        chunks = chunk_text(text, budget)
+        summaries = list(pool.map(summarize, chunks, range(1, len(chunks) + 1), [len(chunks)] * len(chunks)))
+        reduced = PAGE_BREAK.join(summaries)
+        reduced_tokens = estimate_tokens(reduced)
+        if reduced_tokens < tokens:
+            text = reduced
+        if reduced_tokens >= tokens * 0.9:
+            break  # the model won't condense this any further
+    if estimate_tokens(text) <= budget:
+        return text, 0.0
+
+    # Never hand the caller more than the budget, and say so in the text itself
+    kept = chunk_text(text, budget - estimate_tokens(TRUNCATION_MARKER))[0]
+    return kept + TRUNCATION_MARKER, 1 - len(kept) / len(text)
@@ -0,0 +1,154 @@
+# sheets_cache.py
+import os
+import threading
+import time
+
+from batch_writer import BatchWriter, column_index, column_letter, default_journal_dir  # noqa: F401
+
+
+class CachedWorksheet:
+    """
+    Read-through cache with write-back sync in front of one worksheet.
+
+    The sheet is downloaded once into an in-process table with an index on
+    `key_column`, and re-read only when the TTL expires or the cache is
+    invalidated. Writes update the cached rows immediately and are handed to
+    a journaled BatchWriter, which coalesces them into `append_rows` and
+    `batch_update` calls. Updates are queued by key and only located on the
+    sheet when they're sent, since other processes may append rows meanwhile.
+
+    `worksheet` only needs `get_all_records`, `row_values`, `col_values`,
+    `append_rows` and `batch_update`, so a local fake can stand in for Google
+    Sheets.
+    """
+
+    def __init__(self, worksheet, key_column="Email", ttl=60.0, flush_interval=2.0, journal_path=None, journal=True):
+        self.worksheet = worksheet
+        self.key_column = key_column
+        self.ttl = ttl
+        self.version = 0
+        self.reads = 0
+        self.api_reads = 0
+
+        if not journal:
+            journal_path = None
+        elif journal_path is None:
+            journal_path = os.path.join(default_journal_dir(), f"{getattr(worksheet, 'title', 'sheet')}.jsonl")
+        self.writer = BatchWriter(worksheet, journal_path, max_delay=flush_interval)
+
+        self._lock = threading.RLock()
+        self._header = []
+        self._rows = []
+        self._index = {}
+        self._loaded_at = None
+
+    # Reads
+
+    def _ensure_loaded(self):
+        with self._lock:
+            fresh = self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+            if fresh:
+                return
+            # Never let a reload drop writes that haven't reached the sheet yet
+            self.writer.flush()
+            records = self.worksheet.get_all_records()
+            self._header = list(records[0].keys()) if records else self.worksheet.row_values(1)
+            self._rows = [dict(record) for record in records]
+            self._index = {record.get(self.key_column): idx for idx, record in enumerate(self._rows)}
+            if self.key_column in self._header:
+                self.writer.key_column = self._header.index(self.key_column) + 1
+            self._loaded_at = time.monotonic()
+            self.api_reads += 1
+
+    def get(self, key):
+        """Cached record for `key`, or None."""
+        with self._lock:
+            self._ensure_loaded()
+            self.reads += 1
+            idx = self._index.get(key)
+            return dict(self._rows[idx]) if idx is not None else None
+
+    def __contains__(self, key):
+        with self._lock:
+            self._ensure_loaded()
+            return key in self._index
+
+    def records(self):
+        with self._lock:
+            self._ensure_loaded()
+            self.reads += 1
+            return [dict(record) for record in self._rows]
+
+    # Writes
+
+    def append_row(self, values):
+        """Queue a new row; it is visible to reads immediately."""
+        self.append_rows([values])
+
+    def append_rows(self, rows):
+        """Queue several new rows with one journal write."""
+        with self._lock:
+            self._ensure_loaded()
+            for values in rows:
+                record = {column: (values[i] if i < len(values) else "") for i, column in enumerate(self._header)}
+                self._rows.append(record)
+                self._index[record.get(self.key_column)] = len(self._rows) - 1
+            self.writer.append_many(rows)
+            self.version += 1
+
+    def update_row(self, key, first_column, values):
+        """
+        Queue an update of `values` starting at column `first_column` (e.g. "D")
+        in the row for `key`. Returns False if the key is unknown.
+        """
+        return self.update_rows([(key, first_column, values)]) == 1
+
+    def update_rows(self, updates):
+        """
+        Queue several (key, first_column, values) row updates with one journal
+        write. Returns how many keys were found and updated.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            found = []
+            for key, first_column, values in updates:
+                idx = self._index.get(key)
+                if idx is None:
+                    continue
+                start = column_index(first_column)
+                for offset, value in enumerate(values):
+                    position = start - 1 + offset
+                    if position < len(self._header):
+                        self._rows[idx][self._header[position]] = value
+                found.append((key, first_column, values))
+            self.writer.update_many(found)
+            self.version += 1
+            return len(found)
+
+    def invalidate(self):
+        """Drop the cached table; the next read reloads it from the sheet."""
+        with self._lock:
+            self._loaded_at = None
+            self.version += 1
+
+    # Sync
+
+    def flush(self):
+        """Push all queued writes to the sheet now."""
+        self.writer.flush()
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "rows": len(self._rows),
+                "version": self.version,
+                "reads": self.reads,
+                "api_reads": self.api_reads,
+            }
+        stats.update(self.writer.stats())
+        return stats
+
+
+def default_ttl():
+    """Seconds before cached sheet data is re-read (SHEETS_CACHE_TTL)."""
+    return float(os.getenv("SHEETS_CACHE_TTL", "60"))
@@ -0,0 +1,355 @@
+# storage.py
+"""
+Pluggable storage for users, patient profiles and daily tracking.
+
+    USER_STORE=sheets  (default) Google Sheets workbook "bitspilanipost": sheet1
+                       and the DailyTracking worksheet
+    USER_STORE=sqlite  local SQLite database at USER_DB_PATH (default vaidya.db),
+                       so the app runs without Google credentials
+
+Both stores return records as dicts keyed by the sheet's column headers, so
+pages can switch backends without changing how they read a profile. Daily
+tracking goes through `tracking_sheet()`: the DailyTracking worksheet, or a
+table in the SQLite database that answers the same `get`/`append_rows` calls.
+
+Bulk-imported patients have no password. Their accounts can't be signed in to
+or registered over: each gets a one-time invite code, delivered by the clinic,
+and only someone holding it can activate the account and set a password. The
+Password cell holds the code's hash until then.
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import sqlite3
+import threading
+
+from google_clients import open_workbook
+from sheets_cache import CachedWorksheet, column_letter, default_ttl
+
+# Columns A:C of the users sheet
+USER_COLUMNS = ["Email", "Username", "Password"]
+
+# Columns D:V of the users sheet, in order
+PROFILE_COLUMNS = [
+    "Name", "Gender", "Age", "Birth Date", "Disease", "Allergies", "Blood Group",
+    "Height", "Weight", "Emergency Contact", "Previous Surgeries", "Current Medications",
+    "Family History", "Insurance Details", "Recent Lab Tests", "Blood Test Results",
+    "Imaging Reports", "Other Test Results", "Lab Report Dates",
+]
+
+ALL_COLUMNS = USER_COLUMNS + PROFILE_COLUMNS
+
+TRACKING_SHEET = "DailyTracking"
+# Column order of the DailyTracking worksheet (A:I)
+TRACKING_COLUMNS = ["Date", "Email", "Sleep Hours", "Water Intake", "Exercise Minutes",
+                    "Mood", "Stress Level", "Meal Quality", "Notes"]
+
+# Marks a Password cell holding an invite code's hash rather than a password
+INVITE_PREFIX = "invite:"
+
+
+def new_invite():
+    """(code to deliver to the patient, value to store in their Password cell)."""
+    code = secrets.token_urlsafe(16)
+    return code, invite_hash(code)
+
+
+def invite_hash(code):
+    return INVITE_PREFIX + hashlib.sha256(code.strip().encode("utf-8")).hexdigest()
+
+
+def is_activated(record):
+    """True once the user has set a password (imported accounts haven't)."""
+    password = str(record["Password"])
+    return password != "" and not password.startswith(INVITE_PREFIX)
+
+
+def invite_matches(record, code):
+    password = str(record["Password"])
+    return password.startswith(INVITE_PREFIX) and hmac.compare_digest(password, invite_hash(code))
+
+def profile_row(profile):
+    """Profile dict -> list of cell values in D:V order."""
+    return [profile.get(column, "") for column in PROFILE_COLUMNS]
+
+
+def partial_ranges(record):
+    """
+    (first column letter, values) for each run of adjacent Username/profile
+    columns present in `record`, so a partial record only overwrites its own
+    cells. Email and Password (A, C) are never included.
+    """
+    ranges = []
+    previous = None
+    for position, column in enumerate(ALL_COLUMNS):
+        if column not in record or column in ("Email", "Password"):
+            continue
+        if previous == position - 1:
+            ranges[-1][1].append(record[column])
+        else:
+            ranges.append((column_letter(position + 1), [record[column]]))
+        previous = position
+    return ranges
+
+
+class SheetsUserStore:
+    """
+    Users and profiles stored in a Google Sheets worksheet (one row per email),
+    read through an email-indexed in-process cache with batched write-back.
+    Pass `journal=False` for short-lived tools such as patient_io, so they
+    never replay or rewrite the running app's write journal.
+    """
+
+    def __init__(self, worksheet=None, ttl=None, journal=True):
+        self._worksheet = worksheet
+        self._ttl = default_ttl() if ttl is None else ttl
+        self._journal = journal
+        self._cache = None
+        self._lock = threading.Lock()
+        self._activation_lock = threading.Lock()
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            with self._lock:
+                if self._cache is None:
+                    worksheet = self._worksheet or open_workbook().sheet1
+                    self._cache = CachedWorksheet(worksheet, key_column="Email", ttl=self._ttl,
+                                                  journal=self._journal)
+        return self._cache
+
+    def get_user(self, email):
+        return self.cache.get(email)
+
+    def add_user(self, email, username, password):
+        """Append a new user; returns False if the email is already registered."""
+        if self.cache.get(email) is not None:
+            return False
+        self.cache.append_row([email, username, password])
+        return True
+
+    def issue_invites(self, emails, reissue=False):
+        """
+        Give each listed user who hasn't activated their account a new invite
+        code; returns {email: code}. Users who already have a code keep it
+        unless `reissue`, which invalidates the old one.
+        """
+        invites = {}
+        updates = []
+        with self._activation_lock:
+            for email in emails:
+                record = self.cache.get(email)
+                if record is None or is_activated(record) or (str(record["Password"]) and not reissue):
+                    continue
+                code, stored = new_invite()
+                invites[email] = code
+                updates.append((email, "C", [stored]))
+            self.cache.update_rows(updates)
+        return invites
+
+    def activate_user(self, email, code, username, password):
+        """
+        Set the username and password of an imported user holding a valid
+        invite code, which is used up; False if the code doesn't match.
+        """
+        with self._activation_lock:
+            record = self.cache.get(email)
+            if record is None or not invite_matches(record, code):
+                return False
+            return self.cache.update_row(email, "B", [username or record["Username"], password])
+
+    def update_profile(self, email, profile):
+        """Overwrite the profile columns (D:V) for an email; False if not found."""
+        return self.cache.update_row(email, "D", profile_row(profile))
+
+    def iter_users(self):
+        yield from self.cache.records()
+
+    def upsert_profiles(self, records):
+        """
+        Create or update many users' profiles in one batch. Each record holds
+        an Email, optionally a Username, and any profile columns; existing
+        users only have those columns updated. New users are created without
+        a password.
+        """
+        updates = []
+        appends = []
+        for record in records:
+            email = record["Email"]
+            if email in self.cache:
+                updates.extend((email, first_column, values) for first_column, values in partial_ranges(record))
+            else:
+                appends.append([email, record.get("Username", ""), ""] + profile_row(record))
+        self.cache.update_rows(updates)
+        self.cache.append_rows(appends)
+
+    def flush(self):
+        self.cache.flush()
+
+    def tracking_sheet(self):
+        return open_workbook().worksheet(TRACKING_SHEET)
+
+
+class SQLiteUserStore:
+    """
+    Users and profiles in a local SQLite database: the email is the primary key,
+    so lookups are index point queries instead of full-table scans.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        columns = ", ".join(f'"{column}" TEXT' for column in ALL_COLUMNS[1:])
+        with self._connect() as conn:
+            conn.execute(f'CREATE TABLE IF NOT EXISTS users ("Email" TEXT PRIMARY KEY, {columns})')
+
+        quoted = ", ".join(f'"{column}"' for column in ALL_COLUMNS)
+        # Fixed SQL strings, so sqlite3's statement cache keeps them prepared
+        self._select_sql = f'SELECT {quoted} FROM users WHERE "Email" = ?'
+        self._insert_sql = 'INSERT OR IGNORE INTO users ("Email", "Username", "Password") VALUES (?, ?, ?)'
+        self._invite_sql = ('UPDATE users SET "Password" = ? WHERE "Email" = ? AND '
+                            f'(COALESCE("Password", \'\') = \'\' OR (? AND "Password" LIKE \'{INVITE_PREFIX}%\'))')
+        self._activate_sql = (
+            'UPDATE users SET "Username" = COALESCE(NULLIF(?, \'\'), "Username"), "Password" = ? '
+            'WHERE "Email" = ? AND "Password" = ?'
+        )
+        assignments = ", ".join(f'"{column}" = ?' for column in PROFILE_COLUMNS)
+        self._update_sql = f'UPDATE users SET {assignments} WHERE "Email" = ?'
+        self._scan_sql = f'SELECT {quoted} FROM users ORDER BY rowid'
+        self._upsert_sql = {}  # columns -> upsert statement, built on first use
+
+        tracking_columns = ", ".join(f'"{column}" TEXT' for column in TRACKING_COLUMNS)
+        with self._connect() as conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS tracking ({tracking_columns})")
+        quoted = ", ".join(f'"{column}"' for column in TRACKING_COLUMNS)
+        placeholders = ", ".join("?" for _ in TRACKING_COLUMNS)
+        self._tracking_insert_sql = f"INSERT INTO tracking ({quoted}) VALUES ({placeholders})"
+        self._tracking_scan_sql = f"SELECT {quoted} FROM tracking WHERE rowid > ? ORDER BY rowid"
+
+    def _connect(self):
+        """One connection per thread, in WAL mode so readers never block the writer."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, cached_statements=64)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _record(self, row):
+        return {column: ("" if value is None else value) for column, value in zip(ALL_COLUMNS, row)}
+
+    def get_user(self, email):
+        row = self._connect().execute(self._select_sql, (email,)).fetchone()
+        return self._record(row) if row else None
+
+    def add_user(self, email, username, password):
+        with self._connect() as conn:
+            cursor = conn.execute(self._insert_sql, (email, username, password))
+        return cursor.rowcount == 1
+
+    def issue_invites(self, emails, reissue=False):
+        invites = {}
+        with self._connect() as conn:
+            for email in emails:
+                code, stored = new_invite()
+                if conn.execute(self._invite_sql, (stored, email, reissue)).rowcount == 1:
+                    invites[email] = code
+        return invites
+
+    def activate_user(self, email, code, username, password):
+        # The WHERE clause re-checks the stored hash, so a code works only once
+        with self._connect() as conn:
+            cursor = conn.execute(self._activate_sql, (username, password, email, invite_hash(code)))
+        return cursor.rowcount == 1
+
+    def update_profile(self, email, profile):
+        with self._connect() as conn:
+            cursor = conn.execute(self._update_sql, [str(value) for value in profile_row(profile)] + [email])
+        return cursor.rowcount == 1
+
+    def iter_users(self):
+        for row in self._connect().execute(self._scan_sql):
+            yield self._record(row)
+
+    def _upsert_statement(self, columns):
+        """INSERT .. ON CONFLICT for records holding exactly `columns` (Email first)."""
+        sql = self._upsert_sql.get(columns)
+        if sql is None:
+            quoted = ", ".join(f'"{column}"' for column in columns)
+            placeholders = ", ".join("?" for _ in columns)
+            updates = ", ".join(f'"{column}" = excluded."{column}"' for column in columns[1:])
+            conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+            sql = (f'INSERT INTO users ({quoted}, "Password") VALUES ({placeholders}, \'\') '
+                   f'ON CONFLICT("Email") {conflict}')
+            self._upsert_sql[columns] = sql
+        return sql
+
+    def upsert_profiles(self, records):
+        """
+        Create or update many users' profiles in a single transaction. Existing
+        users only have the columns present in their record updated.
+        """
+        groups = {}
+        for record in records:
+            columns = tuple(column for column in ALL_COLUMNS if column in record and column != "Password")
+            groups.setdefault(columns, []).append([str(record[column]) for column in columns])
+        with self._connect() as conn:
+            for columns, rows in groups.items():
+                conn.executemany(self._upsert_statement(columns), rows)
+
+    def flush(self):
+        pass  # writes are committed immediately
+
+    def tracking_sheet(self):
+        return SQLiteTrackingSheet(self)
+
+    def append_tracking(self, rows):
+        """Add DailyTracking rows (lists in TRACKING_COLUMNS order) in one transaction."""
+        rows = [[str(row[i]) if i < len(row) else "" for i in range(len(TRACKING_COLUMNS))] for row in rows]
+        with self._connect() as conn:
+            conn.executemany(self._tracking_insert_sql, rows)
+
+    def tracking_rows(self, after=0):
+        """DailyTracking rows after the first `after`, oldest first (rows are never deleted)."""
+        return [["" if value is None else value for value in row]
+                for row in self._connect().execute(self._tracking_scan_sql, (after,))]
+
+
+class SQLiteTrackingSheet:
+    """
+    The two calls TrackingHistory and BatchWriter make on the DailyTracking
+    worksheet, answered from the tracking table: row 1 is the header, so
+    sheet row n is the (n - 1)th tracking row.
+    """
+
+    title = TRACKING_SHEET
+
+    def __init__(self, store):
+        self.store = store
+
+    def get(self, range_a1):
+        """Rows from the range's first row to the end (the columns are always A:I)."""
+        first_row = int("".join(char for char in range_a1.split(":")[0] if char.isdigit()))
+        return self.store.tracking_rows(after=max(first_row - 2, 0))
+
+    def append_rows(self, rows, **kwargs):
+        self.store.append_tracking(rows)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_user_store():
+    """The process-wide user store selected by USER_STORE."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if os.getenv("USER_STORE", "sheets") == "sqlite":
+                    _store = SQLiteUserStore(os.getenv("USER_DB_PATH", "vaidya.db"))
+                else:
+                    _store = SheetsUserStore()
+    return _store
@@ -1,15 +1,9 @@
 import streamlit as st
-from groq import Groq
-from dotenv import load_dotenv
-import os
 
-load_dotenv()
-
-# Groq Client initialization
-client = Groq(api_key=os.getenv('GROQ_API_KEY'))
+from llm_gateway import gateway
 
 # Function to process the data and get recommendation
-def process_data(height, weight, blood_pressure, notes):
+def process_data(height, weight, blood_pressure, notes, stream=False):
     # Create a prompt for the LLM
     prompt = f"""Given the following patient information, provide a brief health recommendation:
     Height: {height} cm
@@ -25,8 +19,10 @@ def process_data(height, weight, blood_pressure, notes):
     5. Exercise recommendations
     """
     
-    # Make the API call to Groq
-    chat_completion = client.chat.completions.create(
+    # Make the API call to Groq (cached and deduplicated by the shared gateway);
+    # with stream=True this returns a generator of text chunks
+    call = gateway.stream if stream else gateway.complete
+    return call(
         messages=[
             {
                 "role": "user",
@@ -37,9 +33,6 @@ def process_data(height, weight, blood_pressure, notes):
         temperature=0.7,
         max_tokens=800
     )
-    
-    # Extract the recommendation from the response
-    return chat_completion.choices[0].message.content
 
 # Streamlit app frontend
 def app():
@@ -65,13 +58,12 @@ def app():
     # Button to process the data and get recommendation
     if st.button("Get Recommendation", type="primary"):
         if height > 0 and weight > 0 and blood_pressure:
-            with st.spinner("Generating recommendation..."):
-                try:
-                    recommendation = process_data(height, weight, blood_pressure, notes)
-                    st.success("Recommendation Generated!")
-                    st.write(recommendation)
-                except Exception as e:
-                    st.error(f"An error occurred: {str(e)}")
+            try:
+                # Tokens are rendered as they arrive instead of behind a spinner
+                st.write_stream(process_data(height, weight, blood_pressure, notes, stream=True))
+                st.success("Recommendation Generated!")
+            except Exception as e:
+                st.error(f"An error occurred: {str(e)}")
         else:
             st.warning("Please fill in all required fields (Height, Weight, and Blood Pressure).")
 
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# The app's modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_sheets import FakeWorksheet  # noqa: E402
+from storage import ALL_COLUMNS, SheetsUserStore, SQLiteUserStore  # noqa: E402
+
+
+@pytest.fixture(params=["sqlite", "sheets"])
+def make_store(request, tmp_path, monkeypatch):
+    """Builds a user store of each backend, holding `users` (dicts of ALL_COLUMNS values)."""
+    def make(users=()):
+        if request.param == "sqlite":
+            store = SQLiteUserStore(str(tmp_path / "users.db"))
+            for user in users:
+                store.add_user(user["Email"], user.get("Username", ""), user.get("Password", ""))
+                store.update_profile(user["Email"], user)
+            return store
+        monkeypatch.setenv("WRITE_JOURNAL_DIR", str(tmp_path / "journal"))
+        sheet = FakeWorksheet(ALL_COLUMNS, [[user.get(column, "") for column in ALL_COLUMNS] for user in users])
+        return SheetsUserStore(sheet, ttl=3600)
+    return make
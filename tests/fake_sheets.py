@@ -0,0 +1,108 @@
+# fake_sheets.py
+"""
+In-memory stand-in for a gspread worksheet, for testing the Sheets cache and
+stores without Google credentials.
+
+Implements the methods CachedWorksheet relies on (`get_all_records`,
+`row_values`, `col_values`, `append_rows`, `batch_update`) and the `get` that
+TrackingHistory syncs with, counts API calls and records the ranges read with
+`get`, and can be told to fail the next call to a method.
+"""
+import re
+import threading
+
+from sheets_cache import column_index, column_letter
+
+_RANGE = re.compile(r"^([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?$")
+_RANGE_START = re.compile(r"^[A-Z]+(\d+)")
+
+
+class FakeWorksheet:
+    def __init__(self, header, rows=(), title="fake"):
+        self.title = title
+        self.header = list(header)
+        self.rows = [list(row) for row in rows]
+        self.calls = {"get_all_records": 0, "row_values": 0, "col_values": 0, "append_rows": 0, "batch_update": 0,
+                      "get": 0}
+        self.ranges_read = []
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    def fail_next(self, method, error=None):
+        """Make the next call to `method` raise `error` (a RuntimeError by default)."""
+        self._failures[method] = error or RuntimeError(f"{method} failed")
+
+    def _call(self, method):
+        self.calls[method] += 1
+        error = self._failures.pop(method, None)
+        if error is not None:
+            raise error
+
+    def _padded(self, row):
+        return list(row) + [""] * (len(self.header) - len(row))
+
+    def get_all_records(self):
+        with self._lock:
+            self._call("get_all_records")
+            return [dict(zip(self.header, self._padded(row))) for row in self.rows]
+
+    def row_values(self, row):
+        with self._lock:
+            self._call("row_values")
+            values = self.header if row == 1 else self.rows[row - 2]
+            return list(values)
+
+    def get(self, range_a1):
+        """Rows of an open-ended range such as "A5:I", as the API returns them: trailing blanks trimmed."""
+        with self._lock:
+            self._call("get")
+            self.ranges_read.append(range_a1)
+            first_row = int(_RANGE_START.match(range_a1).group(1))
+            rows = []
+            for row in self.rows[first_row - 2:]:
+                row = [str(value) for value in row]
+                while row and row[-1] == "":
+                    row.pop()
+                rows.append(row)
+            while rows and not rows[-1]:
+                rows.pop()
+            return rows
+
+    def col_values(self, col):
+        with self._lock:
+            self._call("col_values")
+            return [row[col - 1] if len(row) >= col else "" for row in [self.header] + self.rows]
+
+    def append_rows(self, rows, **kwargs):
+        with self._lock:
+            self._call("append_rows")
+            first = len(self.rows) + 2
+            self.rows.extend(list(row) for row in rows)
+            last = len(self.rows) + 1
+            width = max(len(row) for row in rows)
+            return {"updates": {"updatedRange": f"'{self.title}'!A{first}:{column_letter(width)}{last}",
+                                "updatedRows": len(rows)}}
+
+    def batch_update(self, data, **kwargs):
+        with self._lock:
+            self._call("batch_update")
+            for entry in data:
+                first_column, first_row, _, _ = _RANGE.match(entry["range"]).groups()
+                for row_offset, values in enumerate(entry["values"]):
+                    row = int(first_row) + row_offset - 2
+                    while len(self.rows) <= row:
+                        self.rows.append([])
+                    cells = self._padded(self.rows[row])
+                    for offset, value in enumerate(values):
+                        cells[column_index(first_column) - 1 + offset] = value
+                    self.rows[row] = cells
+
+    def record(self, key, column="Email"):
+        """The sheet's current row for `key` as a dict, or None."""
+        position = self.header.index(column)
+        with self._lock:
+            for row in self.rows:
+                cells = self._padded(row)
+                if cells[position] == key:
+                    return dict(zip(self.header, cells))
+        return None
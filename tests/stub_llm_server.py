@@ -0,0 +1,154 @@
+# stub_llm_server.py
+"""
+Local stand-in for the Groq chat completions API.
+
+    python tests/stub_llm_server.py --port 8099 --delay 0.5
+    GROQ_BASE_URL=http://127.0.0.1:8099 GROQ_API_KEY=stub streamlit run app.py
+
+Every request is answered with "stub reply to: <last message>", after an
+optional delay, streamed word by word when the request asks for a stream.
+Requests are recorded, the peak number answered at once is tracked, and the
+next requests can be refused with 429 Too Many Requests.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+
+
+class StubLLMServer:
+    def __init__(self, host="127.0.0.1", port=0, delay=0.0, chunk_delay=0.0):
+        self.delay = delay
+        self.chunk_delay = chunk_delay
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self._rate_limited = []  # Retry-After values of the next refused requests
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def rate_limit(self, count=1, retry_after=0):
+        """Refuse the next `count` requests with a 429 and this Retry-After."""
+        with self._lock:
+            self._rate_limited.extend([retry_after] * count)
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self):
+        """Serve from a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @staticmethod
+    def reply(body):
+        messages = body.get("messages") or [{}]
+        return f"stub reply to: {messages[-1].get('content', '')}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with stub._lock:
+                    stub.requests.append(body)
+                    retry_after = stub._rate_limited.pop(0) if stub._rate_limited else None
+                if self.path != COMPLETIONS_PATH:
+                    return self._json(404, {"error": {"message": f"unknown path {self.path}"}})
+                if retry_after is not None:
+                    return self._json(429, {"error": {"message": "rate limited"}},
+                                      {"Retry-After": str(retry_after)})
+
+                with stub._lock:
+                    stub.active += 1
+                    stub.max_active = max(stub.max_active, stub.active)
+                try:
+                    time.sleep(stub.delay)
+                    if body.get("stream"):
+                        self._stream(body)
+                    else:
+                        self._json(200, self._completion(body))
+                finally:
+                    with stub._lock:
+                        stub.active -= 1
+
+            def _completion(self, body):
+                return {
+                    "id": "stub", "object": "chat.completion", "created": int(time.time()),
+                    "model": body.get("model", ""), "system_fingerprint": "stub",
+                    "choices": [{"index": 0, "finish_reason": "stop", "logprobs": {},
+                                 "message": {"role": "assistant", "content": stub.reply(body)}}],
+                    "usage": {},
+                }
+
+            def _stream(self, body):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                words = stub.reply(body).split(" ")
+                for i, word in enumerate(words):
+                    chunk = {
+                        "id": "stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                        "model": body.get("model", ""), "system_fingerprint": "stub",
+                        "choices": [{"index": 0, "finish_reason": "stop" if i == len(words) - 1 else "",
+                                     "logprobs": {}, "delta": {"role": "assistant",
+                                                               "content": word if i == 0 else " " + word}}],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    time.sleep(stub.chunk_delay)
+                self.wfile.write(b"data: [DONE]\n\n")
+
+            def _json(self, status, payload, headers=None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a stub Groq chat completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds before each reply starts")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="Seconds between streamed chunks")
+    args = parser.parse_args(argv)
+
+    server = StubLLMServer(args.host, args.port, delay=args.delay, chunk_delay=args.chunk_delay)
+    print(f"Stub LLM server on {server.url} (set GROQ_BASE_URL to this)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
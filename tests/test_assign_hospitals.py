@@ -0,0 +1,152 @@
+import csv
+import time
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+import hosloc  # noqa: E402
+from assign_hospitals import CheckpointMismatch, Geocoder, assign_hospitals  # noqa: E402
+from geo_cache import GeoCache  # noqa: E402
+from hosloc import GeocodingUnavailable  # noqa: E402
+
+PLACES = {"Connaught Place": (28.63, 77.22), "Bandra": (19.06, 72.84)}
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+class FakeGeocodingAPI:
+    """Answers Geocoding requests from PLACES, after replaying any queued failure statuses."""
+
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.requests = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.requests += 1
+        if self.failures:
+            return FakeResponse({"status": self.failures.pop(0)})
+        if params["address"] not in PLACES:
+            return FakeResponse({"status": "ZERO_RESULTS", "results": []})
+        lat, lng = PLACES[params["address"]]
+        return FakeResponse({"status": "OK", "results": [{"geometry": {"location": {"lat": lat, "lng": lng}}}]})
+
+
+@pytest.fixture
+def api(monkeypatch):
+    api = FakeGeocodingAPI()
+    monkeypatch.setattr(hosloc, "get_http_session", lambda: api)
+    monkeypatch.setattr(hosloc, "geo_cache", GeoCache(None))
+    return api
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = tmp_path / "hospitals.csv"
+    path.write_text("name,address,lat,lng\nAIIMS,Ansari Nagar,28.567,77.21\nLilavati,Bandra West,19.051,72.829\n",
+                    encoding="utf-8")
+    return str(path)
+
+
+class FakeStore:
+    """Patients with an Address, which no user store column holds yet."""
+
+    def __init__(self, locations):
+        self.records = [{"Email": f"p{i}@example.com", "Address": location} for i, location in enumerate(locations)]
+
+    def iter_users(self):
+        return iter(self.records)
+
+
+def read_rows(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def run(tmp_path, dataset, store, **kwargs):
+    kwargs.setdefault("geocoder", Geocoder(qps=0, backoff=0))
+    kwargs.setdefault("location_field", "Address")
+    return assign_hospitals(str(tmp_path / "out.csv"), dataset, chunk_size=2, workers=2, store=store, **kwargs)
+
+
+def test_assigns_nearest_hospitals(tmp_path, dataset, api):
+    store = FakeStore(["Connaught Place", "19.07, 72.88", "", "Atlantis"])
+    counts = run(tmp_path, dataset, store)
+    rows = read_rows(tmp_path / "out.csv")
+    assert [(row["Status"], row["Hospital 1 Name"] or "") for row in rows] == [
+        ("ok", "AIIMS"), ("ok", "Lilavati"), ("no location", ""), ("location not found", "")]
+    assert counts["ok"] == 2
+
+
+def test_transient_errors_are_retried(tmp_path, dataset, api):
+    api.failures = ["OVER_QUERY_LIMIT", "UNKNOWN_ERROR"]
+    geocoder = Geocoder(qps=0, backoff=0)
+    run(tmp_path, dataset, FakeStore(["Bandra"]), geocoder=geocoder)
+    assert read_rows(tmp_path / "out.csv")[0]["Status"] == "ok"
+    assert geocoder.retried == 2
+
+
+def test_outage_stops_the_run_and_a_rerun_resumes(tmp_path, dataset, api):
+    store = FakeStore(["28.6, 77.2", "19.0, 72.8", "Connaught Place", "Bandra", "Connaught Place"])
+    api.failures = ["OVER_DAILY_LIMIT"]
+    with pytest.raises(GeocodingUnavailable):
+        run(tmp_path, dataset, store)
+    assert [row["Status"] for row in read_rows(tmp_path / "out.csv")] == ["ok", "ok"]  # the first chunk only
+
+    counts = run(tmp_path, dataset, store)
+    rows = read_rows(tmp_path / "out.csv")
+    assert [row["Email"] for row in rows] == [f"p{i}@example.com" for i in range(5)]
+    assert {row["Status"] for row in rows} == {"ok"}
+    assert counts["processed"] == 5
+
+
+def test_resumed_summary_includes_earlier_counts(tmp_path, dataset, api):
+    store = FakeStore(["28.6, 77.2", "", "Connaught Place", "Atlantis"])
+    api.failures = ["REQUEST_DENIED"]
+    with pytest.raises(GeocodingUnavailable):
+        run(tmp_path, dataset, store)
+
+    counts = run(tmp_path, dataset, store)
+    counts.pop("seconds")
+    assert counts == {"processed": 4, "ok": 2, "no location": 1, "location not found": 1}
+
+
+@pytest.mark.parametrize("changed", [{"k": 2}, {"max_km": 50.0}, {"location_field": "City"}, {"dataset": "other"}])
+def test_resuming_with_other_parameters_is_refused(tmp_path, dataset, api, changed):
+    store = FakeStore(["28.6, 77.2", "19.0, 72.8", "Connaught Place"])
+    api.failures = ["REQUEST_DENIED"]
+    with pytest.raises(GeocodingUnavailable):
+        run(tmp_path, dataset, store)
+    if "dataset" in changed:
+        changed["dataset"] = str(tmp_path / "other.csv")
+        (tmp_path / "other.csv").write_bytes(open(dataset, "rb").read())
+    kwargs = dict({"dataset": dataset}, **changed)
+
+    with pytest.raises(CheckpointMismatch):
+        run(tmp_path, store=store, **kwargs)
+    assert len(read_rows(tmp_path / "out.csv")) == 2  # left as it was
+
+    run(tmp_path, store=store, restart=True, **kwargs)
+    assert len(read_rows(tmp_path / "out.csv")) == 3
+
+
+def test_retries_give_up_eventually(tmp_path, dataset, api):
+    api.failures = ["OVER_QUERY_LIMIT"] * 10
+    with pytest.raises(GeocodingUnavailable):
+        run(tmp_path, dataset, FakeStore(["Bandra"]), geocoder=Geocoder(qps=0, retries=3, backoff=0))
+    assert api.requests == 4
+
+
+def test_requests_are_rate_limited_across_threads():
+    geocoder = Geocoder(qps=50)
+    start = time.monotonic()
+    for _ in range(11):
+        geocoder.throttle()
+    assert time.monotonic() - start >= 0.19
+    assert geocoder.requests == 11
@@ -0,0 +1,58 @@
+import threading
+import time
+
+import pytest
+
+from batch_writer import BatchWriter
+from fake_sheets import FakeWorksheet
+
+HEADER = ["Email", "Username", "Password"]
+
+
+@pytest.fixture
+def sheet():
+    return FakeWorksheet(HEADER, [["a@example.com", "alice", "pw"]])
+
+
+def test_failed_update_does_not_resend_delivered_appends(sheet, tmp_path):
+    journal = str(tmp_path / "journal.jsonl")
+    writer = BatchWriter(sheet, journal, max_delay=3600)
+    writer.append(["b@example.com", "bob", "pw"])
+    writer.update("a@example.com", "B", ["alicia"])
+
+    sheet.fail_next("batch_update")
+    with pytest.raises(RuntimeError):
+        writer.flush()
+    assert sheet.calls["append_rows"] == 1
+    assert writer.pending() == 1
+    assert BatchWriter(sheet, journal, max_delay=3600).pending() == 1  # only the update is journaled
+
+    assert writer.flush() == 1
+    assert sheet.calls["append_rows"] == 1
+    assert [row[0] for row in sheet.rows] == ["a@example.com", "b@example.com"]
+    assert sheet.record("a@example.com")["Username"] == "alicia"
+    assert writer.stats()["flushed_operations"] == 2
+
+
+def test_full_batch_wakes_the_flusher_without_extra_threads(sheet, tmp_path):
+    writer = BatchWriter(sheet, str(tmp_path / "journal.jsonl"), max_batch=5, max_delay=3600)
+    threads = threading.active_count()
+    for i in range(50):
+        writer.append([f"user{i}@example.com", f"user{i}", "pw"])
+    assert threading.active_count() == threads
+
+    # Full batches go out long before max_delay; only a partial batch may still wait
+    deadline = time.monotonic() + 5
+    while writer.pending() >= 5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert writer.pending() < 5
+    assert len(sheet.rows) - 1 + writer.pending() == 50
+
+
+def test_unjournaled_writer_leaves_no_journal(sheet, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    writer = BatchWriter(sheet, None, max_delay=3600)
+    writer.append(["b@example.com", "bob", "pw"])
+    assert writer.flush() == 1
+    assert sheet.record("b@example.com") is not None
+    assert list(tmp_path.iterdir()) == []
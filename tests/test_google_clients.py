@@ -0,0 +1,41 @@
+import threading
+
+import pytest
+
+pytest.importorskip("googleapiclient")
+pytest.importorskip("google_auth_httplib2")
+
+import google_clients  # noqa: E402
+from google.auth.credentials import AnonymousCredentials  # noqa: E402
+
+ACCOUNT = ("service-account.json", ("https://www.googleapis.com/auth/calendar",))
+
+
+@pytest.fixture(autouse=True)
+def anonymous(monkeypatch):
+    monkeypatch.setattr(google_clients, "get_credentials", lambda *args: AnonymousCredentials())
+    monkeypatch.setattr(google_clients, "_calendar_services", {})
+    monkeypatch.setattr(google_clients, "_calendar_transports", {})
+
+
+def test_calendar_service_is_built_once_per_process():
+    services = []
+    threads = [threading.Thread(target=lambda: services.append(google_clients.get_calendar_service(*ACCOUNT)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(services) == 4
+    assert all(service is services[0] for service in services)
+
+
+def test_calendar_transports_are_never_shared_while_in_use():
+    with google_clients.calendar_http(*ACCOUNT) as first, google_clients.calendar_http(*ACCOUNT) as second:
+        assert first is not second
+        assert first.http is not second.http
+
+    # Returned to the pool, so the next request reuses a warm connection
+    with google_clients.calendar_http(*ACCOUNT) as again:
+        assert again in (first, second)
@@ -0,0 +1,61 @@
+import pytest
+
+pytest.importorskip("streamlit")
+
+import hosloc  # noqa: E402
+from geo_cache import GeoCache, geohash, geohash_bounds, geohash_center, geohash_half_diagonal  # noqa: E402
+from geo_kernels import haversine  # noqa: E402
+
+
+class FakePlacesAPI:
+    """Nearby Search over a fixed set of places, honouring the requested location and radius."""
+
+    def __init__(self, places):
+        self.places = places
+        self.requests = []
+
+    def get(self, url, params=None, timeout=None):
+        self.requests.append(params)
+        lat, lng = map(float, params["location"].split(","))
+        results = [{"name": name, "place_id": name, "geometry": {"location": {"lat": plat, "lng": plng}}}
+                   for name, (plat, plng) in self.places.items()
+                   if haversine(lat, lng, plat, plng) * 1000 <= params["radius"]]
+        return type("Response", (), {"json": lambda self: {"status": "OK", "results": results}})()
+
+
+def test_half_diagonal_covers_the_cell():
+    cell = geohash(28.6139, 77.209)
+    (south, north), (west, east) = geohash_bounds(cell)
+    center = geohash_center(cell)
+    corners = [haversine(*center, lat, lng) * 1000 for lat in (south, north) for lng in (west, east)]
+    assert geohash_half_diagonal(cell) == pytest.approx(max(corners), rel=1e-6)
+    assert 500 < geohash_half_diagonal(cell) < 800
+
+
+def test_nearby_search_covers_the_users_radius_not_the_cells(monkeypatch):
+    cell = geohash(28.6139, 77.209)
+    (south, north), (west, east) = geohash_bounds(cell)
+    user = (south + 0.0001, west + 0.0001)  # a corner of the cell, ~0.7 km from its centre
+    places = {
+        "inside": (user[0] - 0.008, user[1]),  # ~0.9 km from the user, ~1.3 km from the centre
+        "outside": (north + 0.003, east),  # ~0.8 km from the centre, ~1.4 km from the user
+    }
+    api = FakePlacesAPI(places)
+    monkeypatch.setattr(hosloc, "get_http_session", lambda: api)
+    monkeypatch.setattr(hosloc, "geo_cache", GeoCache(None))
+
+    results = hosloc.search_nearby(*user, radius=1000)
+    assert [result["name"] for result in results] == ["inside"]
+    assert api.requests[0]["radius"] == 1000 + int(geohash_half_diagonal(cell)) + 1
+
+
+def test_searches_from_one_cell_share_the_cached_call(monkeypatch, tmp_path):
+    cell = geohash(28.6139, 77.209)
+    (south, north), (west, east) = geohash_bounds(cell)
+    api = FakePlacesAPI({"hospital": ((south + north) / 2, (west + east) / 2)})
+    monkeypatch.setattr(hosloc, "get_http_session", lambda: api)
+    monkeypatch.setattr(hosloc, "geo_cache", GeoCache(str(tmp_path / "geo.db")))
+
+    assert len(hosloc.search_nearby(south + 0.0001, west + 0.0001, radius=1000)) == 1
+    assert len(hosloc.search_nearby(north - 0.0001, east - 0.0001, radius=1000)) == 1
+    assert len(api.requests) == 1
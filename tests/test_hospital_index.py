@@ -0,0 +1,169 @@
+import csv
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from geo_kernels import haversine
+from hospital_index import DatasetRefresher, HospitalIndex, load_hospitals, merge_hospitals
+
+
+def places_result(name, lat, lng, place_id, **fields):
+    """A hospital as hosloc.find_nearest_hospitals returns it."""
+    hospital = {"name": name, "address": "", "rating": "N/A", "user_ratings_total": "N/A",
+                "phone_number": None, "place_id": place_id, "lat": lat, "lng": lng,
+                "distance_km": 1.0, "bearing_deg": 90}
+    hospital.update(fields)
+    return hospital
+
+
+@pytest.fixture
+def geojson_dataset(tmp_path):
+    path = tmp_path / "hospitals.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection", "name": "delhi", "features": [
+        {"type": "Feature", "geometry": {"type": "Point", "coordinates": [77.21, 28.61]},
+         "properties": {"name": "AIIMS", "phone": "011-123", "place_id": "p1", "beds": 2478}},
+        {"type": "Feature", "geometry": {"type": "Polygon", "coordinates": []}, "properties": {"name": "campus"}},
+    ]}), encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def csv_dataset(tmp_path):
+    path = tmp_path / "hospitals.csv"
+    path.write_text("name,latitude,longitude,phone,place_id,beds\nAIIMS,28.610,77.21,011-123,p1,2478\n",
+                    encoding="utf-8")
+    return str(path)
+
+
+def test_geojson_dataset_stays_geojson(geojson_dataset):
+    changed = merge_hospitals(geojson_dataset, [
+        places_result("AIIMS", 28.61, 77.21, "p1", address="Ansari Nagar", rating=4.3),
+        places_result("Safdarjung", 28.57, 77.20, "p2"),
+    ])
+    assert changed == 2
+
+    with open(geojson_dataset, encoding="utf-8") as f:
+        collection = json.load(f)
+    assert collection["name"] == "delhi"
+    assert [feature["geometry"]["type"] for feature in collection["features"]] == ["Point", "Polygon", "Point"]
+    aiims = collection["features"][0]["properties"]
+    assert aiims == {"name": "AIIMS", "phone": "011-123", "place_id": "p1", "beds": 2478,
+                     "address": "Ansari Nagar", "rating": 4.3}
+
+    hospitals = {hospital["place_id"]: hospital for hospital in load_hospitals(geojson_dataset)}
+    assert hospitals["p2"]["lat"] == 28.57
+    assert hospitals["p2"]["phone_number"] == "" and hospitals["p2"]["rating"] == ""
+
+
+def test_csv_merge_keeps_known_values_and_extra_columns(csv_dataset):
+    merge_hospitals(csv_dataset, [places_result("AIIMS", 28.61, 77.21, "p1", rating=4.3)])
+    with open(csv_dataset, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert rows == [{"name": "AIIMS", "latitude": "28.610", "longitude": "77.21", "phone": "011-123",
+                     "place_id": "p1", "beds": "2478", "rating": "4.3"}]
+
+
+def test_unchanged_merge_does_not_rewrite_the_file(csv_dataset):
+    merge_hospitals(csv_dataset, [places_result("AIIMS", 28.61, 77.21, "p1", rating=4.3)])
+    before = os.stat(csv_dataset).st_mtime_ns
+    os.utime(csv_dataset, ns=(before - 10**9, before - 10**9))
+
+    assert merge_hospitals(csv_dataset, [places_result("AIIMS", 28.61, 77.21, "p1", rating="4.3")]) == 0
+    assert os.stat(csv_dataset).st_mtime_ns == before - 10**9
+
+
+def test_concurrent_merges_lose_nothing(csv_dataset):
+    def merge(start):
+        for i in range(start, start + 10):
+            merge_hospitals(csv_dataset, [places_result(f"H{i}", 20 + i / 100, 75.0, f"id{i}")])
+
+    threads = [threading.Thread(target=merge, args=(start,)) for start in range(0, 80, 10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(load_hospitals(csv_dataset)) == 81
+    assert sorted(os.listdir(os.path.dirname(csv_dataset))) == ["hospitals.csv"]
+
+
+def test_refresher_batches_writes(csv_dataset):
+    refresher = DatasetRefresher(csv_dataset, interval=3600)
+    refresher.queue([places_result("Safdarjung", 28.57, 77.20, "p2", phone_number="011-456")])
+    refresher.queue([places_result("Safdarjung", 28.57, 77.20, "p2", rating=4.0)])
+    refresher.queue([places_result("AIIMS", 28.61, 77.21, "p1")])
+    assert refresher.pending() == 2
+    assert len(load_hospitals(csv_dataset)) == 1
+
+    assert refresher.flush() == 1  # AIIMS had nothing new
+    assert refresher.writes == 1
+    safdarjung = {hospital["place_id"]: hospital for hospital in load_hospitals(csv_dataset)}["p2"]
+    assert (safdarjung["phone_number"], safdarjung["rating"]) == ("011-456", "4.0")
+    assert refresher.flush() == 0
+
+
+def test_refresher_writes_after_its_interval(csv_dataset):
+    refresher = DatasetRefresher(csv_dataset, interval=0.05)
+    refresher.queue([places_result("Safdarjung", 28.57, 77.20, "p2")])
+    deadline = time.monotonic() + 5
+    while refresher.writes == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert refresher.pending() == 0
+    assert len(HospitalIndex.from_file(csv_dataset)) == 2
+
+
+# Mostly India, plus stragglers near the poles and on both sides of the antimeridian
+QUERIES = [(28.6, 77.2), (51.5, 0.0), (12.97, 77.59), (-33.9, 151.2), (0.0, 179.9), (0.0, -179.9), (89.0, 10.0)]
+
+
+@pytest.fixture(params=["kdtree", "grid"])
+def spatial_index(request, monkeypatch):
+    if request.param == "kdtree":
+        pytest.importorskip("scipy")
+    else:
+        monkeypatch.setitem(sys.modules, "scipy.spatial", None)  # makes the import fail
+    rng = np.random.default_rng(7)
+    lats = np.concatenate([rng.uniform(8, 35, 300), rng.uniform(-89, 89, 40), [85.5, -87.0, 1.0, -1.0]])
+    lngs = np.concatenate([rng.uniform(68, 97, 300), rng.uniform(-180, 180, 40), [-120.0, 60.0, 179.95, -179.95]])
+    hospitals = [{"name": f"h{i}", "lat": float(lat), "lng": float(lng)} for i, (lat, lng) in enumerate(zip(lats, lngs))]
+    index = HospitalIndex(hospitals)
+    assert (index._grid is not None) == (request.param == "grid")
+    return index
+
+
+def brute_force(index, lat, lng):
+    distances = haversine(lat, lng, index.lats, index.lngs)
+    return np.argsort(distances, kind="stable"), distances
+
+
+@pytest.mark.parametrize("lat,lng", QUERIES)
+def test_nearest_matches_brute_force(spatial_index, lat, lng):
+    order, distances = brute_force(spatial_index, lat, lng)
+    for k in (1, 5, 40):
+        names = [hospital["name"] for hospital in spatial_index.nearest(lat, lng, k=k)]
+        assert names == [f"h{i}" for i in order[:k]]
+    max_km = float(distances[order[10]]) + 1
+    names = [hospital["name"] for hospital in spatial_index.nearest(lat, lng, k=40, max_km=max_km)]
+    assert names == [f"h{i}" for i in order[:11]]
+
+
+@pytest.mark.parametrize("lat,lng", QUERIES)
+@pytest.mark.parametrize("radius_km", [50, 800, 5000])
+def test_within_matches_brute_force(spatial_index, lat, lng, radius_km):
+    order, distances = brute_force(spatial_index, lat, lng)
+    names = [hospital["name"] for hospital in spatial_index.within(lat, lng, radius_km)]
+    assert names == [f"h{i}" for i in order if distances[i] <= radius_km]
+
+
+def test_nearest_many_matches_brute_force(spatial_index):
+    lats, lngs = zip(*QUERIES)
+    indices, distances = spatial_index.nearest_many(lats, lngs, k=3)
+    for row, (lat, lng) in enumerate(QUERIES):
+        order, expected = brute_force(spatial_index, lat, lng)
+        assert indices[row].tolist() == order[:3].tolist()
+        assert np.allclose(distances[row], expected[order[:3]])
@@ -0,0 +1,73 @@
+import pytest
+
+from lab_parser import format_results_table, out_of_range, parse_lab_results, unparsed_text
+
+
+def only(text):
+    results = parse_lab_results(text)
+    assert len(results) == 1, results
+    return results[0]
+
+
+def test_name_value_unit_range():
+    result = only("Hemoglobin 11.2 g/dL 13.0 - 17.0")
+    assert (result["test"], result["value"], result["unit"]) == ("Hemoglobin", 11.2, "g/dL")
+    assert (result["low"], result["high"], result["flag"]) == (13.0, 17.0, "low")
+
+
+def test_flag_and_trailing_unit():
+    result = only("Glucose Fasting 130 H 70 - 100 mg/dL")
+    assert (result["test"], result["unit"], result["flag"]) == ("Glucose Fasting", "mg/dL", "high")
+
+
+def test_value_glued_to_the_name():
+    result = only("120.00Glucose Fasting  70 - 100 mg/dL")
+    assert (result["test"], result["value"], result["flag"]) == ("Glucose Fasting", 120.0, "high")
+
+
+def test_one_field_per_line():
+    result = only("SERUM THYROXINE, T4\n98\nng/mL\n52 - 127")
+    assert (result["test"], result["value"], result["unit"], result["flag"]) == (
+        "SERUM THYROXINE, T4", 98.0, "ng/mL", "normal")
+
+
+@pytest.mark.parametrize("line, test, unit", [
+    ("WBC Count 11000 /cumm 4000 - 11000", "WBC Count", "/cumm"),
+    ("Platelet Count 1.5 lakhs/cumm 1.5 - 4.5", "Platelet Count", "lakhs/cumm"),
+    ("RBC 4.2 x10^6/uL 4.5 - 5.5", "RBC", "x10^6/uL"),
+    ("Pus Cells 8 /hpf 0 - 5", "Pus Cells", "/hpf"),
+])
+def test_count_units(line, test, unit):
+    result = only(line)
+    assert (result["test"], result["unit"]) == (test, unit)
+
+
+def test_one_sided_ranges():
+    results = parse_lab_results("LDL Cholesterol 160 mg/dL < 100\nHDL Cholesterol 35 mg/dL > 40")
+    assert [(result["test"], result["flag"]) for result in results] == [
+        ("LDL Cholesterol", "high"), ("HDL Cholesterol", "low")]
+
+
+def test_prose_is_ignored_and_duplicates_are_dropped():
+    text = ("Patient name: A. Kumar\nSample collected on 12/03/2024\n"
+            "Hemoglobin 14 g/dL 13.0 - 17.0\nHemoglobin 14 g/dL 13.0 - 17.0\n")
+    assert [result["test"] for result in parse_lab_results(text)] == ["Hemoglobin"]
+
+
+def test_out_of_range_and_table():
+    results = parse_lab_results("Hemoglobin 11.2 g/dL 13.0 - 17.0\nWBC Count 7000 /cumm 4000 - 11000")
+    assert [result["test"] for result in out_of_range(results)] == ["Hemoglobin"]
+    assert format_results_table(results).splitlines() == [
+        "Test | Value | Unit | Reference | Flag",
+        "Hemoglobin | 11.2 | g/dL | 13.0 - 17.0 | LOW",
+        "WBC Count | 7000 | /cumm | 4000 - 11000 | normal",
+    ]
+
+
+def test_result_lines_and_unparsed_text():
+    text = ("Patient: A. Kumar\nHemoglobin 11.2 g/dL 13.0 - 17.0\f"
+            "SERUM THYROXINE, T4\n98\nng/mL\n52 - 127\nComment: repeat in 3 months\n"
+            "Hemoglobin 11.2 g/dL 13.0 - 17.0\n")
+    assert [result["lines"] for result in parse_lab_results(text)] == [(1, 1), (2, 5)]
+    # Duplicates are consumed too; the page break survives
+    assert unparsed_text(text) == "Patient: A. Kumar\n\fComment: repeat in 3 months\n"
@@ -0,0 +1,135 @@
+import threading
+import time
+import types
+
+import pytest
+
+pytest.importorskip("groq")
+
+import llm_gateway  # noqa: E402
+from llm_gateway import LLMGateway  # noqa: E402
+from stub_llm_server import StubLLMServer  # noqa: E402
+
+MODEL = "llama3-8b-8192"
+
+
+def ask(text):
+    return [{"role": "user", "content": text}]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    with StubLLMServer(delay=0.2) as server:
+        monkeypatch.setenv("GROQ_BASE_URL", server.url)
+        monkeypatch.setenv("GROQ_API_KEY", "stub")
+        yield server
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [time.time()]
+    monkeypatch.setattr(llm_gateway, "time", types.SimpleNamespace(
+        time=lambda: now[0], perf_counter=time.perf_counter, sleep=time.sleep))
+    return now
+
+
+def make_gateway(tmp_path, **kwargs):
+    return LLMGateway(cache_path=str(tmp_path / "llm_cache.db"), **kwargs)
+
+
+def test_completion_comes_from_the_stub_server(server, tmp_path):
+    gateway = make_gateway(tmp_path)
+    assert gateway.complete(ask("hello"), MODEL) == "stub reply to: hello"
+    assert server.requests[0]["model"] == MODEL
+
+
+def test_memory_tier_hit(server, tmp_path):
+    gateway = make_gateway(tmp_path)
+    first = gateway.complete(ask("hello"), MODEL, temperature=0)
+    assert gateway.complete(ask("hello"), MODEL, temperature=0) == first
+    assert len(server.requests) == 1
+    assert gateway.stats()["memory_hits"] == 1
+
+    # Different parameters are a different prompt
+    gateway.complete(ask("hello"), MODEL, temperature=1)
+    assert len(server.requests) == 2
+
+
+def test_disk_tier_hit_survives_a_restart(server, tmp_path):
+    make_gateway(tmp_path).complete(ask("hello"), MODEL)
+    restarted = make_gateway(tmp_path)
+    assert restarted.complete(ask("hello"), MODEL) == "stub reply to: hello"
+    assert len(server.requests) == 1
+    stats = restarted.stats()
+    assert (stats["disk_hits"], stats["misses"]) == (1, 0)
+
+    # Promoted to memory: the next hit doesn't touch SQLite
+    restarted.complete(ask("hello"), MODEL)
+    assert restarted.stats()["memory_hits"] == 1
+
+
+def test_entries_expire_after_the_ttl(server, tmp_path, clock):
+    gateway = make_gateway(tmp_path, ttl=60)
+    gateway.complete(ask("hello"), MODEL)
+    clock[0] += 59
+    gateway.complete(ask("hello"), MODEL)
+    assert len(server.requests) == 1
+
+    clock[0] += 2
+    gateway.complete(ask("hello"), MODEL)
+    assert len(server.requests) == 2
+
+
+def test_concurrent_identical_requests_are_coalesced(server, tmp_path):
+    gateway = make_gateway(tmp_path)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(gateway.complete(ask("same"), MODEL)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["stub reply to: same"] * 8
+    assert len(server.requests) == 1
+    assert gateway.stats()["coalesced"] == 7
+
+
+def test_stream_and_complete_share_entries(server, tmp_path):
+    gateway = make_gateway(tmp_path)
+    chunks = list(gateway.stream(ask("tell me more"), MODEL))
+    assert len(chunks) > 1
+    assert "".join(chunks) == "stub reply to: tell me more"
+    assert gateway.complete(ask("tell me more"), MODEL) == "".join(chunks)
+    assert len(server.requests) == 1
+    assert server.requests[0]["stream"] is True
+
+
+def test_a_stream_holds_its_slot_until_it_is_finished_or_closed(server, tmp_path):
+    gateway = make_gateway(tmp_path, max_concurrency=1)
+    stream = gateway.stream(ask("first"), MODEL)
+    assert next(stream) == "stub"
+
+    waiting = threading.Thread(target=gateway.complete, args=(ask("second"), MODEL))
+    waiting.start()
+    time.sleep(0.5)
+    assert len(server.requests) == 1  # the second call is still waiting for the slot
+
+    stream.close()
+    waiting.join(timeout=5)
+    assert not waiting.is_alive()
+    assert len(server.requests) == 2
+
+    # Read to the end, a stream gives its slot back as well
+    assert "".join(gateway.stream(ask("third"), MODEL)) == "stub reply to: third"
+    assert gateway.complete(ask("fourth"), MODEL) == "stub reply to: fourth"
+
+
+def test_rate_limited_calls_are_retried(server, tmp_path):
+    gateway = make_gateway(tmp_path, max_concurrency=1)
+    gateway.client.max_retries = 0  # leave 429 handling to the gateway
+    server.rate_limit(2, retry_after=0.05)
+    assert gateway.complete(ask("hello"), MODEL) == "stub reply to: hello"
+    assert len(server.requests) == 3
+    assert gateway.stats()["rate_limited"] == 2
+    assert gateway.complete(ask("again"), MODEL) == "stub reply to: again"
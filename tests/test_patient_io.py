@@ -0,0 +1,92 @@
+import os
+
+import pytest
+
+from fake_sheets import FakeWorksheet
+from patient_io import import_patients, issue_invites, validate
+from storage import ALL_COLUMNS, SheetsUserStore, is_activated
+
+EXISTING = {
+    "Email": "a@example.com", "Username": "alice", "Password": "secret",
+    "Name": "Alice", "Gender": "Female", "Age": "30", "Blood Group": "O+",
+    "Height": "165", "Weight": "60", "Allergies": "Penicillin",
+}
+
+
+@pytest.fixture
+def store(make_store):
+    return make_store([EXISTING])
+
+
+def write_csv(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_validate_keeps_only_columns_with_values():
+    record, reason = validate({"Email": " a@example.com ", "Weight": "61.0", "Name": "", "Age": None})
+    assert reason is None
+    assert record == {"Email": "a@example.com", "Weight": "61"}
+
+
+def test_partial_import_keeps_existing_fields(store, tmp_path):
+    path = write_csv(tmp_path / "weights.csv", "Email,Weight\na@example.com,62\nb@example.com,80\n")
+    counts = import_patients(path, store=store)
+    assert counts["imported"] == 2
+
+    existing = store.get_user("a@example.com")
+    assert existing["Weight"] == "62"
+    for column in ("Username", "Password", "Name", "Gender", "Age", "Blood Group", "Height", "Allergies"):
+        assert existing[column] == EXISTING[column]
+
+    created = store.get_user("b@example.com")
+    assert created["Weight"] == "80"
+    assert not is_activated(created)
+    assert created["Name"] == ""
+
+
+def test_blank_cells_do_not_erase_values(store, tmp_path):
+    path = write_csv(tmp_path / "clinic.csv", "Email,Username,Name,Age,Allergies\na@example.com,,Alice B,,\n")
+    import_patients(path, store=store)
+
+    existing = store.get_user("a@example.com")
+    assert existing["Name"] == "Alice B"
+    assert existing["Username"] == "alice"
+    assert existing["Age"] == "30"
+    assert existing["Allergies"] == "Penicillin"
+
+
+def test_sheets_import_writes_only_the_imported_cells(tmp_path, monkeypatch):
+    monkeypatch.setenv("WRITE_JOURNAL_DIR", str(tmp_path / "journal"))
+    sheet = FakeWorksheet(ALL_COLUMNS, [[EXISTING.get(column, "") for column in ALL_COLUMNS]])
+    store = SheetsUserStore(sheet, ttl=3600)
+    path = write_csv(tmp_path / "weights.csv", "Email,Age,Weight\na@example.com,31,62\n")
+    import_patients(path, store=store)
+
+    assert sheet.calls["batch_update"] == 1
+    assert sheet.record("a@example.com") == dict(
+        {column: EXISTING.get(column, "") for column in ALL_COLUMNS}, Age="31", Weight="62")
+
+
+def test_import_issues_invites_to_new_patients_only(store, tmp_path):
+    path = write_csv(tmp_path / "clinic.csv", "Email,Name\na@example.com,Alice\nb@example.com,Bob\n")
+    counts = import_patients(path, store=store)
+    assert counts["invited"] == 1
+
+    with open(f"{path}.invites.csv", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert lines[0] == "email,code"
+    email, code = lines[1].split(",")
+    assert (email, len(lines)) == ("b@example.com", 2)
+    assert os.stat(f"{path}.invites.csv").st_mode & 0o077 == 0
+    assert store.activate_user("b@example.com", code, "bob", "pw") is True
+
+    # Importing again issues no new codes; the invites command can replace lost ones
+    assert import_patients(path, store=store)["invited"] == 0
+    assert issue_invites(str(tmp_path / "invites.csv"), store=store) == 0
+
+
+def test_dry_run_issues_no_invites(store, tmp_path):
+    path = write_csv(tmp_path / "clinic.csv", "Email,Name\nb@example.com,Bob\n")
+    import_patients(path, dry_run=True, store=store)
+    assert not os.path.exists(f"{path}.invites.csv")
@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("groq")
+pytest.importorskip("pypdf")
+
+import read_reports  # noqa: E402
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_pdfs_are_read_in_spawned_workers(monkeypatch):
+    monkeypatch.setattr(read_reports, "_pools", {})
+    pool = read_reports._pool("pdf")
+    try:
+        assert pool._mp_context.get_start_method() == "spawn"
+        with open(os.path.join(REPO, "blood test report.pdf"), "rb") as f:
+            data = f.read()
+        text = pool.submit(read_reports.extract_text, data, read_reports.PAGE_BREAK).result(timeout=60)
+        assert text == read_reports.extract_text_from_pdf(data)
+    finally:
+        pool.shutdown()
+
+
+class FakeGateway:
+    """Records the prompts; condenses by keeping the first line of each chunk."""
+
+    def __init__(self):
+        self.prompts = []
+
+    def complete(self, messages, model, **kwargs):
+        self.prompts.append(messages[-1]["content"])
+        if model == read_reports.SUMMARY_MODEL:
+            return messages[-1]["content"].split("\n\n", 1)[1].splitlines()[0]
+        return "analysis"
+
+
+@pytest.fixture
+def fake_gateway(monkeypatch):
+    gateway = FakeGateway()
+    monkeypatch.setattr(read_reports, "gateway", gateway)
+    return gateway
+
+
+def panel(count, low=10, high=20, value=15):
+    return "".join(f"Test number {i} {value} mg/dL {low} - {high}\n" for i in range(count))
+
+
+def test_table_replaces_the_parsed_lines_and_keeps_the_rest():
+    # A cumulative report repeats the same panel on every page
+    text = read_reports.PAGE_BREAK.join(f"Page {page}: fasting sample\n" + panel(10) for page in range(3))
+    results = read_reports.parse_lab_results(text)
+    table, rest = read_reports.prompt_parts(text, results)
+    assert table.startswith(read_reports.TABLE_INTRO)
+    assert "Test number 9 | 15 | mg/dL | 10 - 20 | normal" in table
+    assert rest == "Page 0: fasting sample\n\fPage 1: fasting sample\n\fPage 2: fasting sample\n"
+    prompt = read_reports.report_for_prompt(table, rest)
+    assert read_reports.estimate_tokens(prompt) < read_reports.estimate_tokens(text)
+
+
+def test_report_goes_alone_when_the_table_would_not_be_shorter():
+    text = "Hemoglobin 11.2 g/dL 13.0 - 17.0\nComment: repeat in 3 months\n"
+    assert read_reports.prompt_parts(text, read_reports.parse_lab_results(text)) == ("", text)
+
+
+def test_oversized_table_is_condensed_then_capped():
+    results = read_reports.parse_lab_results(panel(5, value=30) + panel(200))
+    full = read_reports.lab_table_for_prompt(results)
+
+    condensed = read_reports.lab_table_for_prompt(results, read_reports.estimate_tokens(full) - 1)
+    assert "Test number 4 | 30 | mg/dL | 10 - 20 | HIGH" in condensed
+    assert "Within the reference range: Test number 0 15 mg/dL" in condensed
+
+    capped = read_reports.lab_table_for_prompt(results, 150)
+    assert read_reports.estimate_tokens(capped) <= 150
+    assert "Test number 4 | 30 | mg/dL | 10 - 20 | HIGH" in capped
+    assert "more results within the reference range left out" in capped
+
+
+def test_prompt_stays_within_the_budget_on_large_panels(fake_gateway, monkeypatch):
+    monkeypatch.setattr(read_reports, "REPORT_TOKEN_BUDGET", 400)
+    monkeypatch.setattr(read_reports, "_pools", {})
+    text = read_reports.PAGE_BREAK.join([panel(3, value=30) + panel(100)] * 2
+                                        + ["Clinical note line %d about the patient\n" % i for i in range(200)])
+    assert read_reports.generate_health_recommendations(text) == "analysis"
+
+    report = fake_gateway.prompts[-1].split("\n\n", 1)[1]
+    assert read_reports.estimate_tokens(report) <= 400
+    assert "HIGH" in report
@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from report_chunking import PAGE_BREAK, TRUNCATION_MARKER, chunk_text, estimate_tokens, map_reduce
+
+LAB_LINE = "Hemoglobin 13.5 g/dL 13.0 - 17.0"
+
+
+@pytest.fixture
+def pool():
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        yield pool
+
+
+def report(pages, lines_per_page=40):
+    return PAGE_BREAK.join(
+        "\n".join(f"Test {page}-{line} {line}.{page} mg/dL 1.0 - 9.9" for line in range(lines_per_page))
+        for page in range(pages))
+
+
+def test_numeric_text_costs_more_than_four_characters_a_token():
+    assert estimate_tokens(LAB_LINE) > len(LAB_LINE) / 4
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("a" * 40) == 10
+
+
+def test_chunks_fit_the_budget_and_keep_everything_in_order():
+    text = report(5) + PAGE_BREAK + "x" * 3000  # an oversized page with no line breaks
+    chunks = chunk_text(text, 200)
+    assert all(estimate_tokens(chunk) <= 200 for chunk in chunks)
+    assert "".join("".join(chunks).split()) == "".join(text.replace(PAGE_BREAK, "").split())
+
+
+def test_map_reduce_keeps_reducing_until_the_text_fits(pool):
+    text = report(16)
+
+    def halve(chunk, index, total):
+        lines = chunk.splitlines()
+        return "\n".join(lines[:len(lines) // 2])
+
+    reduced, truncated = map_reduce(text, 400, halve, pool)  # five rounds
+    assert truncated == 0.0
+    assert estimate_tokens(reduced) <= 400
+    assert TRUNCATION_MARKER not in reduced
+
+
+def test_map_reduce_marks_and_reports_truncation(pool):
+    text = report(4)
+    reduced, truncated = map_reduce(text, 300, lambda chunk, index, total: chunk, pool)
+    assert 0 < truncated < 1
+    assert reduced.endswith(TRUNCATION_MARKER)
+    assert estimate_tokens(reduced) <= 300
+    assert reduced.startswith("Test 0-0")
+
+
+def test_short_text_is_returned_untouched(pool):
+    assert map_reduce(LAB_LINE, 100, None, pool) == (LAB_LINE, 0.0)
@@ -0,0 +1,176 @@
+import types
+
+import pytest
+
+import sheets_cache
+from batch_writer import BatchWriter
+from fake_sheets import FakeWorksheet
+from sheets_cache import CachedWorksheet
+
+HEADER = ["Email", "Username", "Password", "Name", "Age"]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sheets_cache, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def sheet():
+    return FakeWorksheet(HEADER, [
+        ["a@example.com", "alice", "pw", "Alice", "30"],
+        ["b@example.com", "bob", "pw", "Bob", "41"],
+    ])
+
+
+def cached(sheet, tmp_path, ttl=60.0):
+    # A long flush interval keeps the background flusher out of the way; tests flush explicitly
+    return CachedWorksheet(sheet, ttl=ttl, flush_interval=3600, journal_path=str(tmp_path / "journal.jsonl"))
+
+
+def test_reads_come_from_one_download_until_the_ttl_expires(sheet, tmp_path, clock):
+    cache = cached(sheet, tmp_path, ttl=60)
+    assert cache.get("a@example.com")["Name"] == "Alice"
+    sheet.rows[0][3] = "Alicia"  # changed behind the cache's back
+
+    clock[0] += 59
+    assert cache.get("a@example.com")["Name"] == "Alice"
+    assert sheet.calls["get_all_records"] == 1
+
+    clock[0] += 2
+    assert cache.get("a@example.com")["Name"] == "Alicia"
+    assert sheet.calls["get_all_records"] == 2
+    assert cache.stats()["api_reads"] == 2
+
+
+def test_invalidate_forces_a_reload(sheet, tmp_path, clock):
+    cache = cached(sheet, tmp_path)
+    cache.get("a@example.com")
+    sheet.rows.append(["c@example.com", "carol", "pw", "Carol", "25"])
+    assert cache.get("c@example.com") is None
+
+    cache.invalidate()
+    assert cache.get("c@example.com")["Username"] == "carol"
+
+
+def test_email_index(sheet, tmp_path, clock):
+    cache = cached(sheet, tmp_path)
+    assert cache.get("b@example.com")["Username"] == "bob"
+    assert "a@example.com" in cache
+    assert cache.get("nobody@example.com") is None
+    assert "nobody@example.com" not in cache
+
+    cache.append_row(["c@example.com", "carol", "pw"])
+    assert "c@example.com" in cache
+    assert cache.get("c@example.com")["Name"] == ""
+    assert cache.update_row("nobody@example.com", "D", ["X"]) is False
+
+
+def test_writes_are_visible_at_once_and_flushed_in_one_call_each(sheet, tmp_path, clock):
+    cache = cached(sheet, tmp_path)
+    cache.append_row(["c@example.com", "carol", "pw", "Carol", "25"])
+    cache.update_row("a@example.com", "D", ["Alicia", "31"])
+    cache.update_row("b@example.com", "E", ["42"])
+    cache.update_row("c@example.com", "E", ["26"])
+
+    # Served from the cache, not yet on the sheet
+    assert cache.get("a@example.com")["Name"] == "Alicia"
+    assert cache.get("c@example.com")["Age"] == "26"
+    assert sheet.record("a@example.com")["Name"] == "Alice"
+    assert cache.writer.pending() == 4
+
+    cache.flush()
+    assert sheet.calls["append_rows"] == 1
+    assert sheet.calls["batch_update"] == 1
+    assert sheet.record("a@example.com")["Age"] == "31"
+    assert sheet.record("b@example.com")["Age"] == "42"
+    assert sheet.record("c@example.com")["Age"] == "26"
+    assert cache.writer.pending() == 0
+
+
+def test_reload_flushes_pending_writes_first(sheet, tmp_path, clock):
+    cache = cached(sheet, tmp_path, ttl=60)
+    cache.update_row("a@example.com", "D", ["Alicia"])
+    clock[0] += 61
+    assert cache.get("a@example.com")["Name"] == "Alicia"
+    assert sheet.record("a@example.com")["Name"] == "Alicia"
+
+
+def test_failed_flush_keeps_writes_queued_and_journaled(sheet, tmp_path, clock):
+    cache = cached(sheet, tmp_path)
+    cache.append_row(["c@example.com", "carol", "pw", "Carol", "25"])
+    cache.update_row("a@example.com", "D", ["Alicia"])
+
+    sheet.fail_next("append_rows")
+    with pytest.raises(RuntimeError):
+        cache.flush()
+    assert cache.writer.pending() == 2
+    assert sheet.record("c@example.com") is None
+    assert cache.get("c@example.com")["Name"] == "Carol"
+
+    # A restarted process replays the journal
+    replayed = BatchWriter(sheet, str(tmp_path / "journal.jsonl"), max_delay=3600)
+    assert replayed.pending() == 2
+
+    cache.flush()
+    assert sheet.calls["append_rows"] == 2
+    assert [row[0] for row in sheet.rows].count("c@example.com") == 1
+    assert sheet.record("a@example.com")["Name"] == "Alicia"
+    assert BatchWriter(sheet, str(tmp_path / "journal.jsonl"), max_delay=3600).pending() == 0
+
+
+def test_updates_find_their_row_after_another_process_appends(sheet, tmp_path, clock):
+    cache = cached(sheet, tmp_path)
+    cache.get("a@example.com")
+    sheet.rows.append(["x@example.com", "xavier", "pw", "Xavier", "50"])  # e.g. patient_io, while the cache is fresh
+
+    cache.append_row(["c@example.com", "carol", "pw", "Carol", "25"])
+    cache.flush()
+    cache.update_row("c@example.com", "D", ["Caroline", "26"])
+    cache.update_row("b@example.com", "E", ["42"])
+    cache.flush()
+
+    assert sheet.record("x@example.com") == dict(zip(HEADER, ["x@example.com", "xavier", "pw", "Xavier", "50"]))
+    assert sheet.record("c@example.com")["Name"] == "Caroline"
+    assert sheet.record("b@example.com")["Age"] == "42"
+
+
+def test_update_of_a_row_appended_in_the_same_flush(sheet, tmp_path, clock):
+    cache = cached(sheet, tmp_path)
+    cache.get("a@example.com")
+    sheet.rows.append(["x@example.com", "xavier", "pw", "Xavier", "50"])
+    cache.append_row(["c@example.com", "carol", "pw"])
+    cache.update_row("c@example.com", "D", ["Carol", "25"])
+    cache.flush()
+
+    assert sheet.record("c@example.com")["Name"] == "Carol"
+    assert sheet.record("x@example.com")["Name"] == "Xavier"
+
+
+def test_replayed_journal_updates_the_keyed_row(sheet, tmp_path, clock):
+    cache = cached(sheet, tmp_path)
+    cache.update_row("b@example.com", "D", ["Robert"])
+    sheet.fail_next("col_values")
+    with pytest.raises(RuntimeError):
+        cache.flush()
+
+    # Rows move before the journal is replayed
+    sheet.rows.insert(0, ["x@example.com", "xavier", "pw", "Xavier", "50"])
+    replayed = BatchWriter(sheet, str(tmp_path / "journal.jsonl"), max_delay=3600)
+    assert replayed.flush() == 1
+    assert sheet.record("b@example.com")["Name"] == "Robert"
+    assert sheet.record("a@example.com")["Name"] == "Alice"
+    assert sheet.record("x@example.com")["Name"] == "Xavier"
+
+
+def test_journaled_updates_without_a_key_are_not_replayed(sheet, tmp_path):
+    journal = tmp_path / "journal.jsonl"
+    journal.write_text('{"op": "update", "range": "D2:D2", "values": [["Mallory"]]}\n'
+                       '{"op": "append", "values": ["c@example.com", "carol", "pw"]}\n', encoding="utf-8")
+    writer = BatchWriter(sheet, str(journal), max_delay=3600)
+    assert writer.pending() == 1
+    writer.flush()
+    assert sheet.record("a@example.com")["Name"] == "Alice"
+    assert sheet.record("c@example.com") is not None
@@ -0,0 +1,67 @@
+import pytest
+
+from storage import INVITE_PREFIX, SQLiteUserStore, is_activated
+
+
+@pytest.fixture
+def store(make_store):
+    return make_store()
+
+
+def test_imported_user_activates_with_their_invite_code_once(store):
+    store.upsert_profiles([{"Email": "a@example.com", "Username": "alice", "Name": "Alice"}])
+    assert store.add_user("a@example.com", "mallory", "pw") is False
+    assert not is_activated(store.get_user("a@example.com"))
+
+    code = store.issue_invites(["a@example.com"])["a@example.com"]
+    assert code not in str(store.get_user("a@example.com")["Password"])
+    assert store.issue_invites(["a@example.com"]) == {}  # the code already sent stays valid
+
+    assert store.activate_user("a@example.com", "wrong", "mallory", "other") is False
+    assert store.activate_user("a@example.com", code, "", "pw") is True
+    user = store.get_user("a@example.com")
+    assert (user["Username"], user["Password"], user["Name"]) == ("alice", "pw", "Alice")
+    assert is_activated(user)
+
+    assert store.activate_user("a@example.com", code, "mallory", "other") is False
+    assert store.get_user("a@example.com")["Password"] == "pw"
+
+
+def test_imported_user_without_an_invite_cannot_be_activated(store):
+    store.upsert_profiles([{"Email": "a@example.com"}])
+    assert store.activate_user("a@example.com", "", "mallory", "pw") is False
+    assert store.activate_user("a@example.com", INVITE_PREFIX, "mallory", "pw") is False
+    assert store.get_user("a@example.com")["Password"] == ""
+
+
+def test_reissued_invite_replaces_the_old_code(store):
+    store.upsert_profiles([{"Email": "a@example.com"}])
+    old = store.issue_invites(["a@example.com"])["a@example.com"]
+    new = store.issue_invites(["a@example.com"], reissue=True)["a@example.com"]
+    assert store.activate_user("a@example.com", old, "", "pw") is False
+    assert store.activate_user("a@example.com", new, "", "pw") is True
+
+
+def test_registered_or_unknown_users_get_no_invites(store):
+    store.add_user("b@example.com", "bob", "pw")
+    assert store.issue_invites(["b@example.com", "nobody@example.com"], reissue=True) == {}
+    assert store.activate_user("nobody@example.com", "code", "x", "new") is False
+    assert store.get_user("b@example.com")["Password"] == "pw"
+
+
+def test_sqlite_store_keeps_daily_tracking(tmp_path):
+    pytest.importorskip("pandas")
+    from tracking_history import TrackingHistory
+
+    store = SQLiteUserStore(str(tmp_path / "users.db"))
+    sheet = store.tracking_sheet()
+    history = TrackingHistory(sheet, min_sync_interval=0)
+    sheet.append_rows([["2024-03-02", "a@example.com", 7, 8, 30, "Good", 3, 4, ""],
+                       ["2024-03-01", "a@example.com", 6.5, 6, 0, "Poor", 4, 2, "tired"]])
+    assert history.sync() == 2
+
+    store.append_tracking([["2024-03-03", "b@example.com", 8, 9, 45, "Good", 2, 5, ""]])
+    assert history.sync() == 1
+    assert [record["Date"] for record in history.history("a@example.com")] == ["2024-03-01", "2024-03-02"]
+    assert history.history("a@example.com")[0]["Sleep Hours"] == 6.5
+    assert history.history("b@example.com")[0]["Notes"] == ""
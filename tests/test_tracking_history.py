@@ -0,0 +1,89 @@
+import math
+
+import pytest
+
+pytest.importorskip("pandas")
+
+from fake_sheets import FakeWorksheet  # noqa: E402
+from storage import TRACKING_COLUMNS  # noqa: E402
+from tracking_history import TrackingHistory  # noqa: E402
+
+
+def row(day, email="a@example.com", sleep=7, water=8, exercise=30, stress=3):
+    return [day, email, sleep, water, exercise, "Good", stress, 4, ""]
+
+
+@pytest.fixture
+def sheet():
+    return FakeWorksheet(TRACKING_COLUMNS, [
+        row("2024-03-02", sleep=8),
+        row("2024-03-01", sleep=6),
+        row("2024-03-01", email="b@example.com"),
+    ], title="DailyTracking")
+
+
+def test_sync_fetches_only_new_rows(sheet):
+    history = TrackingHistory(sheet, min_sync_interval=0)
+    assert history.sync() == 3
+    assert history.sync() == 0
+
+    sheet.rows.append([])  # a blank row still takes up a sheet row
+    sheet.rows.append(row("2024-03-03"))
+    assert history.sync() == 2
+    assert sheet.ranges_read == ["A2:I", "A5:I", "A5:I"]
+    assert [record["Date"] for record in history.history("a@example.com")] == [
+        "2024-03-01", "2024-03-02", "2024-03-03"]
+
+
+def test_recent_syncs_are_skipped_unless_forced(sheet):
+    history = TrackingHistory(sheet, min_sync_interval=3600)
+    history.sync()
+    sheet.rows.append(row("2024-03-03"))
+    assert history.sync() == 0
+    assert sheet.calls["get"] == 1
+    assert history.sync(force=True) == 1
+
+
+def test_range_queries(sheet):
+    history = TrackingHistory(sheet, min_sync_interval=0)
+    sheet.rows.extend([row("2024-02-28"), row("2024-03-05")])
+    history.sync()
+    dates = lambda **bounds: [record["Date"] for record in history.history("a@example.com", **bounds)]  # noqa: E731
+    assert dates(start="2024-03-01", end="2024-03-02") == ["2024-03-01", "2024-03-02"]
+    assert dates(start="2024-03-03") == ["2024-03-05"]
+    assert dates(end="2024-02-28") == ["2024-02-28"]
+    assert history.history("a@example.com")[0]["Sleep Hours"] == 7.0
+    assert history.history("nobody@example.com") == []
+    assert history.dataframe("nobody@example.com").empty
+
+
+def test_aggregates_are_cached_until_the_user_gets_new_rows(sheet):
+    history = TrackingHistory(sheet, min_sync_interval=0)
+    history.sync()
+    first = history.rolling_means("a@example.com", today="2024-03-02")
+    assert history.rolling_means("a@example.com", today="2024-03-02") is first
+
+    sheet.rows.append(row("2024-03-02", email="b@example.com"))
+    history.sync()
+    assert history.rolling_means("a@example.com", today="2024-03-02") is first
+
+    sheet.rows.append(row("2024-03-02", sleep=10))
+    history.sync()
+    updated = history.rolling_means("a@example.com", today="2024-03-02")
+    assert updated is not first
+    # Two entries on 2024-03-02 (8 and 10 hours) average to 9 for that day
+    assert updated.loc["2024-03-02", "Sleep Hours (7d avg)"] == pytest.approx((6 + 9) / 2)
+    assert history.rolling_means("a@example.com", today="2024-03-03") is not updated
+
+
+def test_summary_covers_the_windows_ending_today(sheet):
+    history = TrackingHistory(sheet, min_sync_interval=0)
+    history.sync()
+    assert history.summary("a@example.com", today="2024-03-02")["Sleep Hours (7d avg)"] == pytest.approx(7)
+    assert history.summary("a@example.com", today="2024-03-08")["Sleep Hours (7d avg)"] == pytest.approx(8)
+
+    # Months later nothing falls inside either window
+    stale = history.summary("a@example.com", today="2024-06-01")
+    assert math.isnan(stale["Sleep Hours (7d avg)"])
+    assert math.isnan(stale["Sleep Hours (30d avg)"])
+    assert history.summary("nobody@example.com") == {}
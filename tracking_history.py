@@ -0,0 +1,157 @@
+# tracking_history.py
+import bisect
+import os
+import threading
+import time
+from datetime import date
+
+import pandas as pd
+
+from batch_writer import BatchWriter, default_journal_dir
+from storage import TRACKING_COLUMNS, TRACKING_SHEET, get_user_store
+METRICS = ["Sleep Hours", "Water Intake", "Exercise Minutes", "Stress Level"]
+NUMERIC_COLUMNS = ["Sleep Hours", "Water Intake", "Exercise Minutes", "Stress Level", "Meal Quality"]
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class TrackingHistory:
+    """
+    Per-user, date-indexed view of the DailyTracking worksheet.
+
+    `sync()` only downloads rows appended since the last sync, so the cost of
+    a refresh does not grow with the size of the sheet. Each user's rows are
+    kept sorted by date for range queries, and rolling aggregates are cached
+    per user until that user gets new rows or the day changes.
+    """
+
+    def __init__(self, worksheet, min_sync_interval=15.0):
+        self.worksheet = worksheet
+        self.min_sync_interval = min_sync_interval
+        self._lock = threading.Lock()
+        self._rows_seen = 1  # the header row
+        self._last_sync = None
+        self._dates = {}  # email -> sorted list of dates
+        self._records = {}  # email -> records, parallel to _dates
+        self._aggregates = {}  # email -> (day computed for, cached rolling means)
+
+    def sync(self, force=False):
+        """Fetch rows appended since the last sync. Returns how many were new."""
+        with self._lock:
+            recent = self._last_sync is not None and time.monotonic() - self._last_sync < self.min_sync_interval
+            if recent and not force:
+                return 0
+            last_column = chr(ord("A") + len(TRACKING_COLUMNS) - 1)
+            rows = self.worksheet.get(f"A{self._rows_seen + 1}:{last_column}")
+            for row in rows:
+                self._add(row)
+            # Blank rows inside the range still occupy a sheet row
+            self._rows_seen += len(rows)
+            self._last_sync = time.monotonic()
+            return len(rows)
+
+    def _add(self, row):
+        if not row:
+            return
+        record = {column: (row[i] if i < len(row) else "") for i, column in enumerate(TRACKING_COLUMNS)}
+        for column in NUMERIC_COLUMNS:
+            record[column] = _number(record[column])
+        email = record["Email"]
+        dates = self._dates.setdefault(email, [])
+        records = self._records.setdefault(email, [])
+        position = bisect.bisect_right(dates, record["Date"])
+        dates.insert(position, record["Date"])
+        records.insert(position, record)
+        self._aggregates.pop(email, None)
+
+    def history(self, email, start=None, end=None):
+        """Records for `email` with start <= Date <= end (ISO date strings), oldest first."""
+        with self._lock:
+            dates = self._dates.get(email, [])
+            lo = bisect.bisect_left(dates, start) if start else 0
+            hi = bisect.bisect_right(dates, end) if end else len(dates)
+            return [dict(record) for record in self._records.get(email, [])[lo:hi]]
+
+    def dataframe(self, email, start=None, end=None):
+        """History as a DataFrame indexed by date."""
+        records = self.history(email, start, end)
+        if not records:
+            return pd.DataFrame(columns=TRACKING_COLUMNS)
+        df = pd.DataFrame(records)
+        df.index = pd.to_datetime(df["Date"])
+        return df
+
+    def rolling_means(self, email, today=None):
+        """
+        Daily metrics with 7- and 30-day rolling means, through `today` (a
+        date, default the current one) even if nothing was tracked on it, so
+        the last row is always the windows ending today. Cached per user.
+        """
+        today = pd.Timestamp(today or date.today()).normalize()
+        with self._lock:
+            cached = self._aggregates.get(email)
+        if cached is not None and cached[0] == today:
+            return cached[1]
+
+        df = self.dataframe(email)
+        if df.empty:
+            return pd.DataFrame()
+        daily = df[METRICS].astype(float).groupby(level=0).mean()
+        # An untracked day is a gap, not a zero: rolling means skip the NaN
+        daily = daily.reindex(daily.index.union([today]))
+        aggregates = pd.concat(
+            [daily.rolling("7D").mean().add_suffix(" (7d avg)"),
+             daily.rolling("30D").mean().add_suffix(" (30d avg)")],
+            axis=1,
+        )
+        with self._lock:
+            self._aggregates[email] = (today, aggregates)
+        return aggregates
+
+    def summary(self, email, today=None):
+        """
+        7- and 30-day averages for each metric over the days up to `today`;
+        NaN for a window with nothing tracked in it.
+        """
+        today = pd.Timestamp(today or date.today()).normalize()
+        aggregates = self.rolling_means(email, today)
+        return aggregates.loc[today].to_dict() if not aggregates.empty else {}
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_tracking_history():
+    """The process-wide TrackingHistory for the user store's DailyTracking sheet."""
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                _history = TrackingHistory(get_user_store().tracking_sheet())
+    return _history
+
+
+_writer = None
+
+
+def get_tracking_writer():
+    """
+    The process-wide journaled, batched writer for new DailyTracking rows.
+    The history is re-synced after each flush so new rows show up in charts.
+    """
+    global _writer
+    if _writer is None:
+        with _history_lock:
+            if _writer is None:
+                _writer = BatchWriter(
+                    get_user_store().tracking_sheet(),
+                    os.path.join(default_journal_dir(), f"{TRACKING_SHEET}.jsonl"),
+                    on_flush=lambda: get_tracking_history().sync(force=True),
+                )
+    return _writer
@@ -1,43 +1,25 @@
 import streamlit as st
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 import pandas as pd
 from datetime import datetime
 
-# Set up Google Sheets authentication
-def authenticate_google_sheets():
-    scope = ["https://spreadsheets.google.com/feeds", 'https://www.googleapis.com/auth/spreadsheets', 
-             "https://www.googleapis.com/auth/drive.file", "https://www.googleapis.com/auth/drive"]
-    creds = ServiceAccountCredentials.from_json_keyfile_name("bits-pilani-postman-f46c5e7cac83.json", scope)
-    client = gspread.authorize(creds)
-    return client.open("bitspilanipost").sheet1
+from storage import PROFILE_COLUMNS, get_user_store
 
-# Initialize Google Sheets
-sheet = authenticate_google_sheets()
+# Profiles live in the configured store (Google Sheets by default, or SQLite)
+store = get_user_store()
 
 def update_patient_details(email, name, gender, age, birth_date, disease, allergies, blood_group, 
                          height, weight, emergency_contact, previous_surgeries, current_medications,
                          family_history, insurance_details, recent_lab_tests, blood_test_results,
                          imaging_reports, other_test_results, lab_report_dates):
     try:
-        records = sheet.get_all_records()
-        row_index = None
+        values = [name, gender, str(age), str(birth_date), disease, allergies,
+                  blood_group, str(height), str(weight), emergency_contact,
+                  previous_surgeries, current_medications, family_history,
+                  insurance_details, recent_lab_tests, blood_test_results,
+                  imaging_reports, other_test_results, lab_report_dates]
         
-        # Find the row index for the email
-        for idx, record in enumerate(records):
-            if record['Email'] == email:
-                row_index = idx + 2  # Adding 2 to account for header row and 0-based index
-                break
-        
-        if row_index:
-            # Update all cells in a single request
-            sheet.update(f'D{row_index}:V{row_index}', 
-                        [[name, gender, str(age), str(birth_date), disease, allergies,
-                          blood_group, str(height), str(weight), emergency_contact,
-                          previous_surgeries, current_medications, family_history,
-                          insurance_details, recent_lab_tests, blood_test_results,
-                          imaging_reports, other_test_results, lab_report_dates]])
-            
+        # Update all profile columns in a single request
+        if store.update_profile(email, dict(zip(PROFILE_COLUMNS, values))):
             st.success("Details updated successfully!")
             return True
         else:
@@ -50,11 +32,7 @@ def update_patient_details(email, name, gender, age, birth_date, disease, allerg
 def get_patient_details(email):
     """Fetch existing patient details"""
     try:
-        records = sheet.get_all_records()
-        for record in records:
-            if record['Email'] == email:
-                return record
-        return None
+        return store.get_user(email)
     except Exception as e:
         st.error(f"Error fetching details: {str(e)}")
         return None